@@ -0,0 +1,298 @@
+"""
+Transcript auditor: stream assistant replies from report/export corpora through the compiled rule set.
+
+    python -m ai_vendedora.audit reports/round_*.json reports/e2e/*.txt -o reports/audit.json
+    python -m ai_vendedora.audit whatsapp_export.jsonl --workers 8 --violations reports/audit_violations.jsonl
+
+Sources (by extension):
+  round_*.json   {"round", "items": [{"scenario", "user", "assistant"}]} written by tests/run_validation.py
+  *.txt          e2e transcript, tagged "[user]"/"[assistant]" lines or a "[Perfil]" line followed by the reply
+  *.jsonl        WhatsApp export, one message per line: {"phone"|"conversation_id", "role", "text"|"content",
+                 optional "market", "scenario"}; assistant lines are paired with the previous user line of the
+                 same conversation. Lines that already carry {"user", "assistant"} are taken as one turn.
+
+Checks follow validate() in tests/run_validation.py (empty reply, banned phrases, signature-phrase usage),
+except that the container check uses the profile's avoid_container_opening rule, the same one the generator
+enforces: it matches container and logistics terms, where validate() only looks for "container". It is waived
+once the user has raised either term in the same conversation, in this turn or any earlier one. Turns are
+audited in chunks on a process pool with a bounded window; aggregates per market and per scenario are merged
+as chunks finish and the --output snapshot is rewritten every --flush-every chunks, so memory stays flat.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ai_vendedora.constraints import CONTAINER_TERMS, CompiledRules, ConstraintEngine, Rule
+from ai_vendedora.generator import DEFAULT_PROFILE_PATH, load_profile
+
+# Short forms used by validate() in tests/run_validation.py, plus the profile's full signature phrases
+SIGNATURE_MARKERS = ("Faz sentido pra você?", "Quer que eu te envie as fotos", "Deixa eu separar")
+# Scenario/profile labels -> market (first match wins, so "Marmorista US/Europa" counts as US like validate())
+_MARKETS = (
+    ("US", re.compile(r"\b(?:US|USA|EUA)\b")),
+    ("LATAM", re.compile(r"\bLATAM\b|Am[eé]rica Latina", re.IGNORECASE)),
+    ("EU", re.compile(r"\bEU\b|Europ", re.IGNORECASE)),
+    ("ME", re.compile(r"Oriente M[eé]dio|Middle East", re.IGNORECASE)),
+    ("BR", re.compile(r"\bBR\b|Brasil", re.IGNORECASE)),
+)
+_MAX_OPEN_CONVERSATIONS = 100_000
+
+# scenario, market, user message, assistant reply, whether the user raised containers/logistics so far
+Turn = Tuple[str, str, str, str, bool]
+_CONTAINER_TALK = CompiledRules([Rule("container", CONTAINER_TERMS)])
+
+_rules: Optional[ConstraintEngine] = None
+_signatures: Optional[CompiledRules] = None
+
+
+def market_of(label: str) -> str:
+    for market, pattern in _MARKETS:
+        if pattern.search(label or ""):
+            return market
+    return "_"
+
+
+def raises_container(text: str) -> bool:
+    return bool(text) and bool(_CONTAINER_TALK.scan(text))
+
+
+def read_rounds(path: str) -> Iterator[Turn]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    for it in report.get("items", []):
+        user = it.get("user", "")
+        yield it.get("scenario", ""), market_of(it.get("scenario", "")), user, it.get("assistant", ""), \
+            raises_container(user)
+
+
+def read_e2e(path: str) -> Iterator[Turn]:
+    """
+    Two layouts exist under reports/e2e: tagged ("[user] ..." / "[assistant] ..." lines, possibly several
+    turns) and plain ("[Perfil] ..." line, then the reply, sometimes followed by "Checks: ..." notes).
+    Simulator directives ("[Perfil] ...", "[Follow-up] ...") are not client words, so they count as an
+    empty user message for the container check.
+    """
+    scenario = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\n") for line in f]
+    label = next((line for line in lines if "[Perfil]" in line), "")
+    market = market_of(label)
+    if not any(line.startswith(("[user]", "[assistant]")) for line in lines):
+        body = [line for line in lines[1:] if not line.startswith("Checks:")]
+        yield scenario, market, "", "\n".join(body).strip(), False
+        return
+    user, reply, raised = "", [], False
+    for line in lines:
+        if line.startswith("[user]"):
+            if reply:
+                yield scenario, market, user, "\n".join(reply).strip(), raised
+                reply = []
+            text = line[len("[user]"):].strip()
+            user = "" if text.startswith("[") else text
+            raised = raised or raises_container(user)
+        elif line.startswith("[assistant]"):
+            reply.append(line[len("[assistant]"):].strip())
+    if reply:
+        yield scenario, market, user, "\n".join(reply).strip(), raised
+
+
+def read_whatsapp(path: str) -> Iterator[Turn]:
+    # Per conversation: (last user message, user raised containers so far); bounded LRU, exports interleave
+    last_user: "OrderedDict[str, Tuple[str, bool]]" = OrderedDict()
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                raise SystemExit(f"{path}:{lineno}: invalid JSON ({e})")
+            market = (rec.get("market") or "").upper() or "_"
+            scenario = rec.get("scenario") or "whatsapp"
+            if "assistant" in rec:
+                user = rec.get("user") or ""
+                yield scenario, market, user, rec.get("assistant") or "", raises_container(user)
+                continue
+            conv = str(rec.get("conversation_id") or rec.get("phone") or "")
+            text = rec.get("text") if rec.get("text") is not None else rec.get("content") or ""
+            if rec.get("role") == "user":
+                raised = conv in last_user and last_user[conv][1]
+                last_user[conv] = (text, raised or raises_container(text))
+                last_user.move_to_end(conv)
+                if len(last_user) > _MAX_OPEN_CONVERSATIONS:
+                    last_user.popitem(last=False)
+            elif rec.get("role") == "assistant":
+                user, raised = last_user.get(conv, ("", False))
+                yield scenario, market, user, text, raised
+
+
+def read_source(path: str) -> Iterator[Turn]:
+    lower = path.lower()
+    if lower.endswith(".jsonl"):
+        return read_whatsapp(path)
+    if lower.endswith(".json"):
+        return read_rounds(path)
+    return read_e2e(path)
+
+
+def read_turns(paths: Iterable[str]) -> Iterator[Turn]:
+    for path in paths:
+        yield from read_source(path)
+
+
+def _init_worker(profile_path: str) -> None:
+    global _rules, _signatures
+    profile = load_profile(profile_path)
+    _rules = ConstraintEngine.from_profile(profile)
+    _signatures = CompiledRules([Rule("signature", SIGNATURE_MARKERS + tuple(profile.get("language_signatures", [])))])
+
+
+def new_bucket() -> Dict[str, Any]:
+    return {"turns": 0, "failed": 0, "empty": 0, "with_signature": 0, "chars": 0, "rules": {}}
+
+
+def audit_turn(turn: Turn) -> Tuple[Tuple[str, ...], bool]:
+    """(violations, has_signature) for one turn, using the worker's compiled rules."""
+    scenario, market, user, reply, raised = turn
+    if not (reply or "").strip():
+        return ("empty",), False
+    fired = _rules.scan(reply, market)
+    if fired and raised:
+        # Container talk is fine once the user brought it up in this conversation
+        fired = tuple(r for r in fired if not r.endswith(".avoid_container_opening"))
+    return fired, bool(_signatures.scan(reply))
+
+
+def _audit_chunk(turns: List[Turn]) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], List[Dict[str, Any]]]:
+    aggregates: Dict[str, Dict[str, Dict[str, Any]]] = {"market": {}, "scenario": {}}
+    violations = []
+    for turn in turns:
+        scenario, market, user, reply, _ = turn
+        fired, signature = audit_turn(turn)
+        for group, key in (("market", market), ("scenario", scenario)):
+            b = aggregates[group].get(key)
+            if b is None:
+                b = aggregates[group][key] = new_bucket()
+            b["turns"] += 1
+            b["chars"] += len(reply or "")
+            b["with_signature"] += signature
+            if fired:
+                b["failed"] += 1
+                b["empty"] += fired == ("empty",)
+                for rule in fired:
+                    b["rules"][rule] = b["rules"].get(rule, 0) + 1
+        if fired:
+            violations.append({"scenario": scenario, "market": market, "rules": list(fired),
+                               "user": user, "assistant": reply})
+    return aggregates, violations
+
+
+def merge(into: Dict[str, Dict[str, Dict[str, Any]]], part: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    for group, buckets in part.items():
+        target = into.setdefault(group, {})
+        for key, b in buckets.items():
+            t = target.get(key)
+            if t is None:
+                target[key] = b
+                continue
+            for field in ("turns", "failed", "empty", "with_signature", "chars"):
+                t[field] += b[field]
+            for rule, n in b["rules"].items():
+                t["rules"][rule] = t["rules"].get(rule, 0) + n
+
+
+def summary(aggregates: Dict[str, Dict[str, Dict[str, Any]]], done: bool, elapsed: float) -> Dict[str, Any]:
+    def view(b):
+        turns = b["turns"] or 1
+        return {**b, "pass_rate": 1 - b["failed"] / turns, "signature_rate": b["with_signature"] / turns,
+                "avg_chars": b["chars"] / turns}
+
+    total = sum(b["turns"] for b in aggregates.get("market", {}).values())
+    return {"done": done, "turns": total, "elapsed_s": round(elapsed, 2),
+            "turns_per_s": total / elapsed if elapsed else 0.0,
+            "by_market": {k: view(b) for k, b in sorted(aggregates.get("market", {}).items())},
+            "by_scenario": {k: view(b) for k, b in sorted(aggregates.get("scenario", {}).items())}}
+
+
+def write_snapshot(path: str, data: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run(paths: List[str], output: Optional[str] = None, violations_path: Optional[str] = None,
+        workers: Optional[int] = None, chunk_size: int = 5000, flush_every: int = 20,
+        profile_path: str = DEFAULT_PROFILE_PATH) -> Dict[str, Any]:
+    """Audit every turn in paths; returns the final summary (also written to output when given)."""
+    workers = workers or os.cpu_count() or 1
+    turns = read_turns(paths)
+    aggregates: Dict[str, Dict[str, Dict[str, Any]]] = {"market": {}, "scenario": {}}
+    started = time.perf_counter()
+    chunks_done = 0
+    out_violations = open(violations_path, "w", encoding="utf-8") if violations_path else None
+
+    def collect(fut) -> None:
+        nonlocal chunks_done
+        part, violations = fut.result()
+        merge(aggregates, part)
+        if out_violations:
+            for v in violations:
+                out_violations.write(json.dumps(v, ensure_ascii=False) + "\n")
+        chunks_done += 1
+        if output and chunks_done % flush_every == 0:
+            write_snapshot(output, summary(aggregates, False, time.perf_counter() - started))
+            if out_violations:
+                out_violations.flush()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(os.path.abspath(profile_path),)) as pool:
+            pending = deque()
+            while True:
+                chunk = list(islice(turns, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_audit_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        if out_violations:
+            out_violations.close()
+    result = summary(aggregates, True, time.perf_counter() - started)
+    if output:
+        write_snapshot(output, result)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Audit transcripts (round reports, e2e .txt, WhatsApp JSONL).")
+    parser.add_argument("inputs", nargs="+", help="round_*.json, e2e *.txt or WhatsApp export *.jsonl files")
+    parser.add_argument("-o", "--output", default=None, help="aggregate JSON, rewritten while the audit runs")
+    parser.add_argument("--violations", default=None, help="JSONL with one line per failing turn")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="turns per task")
+    parser.add_argument("--flush-every", type=int, default=20, help="rewrite --output every N finished chunks")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_PATH, help="profile JSON with the rules")
+    args = parser.parse_args(argv)
+
+    result = run(args.inputs, args.output, args.violations, workers=args.workers, chunk_size=args.chunk_size,
+                 flush_every=args.flush_every, profile_path=args.profile)
+    for market, b in result["by_market"].items():
+        rules = ", ".join(f"{r}={n}" for r, n in sorted(b["rules"].items())) or "-"
+        print(f"{market:<6} turns={b['turns']:<8} pass={b['pass_rate']:.1%} signature={b['signature_rate']:.1%} "
+              f"rules: {rules}")
+    print(f"{result['turns']} turns in {result['elapsed_s']:.1f}s ({result['turns_per_s']:.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Campaign CLI: stream contacts from CSV/JSONL and write one opener per contact as JSONL.
+
+    python -m ai_vendedora.campaign contacts.csv -o openers.jsonl --salt campanha-2024-10
+    python -m ai_vendedora.campaign contacts.jsonl -o openers.jsonl --resume
+
+Input columns/keys follow generate(): name, role, market, language, company, last_contact_date,
+plus an id (--id-field). Each output line is {"offset", "id", "message", "meta"} in input order.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ai_vendedora.generator import DEFAULT_PROFILE_PATH, LeandroOpeningGenerator
+from ai_vendedora.near_dup import NearDuplicateIndex
+
+CONTACT_FIELDS = ("name", "role", "market", "language", "company", "recent_activity", "last_contact_date")
+
+_worker: Optional[LeandroOpeningGenerator] = None
+_worker_opts: Dict[str, Any] = {}
+
+
+def contact_seed(contact_id: str, salt: str = "") -> int:
+    """Deterministic 64-bit seed from the contact id; the salt lets each campaign draw different openers."""
+    digest = hashlib.sha256(f"{salt}\x00{contact_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_contacts(path: str, fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yield one contact dict per record without loading the file."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+            return
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise SystemExit(f"{path}:{lineno}: invalid JSON ({e})")
+
+
+def resume_offset(output: str, start_offset: int = 0) -> int:
+    """
+    Input offset to continue from: one past the "offset" of the last complete line of output, or
+    start_offset when there is none yet. A torn last line (crash mid-write) is truncated.
+    """
+    if not os.path.exists(output):
+        return start_offset
+    good = 0
+    last = b""
+    with open(output, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            last = line
+    if good != os.path.getsize(output):
+        with open(output, "r+b") as f:
+            f.truncate(good)
+    return json.loads(last)["offset"] + 1 if last.strip() else start_offset
+
+
+def _init_worker(profile_path: str, opts: Dict[str, Any], near_duplicates: Optional[str] = None) -> None:
+    global _worker, _worker_opts
+    index = NearDuplicateIndex(near_duplicates) if near_duplicates else None
+    _worker = LeandroOpeningGenerator(profile_path, near_duplicates=index)
+    _worker_opts = opts
+
+
+def _render_chunk(chunk: Tuple[int, List[Dict[str, Any]]]) -> str:
+    start, contacts = chunk
+    opts = _worker_opts
+    ids = [str(c[opts["id_field"]]) if c.get(opts["id_field"]) not in (None, "") else str(start + i)
+           for i, c in enumerate(contacts)]
+    seeds = [contact_seed(cid, opts["salt"]) for cid in ids]
+    results = _worker.generate_many(
+        [{k: c.get(k) for k in CONTACT_FIELDS} for c in contacts],
+        seeds=seeds,
+        include_signature_phrase=opts["signature"],
+        include_intro_for_prospect=opts["intro"],
+    )
+    lines = []
+    for i, (cid, out) in enumerate(zip(ids, results)):
+        record = {"offset": start + i, "id": cid, "message": out["message"], "meta": out["meta"]}
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
+
+
+def chunked(contacts: Iterator[Dict[str, Any]], start: int, size: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    while True:
+        chunk = list(islice(contacts, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def run(input_path: str, output: str, fmt: Optional[str] = None, workers: Optional[int] = None,
+        chunk_size: int = 2000, salt: str = "", id_field: str = "id", start_offset: int = 0,
+        resume: bool = False, profile_path: str = DEFAULT_PROFILE_PATH,
+        signature: bool = True, intro: bool = True, near_duplicates: Optional[str] = None) -> int:
+    """
+    Generate openers for input_path into output; returns how many records were written now.
+    near_duplicates: NearDuplicateIndex directory; the index has a single writer, so the openers are then
+    rendered in this process (no pool) and checked against everything already sent, in input order.
+    """
+    if resume:
+        start_offset = resume_offset(output, start_offset)
+    contacts = islice(read_contacts(input_path, fmt or detect_format(input_path)), start_offset, None)
+    workers = workers or os.cpu_count() or 1
+    opts = {"id_field": id_field, "salt": salt, "signature": signature, "intro": intro}
+    written = 0
+
+    if near_duplicates:
+        _init_worker(os.path.abspath(profile_path), opts, near_duplicates)
+        try:
+            with open(output, "a" if resume else "w", encoding="utf-8") as out:
+                for chunk in chunked(contacts, start_offset, chunk_size):
+                    out.write(_render_chunk(chunk))
+                    out.flush()
+                    written += len(chunk[1])
+        finally:
+            _worker.near_duplicates.close()
+        return written
+
+    # Bounded window of in-flight chunks keeps memory flat; results are written back in input order.
+    with open(output, "a" if resume else "w", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(os.path.abspath(profile_path), opts)) as pool:
+        pending = deque()
+        for chunk in chunked(contacts, start_offset, chunk_size):
+            pending.append((len(chunk[1]), pool.submit(_render_chunk, chunk)))
+            if len(pending) >= workers * 2:
+                n, fut = pending.popleft()
+                out.write(fut.result())
+                out.flush()
+                written += n
+        while pending:
+            n, fut = pending.popleft()
+            out.write(fut.result())
+            out.flush()
+            written += n
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate Leandro openers for a contact list (CSV or JSONL).")
+    parser.add_argument("input", help="contacts file (.csv or .jsonl)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output, one opener per contact")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: by extension)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="contacts per task")
+    parser.add_argument("--salt", default="", help="campaign salt mixed into the per-contact seed")
+    parser.add_argument("--id-field", default="id", help="contact id column; falls back to the input offset")
+    parser.add_argument("--start-offset", type=int, default=0, help="skip the first N input records")
+    parser.add_argument("--resume", action="store_true", help="continue after the last complete line of --output")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_PATH, help="profile JSON path")
+    parser.add_argument("--near-duplicates", default=None, metavar="DIR",
+                        help="re-draw openers too similar to ones in this index (single process)")
+    parser.add_argument("--no-signature", action="store_true", help="omit the signature phrase")
+    parser.add_argument("--no-intro", action="store_true", help="omit the intro for prospects")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    written = run(args.input, args.output, fmt=args.format, workers=args.workers, chunk_size=args.chunk_size,
+                  salt=args.salt, id_field=args.id_field, start_offset=args.start_offset, resume=args.resume,
+                  profile_path=args.profile, signature=not args.no_signature, intro=not args.no_intro,
+                  near_duplicates=args.near_duplicates)
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0.0
+    print(f"{written} openers -> {args.output} in {elapsed:.1f}s ({rate:.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Persistent near-duplicate index for sent openers (MinHash + LSH, memory-mapped).
+
+Messages are reduced to word 3-gram shingles and a MinHash signature (num_perm 32-bit minima, one
+shake_128 digest per shingle). LSH splits the signature into bands; two messages whose Jaccard
+similarity is s share at least one band with probability 1 - (1 - s**rows)**bands. Candidates found
+through the bands are then scored by the fraction of equal signature slots.
+
+Each market lives in its own directory with two files, both memory-mapped and grown by doubling:
+  signatures.bin  header + fixed-size signature records (record id = position)
+  lsh.bin         header + open-addressing table of (band key, record id + 1) slots
+Only the pages touched by a lookup are read, so the index does not have to fit in RAM.
+Single writer per directory; readers in other processes see a consistent prefix after reopening.
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+from array import array
+from functools import lru_cache
+from operator import eq
+from typing import Dict, List, Optional, Set
+
+try:
+    import numpy as np
+except ImportError:  # optional: the signature minimum falls back to pure Python
+    np = None
+
+_SIG_MAGIC = b"LDUPSIG1"
+_LSH_MAGIC = b"LDUPLSH1"
+_SIG_HEADER = struct.Struct("<8sIIQ")  # magic, num_perm, bands, count
+_LSH_HEADER = struct.Struct("<8sQQ")  # magic, capacity (slots), used
+_SLOT = struct.Struct("<QQ")  # band key (0 = empty), record id + 1
+_WORD = re.compile(r"\w+")
+_MARKET = re.compile(r"[A-Z]{2,5}")  # market codes (BR, US, LATAM...) double as directory names
+
+
+def shingles(text: str, k: int = 3) -> Set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+@lru_cache(maxsize=65536)
+def _shingle_hashes(shingle: str, num_perm: int) -> bytes:
+    # num_perm 32-bit hashes of one shingle; openers reuse the same phrases, so most calls hit the cache
+    return hashlib.shake_128(shingle.encode("utf-8")).digest(4 * num_perm)
+
+
+@lru_cache(maxsize=65536)
+def _shingle_values(shingle: str, num_perm: int) -> tuple:
+    return tuple(array("I", _shingle_hashes(shingle, num_perm)))
+
+
+class _MappedFile:
+    """A file mapped read/write whose size can be grown by remapping."""
+
+    def __init__(self, path: str, header: bytes, initial_size: int):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "r+b" if not new else "w+b")
+        if new:
+            self.file.write(header)
+            self.file.truncate(initial_size)
+            self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def grow(self, size: int) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def close(self) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class _MarketStore:
+    def __init__(self, directory: str, num_perm: int, bands: int, bucket_limit: int):
+        os.makedirs(directory, exist_ok=True)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.bucket_limit = bucket_limit
+        self.record_size = 4 * num_perm
+
+        self.sigs = _MappedFile(os.path.join(directory, "signatures.bin"),
+                                _SIG_HEADER.pack(_SIG_MAGIC, num_perm, bands, 0),
+                                _SIG_HEADER.size + 1024 * self.record_size)
+        magic, stored_perm, stored_bands, self.count = _SIG_HEADER.unpack_from(self.sigs.map, 0)
+        if magic != _SIG_MAGIC or (stored_perm, stored_bands) != (num_perm, bands):
+            raise ValueError(f"{directory}: index built with num_perm={stored_perm}, bands={stored_bands}")
+
+        self.lsh = _MappedFile(os.path.join(directory, "lsh.bin"),
+                               _LSH_HEADER.pack(_LSH_MAGIC, 4096, 0),
+                               _LSH_HEADER.size + 4096 * _SLOT.size)
+        magic, self.capacity, self.used = _LSH_HEADER.unpack_from(self.lsh.map, 0)
+        if magic != _LSH_MAGIC:
+            raise ValueError(f"{directory}: not a near-duplicate index")
+
+    def band_keys(self, sig: array) -> List[int]:
+        rows = self.rows
+        keys = []
+        for b in range(self.bands):
+            digest = hashlib.blake2b(sig[b * rows:(b + 1) * rows].tobytes(), digest_size=8, person=bytes([b])).digest()
+            keys.append(int.from_bytes(digest, "little") or 1)
+        return keys
+
+    def candidates(self, keys: List[int]) -> Set[int]:
+        found: Set[int] = set()
+        mm, mask, base = self.lsh.map, self.capacity - 1, _LSH_HEADER.size
+        for key in keys:
+            i = key & mask
+            while True:
+                slot_key, rid = _SLOT.unpack_from(mm, base + i * _SLOT.size)
+                if not slot_key:
+                    break
+                if slot_key == key:
+                    found.add(rid - 1)
+                i = (i + 1) & mask
+        return found
+
+    def signature(self, rid: int) -> array:
+        start = _SIG_HEADER.size + rid * self.record_size
+        sig = array("I")
+        sig.frombytes(self.sigs.map[start:start + self.record_size])
+        return sig
+
+    def add(self, sig: array, keys: List[int]) -> int:
+        rid = self.count
+        end = _SIG_HEADER.size + (rid + 1) * self.record_size
+        if end > len(self.sigs.map):
+            self.sigs.grow(_SIG_HEADER.size + 2 * (len(self.sigs.map) - _SIG_HEADER.size))
+        self.sigs.map[end - self.record_size:end] = sig.tobytes()
+        if (self.used + len(keys)) * 2 > self.capacity:
+            self._rehash(self.capacity * 2)
+        for key in keys:
+            self._insert(key, rid)
+        self.count = rid + 1
+        _SIG_HEADER.pack_into(self.sigs.map, 0, _SIG_MAGIC, self.num_perm, self.bands, self.count)
+        _LSH_HEADER.pack_into(self.lsh.map, 0, _LSH_MAGIC, self.capacity, self.used)
+        return rid
+
+    def _insert(self, key: int, rid: int) -> None:
+        mm, mask, base = self.lsh.map, self.capacity - 1, _LSH_HEADER.size
+        i = key & mask
+        same = 0
+        while True:
+            slot_key, _ = _SLOT.unpack_from(mm, base + i * _SLOT.size)
+            if not slot_key:
+                break
+            if slot_key == key:
+                same += 1
+                if same >= self.bucket_limit:
+                    # Saturated bucket: its records already represent this band well enough
+                    return
+            i = (i + 1) & mask
+        _SLOT.pack_into(mm, base + i * _SLOT.size, key, rid + 1)
+        self.used += 1
+
+    def _rehash(self, capacity: int) -> None:
+        old = bytes(self.lsh.map[_LSH_HEADER.size:])
+        self.lsh.grow(_LSH_HEADER.size + capacity * _SLOT.size)
+        self.lsh.map[_LSH_HEADER.size:] = bytes(capacity * _SLOT.size)
+        self.capacity, self.used = capacity, 0
+        limit, self.bucket_limit = self.bucket_limit, 1 << 62  # every old entry was admitted already
+        for key, rid in _SLOT.iter_unpack(old):
+            if key:
+                self._insert(key, rid - 1)
+        self.bucket_limit = limit
+
+    def close(self) -> None:
+        self.sigs.close()
+        self.lsh.close()
+
+
+class NearDuplicateIndex:
+    """
+    Per-market MinHash LSH index rooted at a directory. threshold is the estimated Jaccard similarity
+    (on word 3-grams) at or above which a new message counts as a near-duplicate of a stored one; openers
+    that differ in a single segment (e.g. only the signature phrase) score about 0.5-0.8, unrelated ones ~0.3.
+    bucket_limit caps how many records are kept per band key, which bounds the candidates scored per lookup.
+    """
+
+    def __init__(self, directory: str, threshold: float = 0.5, num_perm: int = 64, bands: int = 16,
+                 bucket_limit: int = 8):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.directory = directory
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.bucket_limit = bucket_limit
+        self._stores: Dict[str, _MarketStore] = {}
+
+    def _store(self, market: Optional[str]) -> _MarketStore:
+        # The market comes from contact input and becomes a path: anything but a plain code goes to "_"
+        market = (market or "").strip().upper()
+        if not _MARKET.fullmatch(market):
+            market = "_"
+        store = self._stores.get(market)
+        if store is None:
+            store = self._stores[market] = _MarketStore(os.path.join(self.directory, market), self.num_perm,
+                                                        self.bands, self.bucket_limit)
+        return store
+
+    def signature(self, text: str) -> array:
+        num_perm = self.num_perm
+        if np is not None:
+            rows = b"".join(_shingle_hashes(s, num_perm) for s in shingles(text))
+            return array("I", np.frombuffer(rows, dtype=np.uint32).reshape(-1, num_perm).min(axis=0).tobytes())
+        return array("I", map(min, zip(*[_shingle_values(s, num_perm) for s in shingles(text)])))
+
+    def similarity(self, sig: array, market: Optional[str] = None) -> float:
+        """Highest estimated similarity between sig and any stored message of the market (0.0 if none)."""
+        store = self._store(market)
+        best = 0.0
+        for rid in store.candidates(store.band_keys(sig)):
+            other = store.signature(rid)
+            score = sum(map(eq, sig, other)) / self.num_perm
+            if score > best:
+                best = score
+                if best >= self.threshold:
+                    break
+        return best
+
+    def add(self, sig: array, market: Optional[str] = None) -> int:
+        store = self._store(market)
+        return store.add(sig, store.band_keys(sig))
+
+    def __len__(self) -> int:
+        return sum(store.count for store in self._stores.values())
+
+    def close(self) -> None:
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
@@ -0,0 +1,87 @@
+"""
+Mixed-radix view of an opener table's choice space, plus an O(1)-memory seeded permutation over it.
+
+Each choice segment (greeting, question, intro, hook, signature, CTA) is a digit whose radix is the
+segment size, so every combination is one integer in [0, size). Walking a SeededPermutation of that
+range hands out every combination exactly once, in a shuffled order, without storing what was used.
+"""
+import random
+from typing import List, Optional, Tuple
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer: cheap, well-distributed round function for the Feistel network
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class SeededPermutation:
+    """
+    Bijection of range(n) keyed by seed: a 4-round Feistel network over the next even power of two,
+    cycle-walking until the result falls inside range(n). Memory is O(1) whatever n is.
+    """
+
+    __slots__ = ("n", "seed", "_half", "_mask", "_keys")
+
+    def __init__(self, n: int, seed: int):
+        if n < 1:
+            raise ValueError("permutation size must be >= 1")
+        self.n = n
+        self.seed = seed
+        bits = max(2, (n - 1).bit_length())
+        bits += bits & 1
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        self._keys = tuple(_mix64((seed & _MASK64) ^ _mix64(r)) for r in range(4))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self._half, x & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix64(right ^ key) & self._mask)
+        return (left << self._half) | right
+
+    def __getitem__(self, i: int) -> int:
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        x = self._encrypt(i)
+        while x >= self.n:
+            x = self._encrypt(x)
+        return x
+
+
+class VariantSpace:
+    """All openers of one (market, role, language) table, addressable by a mixed-radix index."""
+
+    __slots__ = ("table", "slots", "radices", "size")
+
+    def __init__(self, table, include_signature_phrase: bool = True, include_intro_for_prospect: bool = True):
+        self.table = table
+        self.slots = table.slots(include_signature_phrase, include_intro_for_prospect)
+        self.radices: Tuple[int, ...] = tuple(len(s) for s in self.slots)
+        size = 1
+        for radix in self.radices:
+            size *= radix or 1
+        self.size = size
+
+    def picks(self, index: int) -> List[str]:
+        """Segment strings for a variant index; empty segments give ""."""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        picks = []
+        for segment, radix in zip(self.slots, self.radices):
+            if radix:
+                index, digit = divmod(index, radix)
+                picks.append(segment[digit])
+            else:
+                picks.append("")
+        return picks
+
+    def permutation(self, seed: Optional[int] = None) -> SeededPermutation:
+        return SeededPermutation(self.size, random.getrandbits(64) if seed is None else seed)
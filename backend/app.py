@@ -1,15 +1,31 @@
 import asyncio
+import heapq
+import itertools
 import json
 import os
+import random
+import sqlite3
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import urlsplit
 
+import requests
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+
+from backend.cassette import cassette_http_client
+from backend.history import HistoryManager, count_tokens
+from backend.knowledge import KnowledgeIndex
 
 ROOT = Path(__file__).resolve().parents[1]
 load_dotenv(ROOT / "backend" / ".env", override=False)
@@ -20,11 +36,79 @@ if not API_KEY:
     raise RuntimeError("Defina OPENAI_API_KEY no ambiente ou .env")
 
 STATE_PATH = ROOT / ".assistant_state.json"
+INSTR_PATH = ROOT / "gpt_instructions.txt"
+ADMIN_CONFIG_PATH = ROOT / "admin-config.json"
+PROFILE_PATH = ROOT / "perfil completot odos dados ia.txt"
+EXAMPLES_PATH = ROOT / "gpt_conversation_examples.json"
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
 PORT = int(os.getenv("PORT", "8080"))
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+RUN_TIMEOUT_S = int(os.getenv("RUN_TIMEOUT_S", "90"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "1"))
+JOB_POLL_CONCURRENCY = int(os.getenv("JOB_POLL_CONCURRENCY", "32"))
+JOB_TTL_S = int(os.getenv("JOB_TTL_S", "3600"))
+# Hosts aceitos no callback_url, separados por vírgula (".exemplo.com" aceita os subdomínios). Vazio = sem callbacks
+JOB_CALLBACK_HOSTS = tuple(h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip())
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH") or str(ROOT / ".sessions.sqlite3")
+SESSION_TTL_S = int(os.getenv("SESSION_TTL_S", str(7 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+THREAD_POOL_LOW = int(os.getenv("THREAD_POOL_LOW", "2"))
+THREAD_POOL_HIGH = int(os.getenv("THREAD_POOL_HIGH", "8"))
+THREAD_POOL_MAX_AGE_S = int(os.getenv("THREAD_POOL_MAX_AGE_S", str(24 * 3600)))
+TIMING_LOG = os.getenv("TIMING_LOG", "0") == "1"
+# assistants: threads/runs da Assistants API | completions: histórico local + 1 chamada de Chat Completions
+CHAT_ENGINE = os.getenv("CHAT_ENGINE", "assistants").lower()
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "40"))
+# Acima do orçamento, turnos antigos viram uma nota de memória e só os recentes seguem literais
+HISTORY_BUDGET_TOKENS = int(os.getenv("HISTORY_BUDGET_TOKENS", "3000"))
+HISTORY_RECENT_TOKENS = int(os.getenv("HISTORY_RECENT_TOKENS", "1200"))
+HISTORY_NOTE_MAX_TOKENS = int(os.getenv("HISTORY_NOTE_MAX_TOKENS", "400"))
+
+if CHAT_ENGINE not in ("assistants", "completions"):
+    raise RuntimeError(f"CHAT_ENGINE inválido: {CHAT_ENGINE} (use assistants ou completions)")
+# local: índice BM25 em processo (sem file_search) | remote: file_search no vector store da OpenAI
+KNOWLEDGE_MODE = (os.getenv("KNOWLEDGE_MODE") or ("local" if CHAT_ENGINE == "completions" else "remote")).lower()
+KNOWLEDGE_INDEX_PATH = Path(os.getenv("KNOWLEDGE_INDEX_PATH") or ROOT / ".knowledge_index.json")
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+KNOWLEDGE_TOP_EXAMPLES = int(os.getenv("KNOWLEDGE_TOP_EXAMPLES", "2"))
+# Gravação/reprodução das chamadas à OpenAI (backend/cassette.py): record | replay | strict
+OPENAI_CASSETTE = os.getenv("OPENAI_CASSETTE")
+OPENAI_CASSETTE_MODE = os.getenv("OPENAI_CASSETTE_MODE", "replay").lower()
+# Limites da conta na OpenAI, compartilhados entre workers (0 = sem limite local)
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+OPENAI_RATE_BURST_S = float(os.getenv("OPENAI_RATE_BURST_S", "10"))
+OPENAI_RETRY_MAX_S = float(os.getenv("OPENAI_RETRY_MAX_S", "20"))
+OPENAI_OUTPUT_TOKENS = int(os.getenv("OPENAI_OUTPUT_TOKENS", "800"))
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH") or SESSION_DB_PATH
+POLL_MIN_INTERVAL_S = float(os.getenv("POLL_MIN_INTERVAL_S", "0.25"))
+POLL_MAX_INTERVAL_S = float(os.getenv("POLL_MAX_INTERVAL_S", "1"))
+
+# Cliente assíncrono único por processo: todas as requisições compartilham o
+# mesmo pool de conexões keep-alive e nenhuma chamada bloqueia o event loop.
+# Os retries ficam com o AdmissionController (passam de novo pelos limites), não com o SDK.
+client = AsyncOpenAI(timeout=OPENAI_TIMEOUT_S, max_retries=0,
+                     http_client=cassette_http_client(OPENAI_CASSETTE, OPENAI_CASSETTE_MODE))
+
 
-client = OpenAI()
-app = FastAPI(title="Agente Leandro API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CHAT_ENGINE == "assistants":
+        thread_pool.refill()
+    yield
+    await thread_pool.stop()
+    await scheduler.stop()
+    await admission.stop()
+    await client.close()
+    sessions.close()
+    conversations.close()
+    job_store.close()
+    history.close()
+    admission.limiter.close()
+
+
+app = FastAPI(title="Agente Leandro API", lifespan=lifespan)
 # CORS para frontend em localhost:3000
 app.add_middleware(
     CORSMiddleware,
@@ -39,11 +123,249 @@ class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     thread_id: Optional[str] = None
+    # Modo job: /chat responde 202 logo após runs.create; o resultado sai em
+    # GET /chat/jobs/{job_id} e, se informado, via POST no callback_url.
+    async_job: bool = False
+    callback_url: Optional[str] = None
+    # Opcionais: direcionam a escolha dos exemplos no conhecimento local (ex.: "US", "distributor")
+    market: Optional[str] = None
+    role: Optional[str] = None
+
+
+class Metrics:
+    """Registro mínimo de métricas no formato texto do Prometheus (sem dependência externa)."""
+
+    def __init__(self):
+        self._meta: dict[str, tuple[str, str, tuple]] = {}
+        self._values: dict[str, dict[tuple, object]] = {}
+
+    def declare(self, name: str, kind: str, help_text: str, buckets: tuple = ()) -> None:
+        self._meta[name] = (kind, help_text, buckets)
+        self._values.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._values[name]
+        series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = self._meta[name][2]
+        key = tuple(sorted(labels.items()))
+        h = self._values[name].get(key)
+        if h is None:
+            h = self._values[name][key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                h["buckets"][i] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+    @staticmethod
+    def _labels(key: tuple, extra: tuple = ()) -> str:
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text, buckets) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in self._values[name].items():
+                if kind != "histogram":
+                    lines.append(f"{name}{self._labels(key)} {value}")
+                    continue
+                for bound, count in zip(buckets, value["buckets"]):
+                    lines.append(f"{name}_bucket{self._labels(key, (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{self._labels(key, (('le', '+Inf'),))} {value['count']}")
+                lines.append(f"{name}_sum{self._labels(key)} {value['sum']}")
+                lines.append(f"{name}_count{self._labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90)
+
+metrics = Metrics()
+metrics.declare("leandro_request_seconds", "histogram", "Duração total por endpoint.", LATENCY_BUCKETS)
+metrics.declare("leandro_stage_seconds", "histogram",
+                "Duração por etapa (threads.create, messages.create, runs.create, run.wait, messages.list, ...).",
+                LATENCY_BUCKETS)
+metrics.declare("leandro_poll_iterations", "histogram", "Iterações de runs.retrieve por run no poll_run.",
+                (1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+metrics.declare("leandro_inflight_requests", "gauge", "Requisições em andamento por endpoint.")
+metrics.declare("leandro_pending_jobs", "gauge", "Jobs do modo assíncrono aguardando o run.")
+metrics.declare("leandro_active_threads", "gauge", "Threads com run ativo ou mensagens na fila.")
+metrics.declare("leandro_thread_pool_ready", "gauge", "Threads pré-criados disponíveis no pool.")
+metrics.declare("leandro_thread_pool_total", "counter", "Primeiros contatos atendidos pelo pool (hit) ou não (miss).")
+metrics.declare("leandro_run_failures_total", "counter",
+                "Runs que não terminaram bem: failed/cancelled/expired (500), timeout (504), no_reply (500).")
+metrics.declare("leandro_admission_queue", "gauge", "Chamadas à OpenAI aguardando os limites, por prioridade.")
+metrics.declare("leandro_openai_retries_total", "counter", "Chamadas à OpenAI repetidas, por status (429, 5xx, conexão).")
+
+# Tempos por etapa da requisição corrente (para a linha de log estruturada)
+_timing: ContextVar[Optional[dict]] = ContextVar("timing", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("leandro_stage_seconds", elapsed, stage=name)
+        timing = _timing.get()
+        if timing is not None:
+            timing["stages"][name] = timing["stages"].get(name, 0.0) + elapsed
+
+
+def new_timing(endpoint: str) -> dict:
+    return {"endpoint": endpoint, "start": time.perf_counter(), "stages": {}, "fields": {}}
+
+
+@contextmanager
+def timing_scope(timing: Optional[dict]):
+    token = _timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _timing.reset(token)
+
+
+@contextmanager
+def track_request(timing: dict):
+    """Mede a requisição inteira: gauge de in-flight, histograma total e linha de log opcional (TIMING_LOG=1)."""
+    endpoint = timing["endpoint"]
+    metrics.inc("leandro_inflight_requests", 1, endpoint=endpoint)
+    status = 200
+    try:
+        with timing_scope(timing):
+            yield timing
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        metrics.inc("leandro_inflight_requests", -1, endpoint=endpoint)
+        total = time.perf_counter() - timing["start"]
+        metrics.observe("leandro_request_seconds", total, endpoint=endpoint)
+        if TIMING_LOG:
+            print(json.dumps({
+                "event": "timing",
+                "endpoint": endpoint,
+                "status": status,
+                "total_ms": round(total * 1000, 1),
+                "stages_ms": {k: round(v * 1000, 1) for k, v in timing["stages"].items()},
+                **timing["fields"],
+            }, ensure_ascii=False), flush=True)
+
+
+def note(**fields) -> None:
+    timing = _timing.get()
+    if timing is not None:
+        timing["fields"].update(fields)
 
 
 @app.get("/healthz")
 async def healthz():
-    return {"status": "ok"}
+    # cassette: as suítes de teste pulam as pausas quando o backend está reproduzindo (replay/strict)
+    return {"status": "ok", "thread_pool": thread_pool.stats(), "admission": admission.stats(),
+            "cassette": {"mode": OPENAI_CASSETTE_MODE} if OPENAI_CASSETTE else None}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    metrics.set("leandro_pending_jobs", len(scheduler._pending))
+    metrics.set("leandro_active_threads", lanes.active())
+    metrics.set("leandro_thread_pool_ready", thread_pool.stats()["ready"])
+    metrics.set("leandro_thread_pool_total", thread_pool.hits, result="hit")
+    metrics.set("leandro_thread_pool_total", thread_pool.misses, result="miss")
+    for name, depth in admission.stats()["queued_by_priority"].items():
+        metrics.set("leandro_admission_queue", depth, priority=name)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_instructions_cache: dict = {"key": None, "text": ""}
+
+
+def load_instructions() -> str:
+    """
+    Instruções do engine completions: as mesmas do bootstrap (gpt_instructions.txt)
+    mais o admin_instructions do admin-config.json. Relê só quando os arquivos mudam.
+    """
+    paths = (INSTR_PATH, ADMIN_CONFIG_PATH)
+    key = tuple(p.stat().st_mtime_ns if p.exists() else None for p in paths)
+    if key != _instructions_cache["key"]:
+        parts = []
+        if INSTR_PATH.exists():
+            parts.append(INSTR_PATH.read_text(encoding="utf-8").strip())
+        if ADMIN_CONFIG_PATH.exists():
+            admin = json.loads(ADMIN_CONFIG_PATH.read_text(encoding="utf-8") or "{}")
+            if str(admin.get("admin_instructions") or "").strip():
+                parts.append(admin["admin_instructions"].strip())
+        _instructions_cache.update(key=key, text="\n\n".join(p for p in parts if p))
+    return _instructions_cache["text"]
+
+
+_knowledge_cache: dict = {"key": None, "index": None}
+
+
+def get_knowledge() -> KnowledgeIndex:
+    # Confere só o mtime por requisição; o hash do conteúdo decide se o índice em disco ainda vale
+    key = tuple(p.stat().st_mtime_ns if p.exists() else None for p in (PROFILE_PATH, EXAMPLES_PATH))
+    if key != _knowledge_cache["key"]:
+        _knowledge_cache.update(
+            key=key, index=KnowledgeIndex.load_or_build(KNOWLEDGE_INDEX_PATH, PROFILE_PATH, EXAMPLES_PATH)
+        )
+    return _knowledge_cache["index"]
+
+
+def knowledge_context(message: str, market: Optional[str] = None, role: Optional[str] = None) -> str:
+    if KNOWLEDGE_MODE != "local":
+        return ""
+    with stage("knowledge.search"):
+        return get_knowledge().context(
+            message, market=market, role=role, k_chunks=KNOWLEDGE_TOP_K, k_examples=KNOWLEDGE_TOP_EXAMPLES
+        )
+
+
+def thread_context(thread_id: str, market: Optional[str] = None, role: Optional[str] = None) -> dict:
+    """history.context() e se a cópia local tem o thread inteiro; bloqueia (SQLite), chame via asyncio.to_thread."""
+    return {**history.context(thread_id, market, role), "complete": conversations.complete(thread_id)}
+
+
+async def run_options(message: str, market: Optional[str] = None, role: Optional[str] = None,
+                      thread_id: Optional[str] = None) -> dict:
+    """
+    Com conhecimento local o run recebe o contexto e roda sem file_search (sem a busca remota).
+    Com thread_id e histórico já compactado, a nota de memória vai junto das instruções adicionais
+    e, se a cópia local tem o thread inteiro, o run lê só os turnos recentes (truncation_strategy).
+    A mensagem do cliente deste turno já precisa estar na cópia local (add_user_message).
+    """
+    options = {}
+    if KNOWLEDGE_MODE == "local":
+        options = {
+            "additional_instructions": knowledge_context(message, market, role),
+            "tools": [{"type": "code_interpreter"}],
+        }
+    if thread_id:
+        with stage("history.context"):
+            context = await asyncio.to_thread(thread_context, thread_id, market, role)
+        note(history_tokens=context["tokens"], history_compacted=context["compacted"])
+        if context["note"]:
+            extra = [context["note"], options.get("additional_instructions")]
+            options["additional_instructions"] = "\n\n".join(p for p in extra if p)
+            # As mensagens literais são as últimas do thread (a deste turno inclusive); num thread com mensagens
+            # que a cópia local não viu, cortar pela contagem dela perderia turnos que a nota não resumiu
+            if context["complete"]:
+                options["truncation_strategy"] = {"type": "last_messages", "last_messages": len(context["messages"])}
+    return options
 
 
 def load_state():
@@ -55,58 +377,1237 @@ def load_state():
     return data
 
 
-async def poll_run(thread_id: str, run_id: str, timeout_s: int = 90) -> None:
-    start = time.time()
-    while True:
-        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        status = run.status
-        if status in ("completed", "failed", "cancelled", "expired"):
-            if status != "completed":
-                raise HTTPException(500, f"Run terminou com status={status}")
+# Prioridade das chamadas à OpenAI quando os limites seguram a fila (menor sai antes)
+PRIORITY_RUN = 0         # acompanhar/ler um run já criado: o custo já foi pago
+PRIORITY_REPLY = 1       # resposta a uma conversa em andamento
+PRIORITY_NEW = 2         # primeiro contato (ex.: disparo de campanha)
+PRIORITY_BACKGROUND = 3  # reposição do pool de threads
+PRIORITY_NAMES = {PRIORITY_RUN: "run", PRIORITY_REPLY: "reply", PRIORITY_NEW: "new", PRIORITY_BACKGROUND: "background"}
+
+# Prioridade da requisição corrente (definida no ensure_thread)
+_priority: ContextVar[int] = ContextVar("priority", default=PRIORITY_REPLY)
+
+
+class RateLimiter:
+    """
+    Token buckets de requisições/min e tokens/min no SQLite, compartilhados
+    entre workers (mesmo arquivo das sessões por padrão). Cada bucket enche
+    continuamente e guarda até `burst_s` segundos do limite. Limite 0 desliga
+    o bucket. Os métodos são síncronos (a transação pode esperar o lock de
+    outro worker); no event loop, use-os via asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str, rpm: int, tpm: int, burst_s: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.rates = {name: limit / 60.0 for name, limit in (("requests", rpm), ("tokens", tpm)) if limit > 0}
+        self.capacity = {name: max(rate * burst_s, 1.0) for name, rate in self.rates.items()}
+        self._lock = threading.Lock()
+        self._db = None
+        if self.rates:
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " name TEXT PRIMARY KEY,"
+                " level REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rates)
+
+    def _update(self, change: Callable[[dict, float], Optional[dict]]) -> None:
+        # Lê os níveis já reabastecidos, aplica a mudança e grava, tudo numa transação (BEGIN IMMEDIATE
+        # serializa os workers). change devolve os novos níveis ou None para não mexer.
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = {name: (level, at) for name, level, at in
+                        self._db.execute("SELECT name, level, updated_at FROM rate_buckets")}
+                levels = {}
+                for name, rate in self.rates.items():
+                    level, at = rows.get(name, (self.capacity[name], now))
+                    levels[name] = min(self.capacity[name], level + max(0.0, now - at) * rate)
+                new = change(levels, now)
+                if new is not None:
+                    self._db.executemany(
+                        "INSERT INTO rate_buckets(name, level, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated_at = excluded.updated_at",
+                        [(name, level, now) for name, level in new.items()],
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def take(self, tokens: int) -> float:
+        """Consome 1 requisição e `tokens` se houver nos dois buckets; senão devolve quantos segundos esperar."""
+        if not self.enabled:
+            return 0.0
+        cost = {"requests": 1.0, "tokens": float(tokens)}
+        wait = [0.0]
+
+        def change(levels: dict, now: float) -> Optional[dict]:
+            # Custo maior que a capacidade nunca caberia: passa com o bucket cheio
+            need = {name: min(cost[name], self.capacity[name]) for name in levels}
+            wait[0] = max((need[n] - levels[n]) / self.rates[n] for n in levels)
+            if wait[0] > 0:
+                return None
+            return {name: levels[name] - need[name] for name in levels}
+
+        self._update(change)
+        return max(0.0, wait[0])
+
+    def adjust(self, tokens: int) -> None:
+        """Acerta o bucket de tokens com o usage real (positivo cobra, negativo devolve)."""
+        if "tokens" in self.rates and tokens:
+            self._update(lambda levels, now: {**levels, "tokens": levels["tokens"] - tokens})
+
+    def drain(self) -> None:
+        """Depois de um 429 todos os workers esperam o bucket encher de novo."""
+        if self.enabled:
+            self._update(lambda levels, now: {name: min(level, 0.0) for name, level in levels.items()})
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+
+
+def retry_status(exc: BaseException) -> Optional[str]:
+    """Rótulo do erro se valer repetir (conexão, 408, 409, 429, 5xx), senão None."""
+    if isinstance(exc, APIStatusError):
+        code = exc.status_code
+        return str(code) if code in (408, 409, 429) or code >= 500 else None
+    if isinstance(exc, APIConnectionError):
+        return "connection"
+    return None
+
+
+def retry_after_s(exc: BaseException) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("retry-after") or 0)
+    except ValueError:
+        return 0.0
+
+
+class AdmissionController:
+    """
+    Porta de entrada das chamadas à OpenAI: cada chamada espera vaga nos
+    buckets compartilhados (RateLimiter), numa fila por prioridade dentro do
+    worker (runs em andamento > respostas > primeiros contatos > reposição do
+    pool), e é repetida com backoff exponencial com jitter em 429/5xx/erro de
+    conexão. Chamadas não idempotentes (messages.create, runs.create) só são
+    repetidas em 429, quando a API garantidamente não processou o pedido. Um
+    429 esvazia os buckets para todos os workers. O SQLite dos buckets roda
+    fora do event loop (asyncio.to_thread).
+    """
+
+    def __init__(self, limiter: RateLimiter, max_retries: int, backoff_base_s: float = 0.5,
+                 backoff_max_s: float = OPENAI_RETRY_MAX_S):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.admitted = 0
+        self.waited = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._heap: list[tuple[int, int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def call(self, fn: Callable[..., Awaitable], *args, tokens: int = 0,
+                   priority: Optional[int] = None, idempotent: bool = True, **kwargs):
+        priority = _priority.get() if priority is None else priority
+        attempt = 0
+        while True:
+            await self.admit(tokens, priority)
+            try:
+                return await fn(*args, **kwargs)
+            except (APIStatusError, APIConnectionError) as e:
+                status = retry_status(e)
+                if status is None or attempt >= self.max_retries or (not idempotent and status != "429"):
+                    raise
+                if status == "429":
+                    self.rate_limited += 1
+                    await asyncio.to_thread(self.limiter.drain)
+                delay = max(min(retry_after_s(e), self.backoff_max_s),
+                            random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt)))
+                attempt += 1
+                self.retries += 1
+                metrics.inc("leandro_openai_retries_total", status=status)
+                with stage("openai.retry_wait"):
+                    await asyncio.sleep(delay)
+
+    async def admit(self, tokens: int, priority: int) -> None:
+        if not self.limiter.enabled:
             return
-        if time.time() - start > timeout_s:
-            client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
-            raise HTTPException(504, "Timeout aguardando a resposta do Assistente")
-        await asyncio.sleep(1)
+        if not self._heap and await asyncio.to_thread(self.limiter.take, tokens) <= 0:
+            self.admitted += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), tokens, future))
+        if self._task is None or self._task.done():
+            # Primitivas criadas no loop corrente (o loop só existe após o startup)
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._pump())
+        self._wake.set()
+        self.waited += 1
+        with stage("admission.wait"):
+            await future  # cancelada pelo chamador: o _pump descarta
 
+    async def _pump(self) -> None:
+        while True:
+            while self._heap and self._heap[0][3].done():
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            entry = self._heap[0]
+            _, _, tokens, future = entry
+            wait = await asyncio.to_thread(self.limiter.take, tokens)
+            if wait <= 0:
+                # Durante a consulta pode ter entrado alguém na frente: libera exatamente quem foi cobrado
+                if self._heap[0] is entry:
+                    heapq.heappop(self._heap)
+                else:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                if not future.done():
+                    future.set_result(None)
+                    self.admitted += 1
+                continue
+            # Acorda antes se chegar alguém com prioridade maior (ou se a cabeça da fila desistir)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=min(wait, 1.0))
+            except asyncio.TimeoutError:
+                pass
 
-@app.post("/chat")
-async def chat(req: ChatRequest):
-    state = load_state()
-    assistant_id = state["assistant_id"]
+    async def settle(self, estimated: int, usage) -> None:
+        actual = getattr(usage, "total_tokens", None)
+        if isinstance(actual, int) and self.limiter.enabled:
+            await asyncio.to_thread(self.limiter.adjust, actual - estimated)
 
-    # Thread
-    thread_id = req.thread_id
-    if not thread_id:
-        th = client.beta.threads.create()
-        thread_id = th.id
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
 
-    # Mensagem do usuário
-    client.beta.threads.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=req.message,
-    )
+    def stats(self) -> dict:
+        by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._heap:
+            if not future.done():
+                by_priority[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {"queued": sum(by_priority.values()), "queued_by_priority": by_priority,
+                "rpm_limit": self.limiter.rpm, "tpm_limit": self.limiter.tpm,
+                "admitted": self.admitted, "waited": self.waited, "retries": self.retries,
+                "rate_limited": self.rate_limited}
 
-    # Executa
-    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id)
-    await poll_run(thread_id, run.id)
 
-    # Coleta última resposta do assistente
-    msgs = client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=5)
-    assistant_msg = None
+admission = AdmissionController(
+    RateLimiter(RATE_LIMIT_DB_PATH, OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT, OPENAI_RATE_BURST_S), OPENAI_MAX_RETRIES
+)
+
+
+async def api(fn: Callable[..., Awaitable], *args, tokens: int = 0, priority: Optional[int] = None,
+              idempotent: bool = True, **kwargs):
+    """Chamada à OpenAI pelo AdmissionController (limites, prioridade e retries)."""
+    return await admission.call(fn, *args, tokens=tokens, priority=priority, idempotent=idempotent, **kwargs)
+
+
+class RunPacer:
+    """
+    Quando consultar um run: aprende a duração típica (média móvel) e só faz o
+    primeiro runs.retrieve perto dela; depois, intervalos curtos crescendo até
+    max_interval_s. Sem histórico, consulta logo e a partir de min_interval_s.
+    """
+
+    def __init__(self, min_interval_s: float, max_interval_s: float, alpha: float = 0.2):
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.alpha = alpha
+        self.expected_s: Optional[float] = None
+
+    def first_wait(self) -> float:
+        return 0.0 if self.expected_s is None else 0.9 * self.expected_s
+
+    def interval(self, attempt: int) -> float:
+        base = self.min_interval_s if self.expected_s is None else max(self.min_interval_s, 0.1 * self.expected_s)
+        return min(self.max_interval_s, base * 1.5 ** attempt)
+
+    def observe(self, done_s: float, first_poll: bool) -> None:
+        """Run visto pronto na consulta feita done_s segundos após o início (first_poll: na primeira consulta)."""
+        # Pronto já na primeira consulta só diz que terminou antes dela: puxa a estimativa para baixo
+        duration_s = 0.75 * done_s if first_poll else done_s
+        if self.expected_s is None:
+            self.expected_s = duration_s
+        else:
+            self.expected_s += self.alpha * (duration_s - self.expected_s)
+
+
+run_pacer = RunPacer(POLL_MIN_INTERVAL_S, POLL_MAX_INTERVAL_S)
+
+
+async def poll_run(thread_id: str, run_id: str, timeout_s: int = RUN_TIMEOUT_S, tokens: int = 0) -> None:
+    start = time.monotonic()
+    iterations = 0
+    try:
+        with stage("run.wait"):
+            await asyncio.sleep(min(run_pacer.first_wait(), timeout_s))
+            while True:
+                iterations += 1
+                sent_s = time.monotonic() - start
+                run = await api(client.beta.threads.runs.retrieve, thread_id=thread_id, run_id=run_id,
+                                priority=PRIORITY_RUN)
+                status = run.status
+                if status in ("completed", "failed", "cancelled", "expired"):
+                    await admission.settle(tokens, getattr(run, "usage", None))
+                    if status != "completed":
+                        metrics.inc("leandro_run_failures_total", status=status)
+                        raise HTTPException(500, f"Run terminou com status={status}")
+                    run_pacer.observe(sent_s, first_poll=iterations == 1)
+                    return
+                if time.monotonic() - start > timeout_s:
+                    metrics.inc("leandro_run_failures_total", status="timeout")
+                    await api(client.beta.threads.runs.cancel, thread_id=thread_id, run_id=run_id,
+                              priority=PRIORITY_RUN)
+                    raise HTTPException(504, "Timeout aguardando a resposta do Assistente")
+                await asyncio.sleep(run_pacer.interval(iterations - 1))
+    finally:
+        metrics.observe("leandro_poll_iterations", iterations)
+        note(poll_iterations=iterations)
+
+
+def message_text(message) -> Optional[str]:
+    # Conteúdo pode vir em múltiplas partes (texto, blobs etc.)
+    parts = []
+    for c in message.content:
+        if c.type == "text":
+            parts.append(c.text.value)
+    return "\n\n".join(parts) if parts else None
+
+
+async def latest_assistant_message(thread_id: str) -> Optional[str]:
+    with stage("messages.list"):
+        msgs = await api(client.beta.threads.messages.list, thread_id=thread_id, order="desc", limit=5,
+                         priority=PRIORITY_RUN)
     for m in msgs.data:
         if m.role == "assistant":
-            # Conteúdo pode vir em múltiplas partes (texto, blobs etc.)
-            parts = []
-            for c in m.content:
-                if c.type == "text":
-                    parts.append(c.text.value)
-            assistant_msg = "\n\n".join(parts) if parts else None
-            break
+            return message_text(m)
+    return None
+
+
+class SessionStore:
+    """
+    Mapeia session_id -> thread_id. O SQLite (modo WAL) é a fonte de verdade e
+    é compartilhado entre workers; um LRU em memória guarda quando a atividade
+    de cada sessão foi gravada, para gravar no máximo uma vez a cada
+    touch_interval_s. Sessões sem atividade há mais de ttl_s expiram. Os métodos
+    bloqueiam no SQLite: nos handlers, chame via asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str, ttl_s: int, cache_size: int, purge_interval_s: int = 300,
+                 touch_interval_s: float = 60):
+        self.ttl_s = ttl_s
+        self.cache_size = cache_size
+        self.purge_interval_s = purge_interval_s
+        self.touch_interval_s = touch_interval_s
+        self._cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " thread_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_activity REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions(last_activity)")
+
+    def _remember(self, session_id: str, thread_id: str, last_activity: float) -> None:
+        self._cache[session_id] = (thread_id, last_activity)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, session_id: str) -> Optional[str]:
+        """
+        thread_id da sessão, ou None se não existir/expirou. Registra a atividade.
+        Sempre confere o SQLite (outro worker pode ter re-associado ou expirado a
+        sessão); o LRU só evita regravar last_activity a cada turno.
+        """
+        now = time.time()
+        with self._lock:
+            self._maybe_purge(now)
+            cached = self._cache.get(session_id)
+            if cached is not None and now - cached[1] < self.touch_interval_s:
+                row = self._db.execute(
+                    "SELECT thread_id FROM sessions WHERE session_id = ? AND last_activity >= ?",
+                    (session_id, now - self.ttl_s),
+                ).fetchone()
+                touched = cached[1]
+            else:
+                row = self._db.execute(
+                    "UPDATE sessions SET last_activity = ? WHERE session_id = ? AND last_activity >= ? "
+                    "RETURNING thread_id",
+                    (now, session_id, now - self.ttl_s),
+                ).fetchone()
+                touched = now
+            if row is None:
+                self._cache.pop(session_id, None)
+                self._db.execute("DELETE FROM sessions WHERE session_id = ? AND last_activity < ?",
+                                 (session_id, now - self.ttl_s))
+                return None
+            self._remember(session_id, row[0], touched)
+            return row[0]
+
+    def bind(self, session_id: str, thread_id: str, replace: bool = False) -> str:
+        """
+        Associa a sessão ao thread. Sem replace, se outro worker já associou a
+        sessão (e ela não expirou), prevalece o thread dele.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions(session_id, thread_id, created_at, last_activity) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET thread_id = CASE "
+                " WHEN ? OR sessions.last_activity < ? THEN excluded.thread_id ELSE sessions.thread_id END, "
+                "last_activity = excluded.last_activity",
+                (session_id, thread_id, now, now, replace, now - self.ttl_s),
+            )
+            row = self._db.execute(
+                "SELECT thread_id FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._remember(session_id, row[0], now)
+            return row[0]
+
+    def _maybe_purge(self, now: float) -> None:
+        if now - self._last_purge < self.purge_interval_s:
+            return
+        self._last_purge = now
+        self._db.execute("DELETE FROM sessions WHERE last_activity < ?", (now - self.ttl_s,))
+        for sid in [sid for sid, (_, seen) in self._cache.items() if now - seen > self.ttl_s]:
+            del self._cache[sid]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+sessions = SessionStore(SESSION_DB_PATH, SESSION_TTL_S, SESSION_CACHE_SIZE)
+
+
+class ConversationStore:
+    """
+    Histórico local das conversas (no mesmo SQLite das sessões), com os tokens
+    estimados de cada mensagem. No engine completions é o próprio histórico e
+    o thread_id é gerado aqui (prefixo local_), então o contrato da API não
+    muda para o frontend; no assistants é a cópia usada pela nota de memória.
+    Threads criados por este backend são marcados com `start`: só neles a cópia
+    local tem o thread inteiro (threads antigos ou de fora podem ter mensagens
+    que ela nunca viu).
+    """
+
+    def __init__(self, db_path: str, ttl_s: int, purge_interval_s: int = 300):
+        self.ttl_s = ttl_s
+        self.purge_interval_s = purge_interval_s
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " thread_id TEXT NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " tokens INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(conversation_messages)")}
+        if "tokens" not in columns:
+            # Bancos criados antes da contagem: mensagens antigas são contadas na leitura
+            self._db.execute("ALTER TABLE conversation_messages ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_messages_thread ON conversation_messages(thread_id, id)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_threads (thread_id TEXT PRIMARY KEY, created_at REAL NOT NULL)"
+        )
+
+    def new_thread(self) -> str:
+        return f"local_{uuid.uuid4().hex}"
+
+    def start(self, thread_id: str) -> None:
+        """Thread novo (ainda vazio): daqui em diante a cópia local tem todas as mensagens dele."""
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO conversation_threads(thread_id, created_at) VALUES (?, ?)",
+                             (thread_id, time.time()))
 
+    def complete(self, thread_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM conversation_threads WHERE thread_id = ?", (thread_id,)
+            ).fetchone() is not None
+
+    def history(self, thread_id: str, limit: int) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content FROM conversation_messages WHERE thread_id = ? ORDER BY id DESC LIMIT ?",
+                (thread_id, limit),
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def since(self, thread_id: str, after_id: int) -> list[tuple[int, str, str, int]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, role, content, tokens FROM conversation_messages WHERE thread_id = ? AND id > ? ORDER BY id",
+                (thread_id, after_id),
+            ).fetchall()
+        return [(i, role, content, tokens or count_tokens(content)) for i, role, content, tokens in rows]
+
+    def append(self, thread_id: str, *messages: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO conversation_messages(thread_id, role, content, created_at, tokens) VALUES (?, ?, ?, ?, ?)",
+                [(thread_id, m["role"], m["content"], now, count_tokens(m["content"])) for m in messages],
+            )
+            if now - self._last_purge >= self.purge_interval_s:
+                self._last_purge = now
+                # Thread que perde mensagens para o TTL deixa de estar inteiro na cópia local
+                self._db.execute(
+                    "DELETE FROM conversation_threads WHERE created_at < ? AND thread_id IN "
+                    "(SELECT thread_id FROM conversation_messages WHERE created_at < ?)",
+                    (now - self.ttl_s, now - self.ttl_s),
+                )
+                self._db.execute("DELETE FROM conversation_messages WHERE created_at < ?", (now - self.ttl_s,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+conversations = ConversationStore(SESSION_DB_PATH, SESSION_TTL_S)
+history = HistoryManager(conversations, SESSION_DB_PATH, HISTORY_BUDGET_TOKENS, HISTORY_RECENT_TOKENS,
+                         CHAT_HISTORY_MAX_MESSAGES, HISTORY_NOTE_MAX_TOKENS, SESSION_TTL_S)
+
+
+class ThreadPool:
+    """
+    Threads vazios pré-criados para o primeiro contato não pagar o
+    threads.create. Quando o estoque cai abaixo de `low`, uma tarefa em
+    segundo plano repõe até `high`. high=0 desliga o pool.
+    """
+
+    def __init__(self, low: int, high: int, max_age_s: int, refill_concurrency: int = 4):
+        self.low = low
+        self.high = high
+        self.max_age_s = max_age_s
+        self.refill_concurrency = refill_concurrency
+        self.hits = 0
+        self.misses = 0
+        self._ready: deque[tuple[str, float]] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> str:
+        now = time.monotonic()
+        # Descarta threads velhos demais para evitar usar um que a API já expirou
+        while self._ready and now - self._ready[0][1] > self.max_age_s:
+            self._ready.popleft()
+        if self._ready:
+            thread_id, _ = self._ready.popleft()
+            self.hits += 1
+        else:
+            with stage("threads.create"):
+                th = await api(client.beta.threads.create)
+            thread_id = th.id
+            self.misses += 1
+        if len(self._ready) < self.low:
+            self.refill()
+        return thread_id
+
+    def refill(self) -> None:
+        if self.high <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        # Reposição em segundo plano não conta no tempo da requisição que a disparou
+        _timing.set(None)
+        _priority.set(PRIORITY_BACKGROUND)
+        while len(self._ready) < self.high:
+            batch = min(self.refill_concurrency, self.high - len(self._ready))
+            created = await asyncio.gather(
+                *(api(client.beta.threads.create) for _ in range(batch)), return_exceptions=True
+            )
+            ok = [th for th in created if not isinstance(th, BaseException)]
+            now = time.monotonic()
+            self._ready.extend((th.id, now) for th in ok)
+            if not ok:
+                print(f"[WARN] Falha ao repor o pool de threads: {created[0]}")
+                return
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"ready": len(self._ready), "low": self.low, "high": self.high,
+                "hits": self.hits, "misses": self.misses}
+
+
+thread_pool = ThreadPool(THREAD_POOL_LOW, THREAD_POOL_HIGH, THREAD_POOL_MAX_AGE_S)
+
+
+async def ensure_thread(thread_id: Optional[str], session_id: Optional[str] = None) -> str:
+    # Conversa em andamento passa na frente de primeiro contato quando os limites da OpenAI seguram a fila
+    _priority.set(PRIORITY_REPLY)
+    if thread_id:
+        if session_id:
+            await asyncio.to_thread(sessions.bind, session_id, thread_id, True)
+        return thread_id
+    if session_id:
+        known = await asyncio.to_thread(sessions.get, session_id)
+        if known:
+            return known
+    _priority.set(PRIORITY_NEW)
+    if CHAT_ENGINE == "completions":
+        new_thread_id = conversations.new_thread()
+    else:
+        new_thread_id = await thread_pool.acquire()
+        await asyncio.to_thread(conversations.start, new_thread_id)
+    if session_id:
+        return await asyncio.to_thread(sessions.bind, session_id, new_thread_id)
+    return new_thread_id
+
+
+class ThreadLanes:
+    """
+    Serializa os runs de cada thread (a API rejeita messages.create/runs.create
+    com run ativo) e agrupa as mensagens que chegam durante um run: elas viram
+    uma única mensagem no próximo run, e todos os chamadores recebem a mesma
+    resposta. No WhatsApp é comum a pessoa mandar várias linhas seguidas.
+    """
+
+    def __init__(self):
+        self._lanes: dict[str, dict] = {}
+
+    def _lane(self, thread_id: str) -> dict:
+        lane = self._lanes.get(thread_id)
+        if lane is None:
+            lane = self._lanes[thread_id] = {"lock": asyncio.Lock(), "batch": None, "users": 0}
+        lane["users"] += 1
+        return lane
+
+    def _leave(self, thread_id: str, lane: dict) -> None:
+        lane["users"] -= 1
+        if lane["users"] == 0 and self._lanes.get(thread_id) is lane:
+            del self._lanes[thread_id]
+
+    async def acquire(self, thread_id: str) -> Callable[[], None]:
+        """Exclusividade no thread até chamar o release devolvido (para runs que terminam fora do handler)."""
+        lane = self._lane(thread_id)
+        try:
+            await lane["lock"].acquire()
+        except BaseException:
+            self._leave(thread_id, lane)
+            raise
+
+        def release() -> None:
+            lane["lock"].release()
+            self._leave(thread_id, lane)
+
+        return release
+
+    async def coalesce(self, thread_id: str, message: str, runner: Callable[[str], Awaitable[dict]]) -> dict:
+        lane = self._lanes.get(thread_id)
+        batch = lane["batch"] if lane else None
+        if batch is None:
+            lane = self._lane(thread_id)
+            batch = lane["batch"] = {"messages": [], "future": asyncio.get_running_loop().create_future()}
+            batch["task"] = asyncio.create_task(self._drain(thread_id, lane, batch, runner))
+        batch["messages"].append(message)
+        # shield: se um chamador desistir, o run do lote segue para os demais
+        return await asyncio.shield(batch["future"])
+
+    async def _drain(self, thread_id: str, lane: dict, batch: dict, runner: Callable[[str], Awaitable[dict]]) -> None:
+        try:
+            async with lane["lock"]:
+                # Fecha o lote: o que chegar a partir daqui vai para o próximo run
+                if lane["batch"] is batch:
+                    lane["batch"] = None
+                try:
+                    batch["future"].set_result(await runner("\n".join(batch["messages"])))
+                except Exception as e:
+                    batch["future"].set_exception(e)
+        finally:
+            self._leave(thread_id, lane)
+
+    def active(self) -> int:
+        return len(self._lanes)
+
+
+lanes = ThreadLanes()
+
+
+class RunScheduler:
+    """
+    Acompanha todos os runs do modo job em um único loop de polling, em vez de
+    um loop por requisição. A cada tick consulta os runs pendentes (com
+    concorrência limitada), finaliza os que terminaram e expira jobs antigos.
+    """
+
+    def __init__(self, interval_s: float, timeout_s: int, concurrency: int, ttl_s: int,
+                 store: Optional["JobStore"] = None):
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.ttl_s = ttl_s
+        # Jobs acompanhados por este worker; o estado de todos fica no JobStore
+        self.jobs: dict[str, dict] = {}
+        self.store = store or JobStore(":memory:", ttl_s)
+        self.concurrency = concurrency
+        self._pending: set[str] = set()
+        self._callbacks: set[asyncio.Task] = set()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, thread_id: str, run_id: str, callback_url: Optional[str] = None,
+                     on_done: Optional[Callable[[], None]] = None, record_reply: bool = False) -> dict:
+        job = self._new_job(thread_id, run_id, callback_url, on_done)
+        job["_record_reply"] = record_reply
+        await asyncio.to_thread(self.store.save, job_view(job))
+        self._pending.add(job["job_id"])
+        if self._task is None or self._task.done():
+            # Primitivas criadas no loop corrente (o loop só existe após o startup)
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+        self._wake.set()
+        return job
+
+    async def submit_turn(self, thread_id: str, turn: Awaitable[dict], callback_url: Optional[str] = None) -> dict:
+        """Job para turnos sem run a acompanhar (engine completions): o resultado vem do próprio turno."""
+        job = self._new_job(thread_id, None, callback_url, None)
+        # Gravado antes de o turno poder terminar (e gravar o estado final)
+        await asyncio.to_thread(self.store.save, job_view(job))
+
+        async def wait_turn() -> None:
+            try:
+                out = await turn
+                job["run_id"] = out["run_id"]
+                await self._finish(job, "completed", assistant_message=out["assistant_message"])
+            except HTTPException as e:
+                await self._finish(job, "timeout" if e.status_code == 504 else "failed", detail=e.detail)
+            except Exception as e:
+                await self._finish(job, "failed", detail=str(e))
+
+        task = asyncio.create_task(wait_turn())
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+        self._expire()
+        return job
+
+    def _new_job(self, thread_id: str, run_id: Optional[str], callback_url: Optional[str],
+                 on_done: Optional[Callable[[], None]]) -> dict:
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "pending",
+            "thread_id": thread_id,
+            "run_id": run_id,
+            "callback_url": callback_url,
+            "assistant_message": None,
+            "detail": None,
+            "created_at": time.time(),
+            "finished_at": None,
+            "_started": time.monotonic(),
+            # Primeira consulta perto da duração típica de um run (RunPacer)
+            "_next_check": time.monotonic() + run_pacer.first_wait(),
+            "_checks": 0,
+            "_on_done": on_done,
+        }
+        self.jobs[job_id] = job
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            # Job criado por outro worker: o estado vem do SQLite compartilhado
+            return await asyncio.to_thread(self.store.load, job_id)
+        return job
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+            tick = time.monotonic()
+            due = [self.jobs[j] for j in list(self._pending) if self.jobs[j]["_next_check"] <= tick]
+            await asyncio.gather(*(self._check(job) for job in due))
+            self._expire()
+            await asyncio.sleep(max(0.0, self.interval_s - (time.monotonic() - tick)))
+
+    async def _check(self, job: dict) -> None:
+        async with self._sem:
+            try:
+                sent_s = time.monotonic() - job["_started"]
+                run = await api(client.beta.threads.runs.retrieve, thread_id=job["thread_id"], run_id=job["run_id"],
+                                priority=PRIORITY_RUN)
+                job["_next_check"] = time.monotonic() + self.interval_s
+                if run.status == "completed":
+                    run_pacer.observe(sent_s, first_poll=job["_checks"] == 0)
+                    msg = await latest_assistant_message(job["thread_id"])
+                    if msg:
+                        if job.get("_record_reply"):
+                            await asyncio.to_thread(conversations.append, job["thread_id"],
+                                                    {"role": "assistant", "content": msg})
+                        await self._finish(job, "completed", assistant_message=msg)
+                    else:
+                        metrics.inc("leandro_run_failures_total", status="no_reply")
+                        await self._finish(job, "failed", detail="Não foi possível obter a resposta do assistente")
+                elif run.status in ("failed", "cancelled", "expired"):
+                    metrics.inc("leandro_run_failures_total", status=run.status)
+                    await self._finish(job, "failed", detail=f"Run terminou com status={run.status}")
+                elif time.monotonic() - job["_started"] > self.timeout_s:
+                    metrics.inc("leandro_run_failures_total", status="timeout")
+                    await api(client.beta.threads.runs.cancel, thread_id=job["thread_id"], run_id=job["run_id"],
+                              priority=PRIORITY_RUN)
+                    await self._finish(job, "timeout", detail="Timeout aguardando a resposta do Assistente")
+                else:
+                    job["_checks"] += 1
+            except Exception as e:
+                # Erro transitório de rede/API: tenta de novo no próximo tick até o timeout
+                if time.monotonic() - job["_started"] > self.timeout_s:
+                    await self._finish(job, "failed", detail=str(e))
+
+    async def _finish(self, job: dict, status: str, assistant_message: Optional[str] = None,
+                      detail: Optional[str] = None) -> None:
+        job.update(status=status, assistant_message=assistant_message, detail=detail, finished_at=time.time())
+        self._pending.discard(job["job_id"])
+        await asyncio.to_thread(self.store.save, job_view(job))
+        if job["_on_done"]:
+            job.pop("_on_done")()
+        if job["callback_url"]:
+            task = asyncio.create_task(self._callback(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    async def _callback(self, job: dict) -> None:
+        try:
+            # Sem seguir redirects: o destino validado em check_callback_url é o único alcançável
+            await asyncio.to_thread(requests.post, job["callback_url"], json=job_view(job), timeout=10,
+                                    allow_redirects=False)
+        except Exception as e:
+            print(f"[WARN] Callback do job {job['job_id']} falhou: {e}")
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        for job_id in [j for j, job in self.jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self.jobs[job_id]
+
+
+def job_view(job: dict) -> dict:
+    view = {k: v for k, v in job.items() if not k.startswith("_") and k != "callback_url"}
+    view["status_url"] = f"/chat/jobs/{job['job_id']}"
+    return view
+
+
+class JobStore:
+    """
+    Estado dos jobs no SQLite das sessões (modo WAL). Só o worker que criou o job
+    acompanha o run, mas ele grava o estado na criação e no fim, então
+    GET /chat/jobs/{job_id} responde em qualquer worker do uvicorn.
+    """
+
+    def __init__(self, db_path: str, ttl_s: int, purge_interval_s: int = 300):
+        self.ttl_s = ttl_s
+        self.purge_interval_s = purge_interval_s
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chat_jobs_updated_at ON chat_jobs(updated_at)")
+
+    def save(self, view: dict) -> None:
+        """Grava o job_view() do job. Bloqueia no SQLite: chame via asyncio.to_thread."""
+        now = time.time()
+        with self._lock:
+            self._maybe_purge(now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_jobs(job_id, data, updated_at) VALUES (?, ?, ?)",
+                (view["job_id"], json.dumps(view, ensure_ascii=False), now),
+            )
+
+    def load(self, job_id: str) -> Optional[dict]:
+        """Último estado gravado do job, ou None se não existir/expirou."""
+        with self._lock:
+            row = self._db.execute("SELECT data, updated_at FROM chat_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_s:
+            return None
+        return json.loads(row[0])
+
+    def _maybe_purge(self, now: float) -> None:
+        # Também some com jobs "pending" de um worker que morreu sem finalizá-los
+        if now - self._last_purge < self.purge_interval_s:
+            return
+        self._last_purge = now
+        self._db.execute("DELETE FROM chat_jobs WHERE updated_at < ?", (now - self.ttl_s,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def check_callback_url(url: str) -> None:
+    """
+    O servidor faz POST no callback_url informado pelo cliente: sem validação é
+    um SSRF. Só http(s) e hosts de JOB_CALLBACK_HOSTS (vazio = callbacks desligados).
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        raise HTTPException(400, "callback_url inválido")
+    if parts.scheme not in ("http", "https") or not host:
+        raise HTTPException(400, "callback_url deve ser uma URL http(s)")
+    if not any(host == h or (h.startswith(".") and host.endswith(h)) for h in JOB_CALLBACK_HOSTS):
+        raise HTTPException(400, f"callback_url: host {host} não está em JOB_CALLBACK_HOSTS")
+
+
+job_store = JobStore(SESSION_DB_PATH, JOB_TTL_S)
+scheduler = RunScheduler(JOB_POLL_INTERVAL_S, RUN_TIMEOUT_S, JOB_POLL_CONCURRENCY, JOB_TTL_S, store=job_store)
+
+
+def run_tokens(message: str, options: dict) -> int:
+    # Estimativa para o bucket de tokens: instruções do assistente + contexto + mensagem + resposta
+    return (count_tokens(load_instructions()) + count_tokens(options.get("additional_instructions") or "")
+            + count_tokens(message) + OPENAI_OUTPUT_TOKENS)
+
+
+def completion_tokens(messages: list[dict]) -> int:
+    return sum(count_tokens(m["content"]) for m in messages) + OPENAI_OUTPUT_TOKENS
+
+
+async def add_user_message(thread_id: str, message: str) -> None:
+    with stage("messages.create"):
+        await api(
+            client.beta.threads.messages.create,
+            thread_id=thread_id,
+            role="user",
+            content=message,
+            idempotent=False,
+        )
+    # Cópia local (base da nota de memória) junto com o thread: se o run falhar, a mensagem continua
+    # nos dois e a contagem dos turnos recentes bate com o que o run vai ler
+    await asyncio.to_thread(conversations.append, thread_id, {"role": "user", "content": message})
+
+
+async def run_turn(thread_id: str, assistant_id: str, message: str,
+                   market: Optional[str] = None, role: Optional[str] = None) -> dict:
+    # Mensagem do usuário
+    await add_user_message(thread_id, message)
+
+    # Executa
+    options = await run_options(message, market, role, thread_id)
+    tokens = run_tokens(message, options)
+    with stage("runs.create"):
+        run = await api(client.beta.threads.runs.create, thread_id=thread_id, assistant_id=assistant_id,
+                        tokens=tokens, idempotent=False, **options)
+    note(run_id=run.id)
+    await poll_run(thread_id, run.id, tokens=tokens)
+
+    # Coleta última resposta do assistente
+    assistant_msg = await latest_assistant_message(thread_id)
     if not assistant_msg:
+        metrics.inc("leandro_run_failures_total", status="no_reply")
         raise HTTPException(500, "Não foi possível obter a resposta do assistente")
+    # A resposta completa o turno na cópia local
+    await asyncio.to_thread(conversations.append, thread_id, {"role": "assistant", "content": assistant_msg})
 
     return {"assistant_message": assistant_msg, "thread_id": thread_id, "run_id": run.id}
 
+
+async def completion_messages(thread_id: str, message: str, market: Optional[str] = None,
+                              role: Optional[str] = None) -> list[dict]:
+    with stage("history.context"):
+        past = await asyncio.to_thread(history.context, thread_id, market, role)
+    note(history_tokens=past["tokens"], history_compacted=past["compacted"])
+    messages = [{"role": "system", "content": load_instructions()}]
+    # A nota só muda quando há compactação: fica logo depois das instruções, antes do contexto do turno
+    if past["note"]:
+        messages.append({"role": "system", "content": past["note"]})
+    # Contexto recuperado numa mensagem separada: o prefixo fixo (instruções) continua igual entre turnos
+    context = knowledge_context(message, market, role)
+    if context:
+        messages.append({"role": "system", "content": context})
+    return [*messages, *past["messages"], {"role": "user", "content": message}]
+
+
+async def run_turn_completions(thread_id: str, message: str, market: Optional[str] = None,
+                               role: Optional[str] = None) -> dict:
+    # Uma única chamada remota por turno; o histórico fica no SQLite local
+    messages = await completion_messages(thread_id, message, market, role)
+    tokens = completion_tokens(messages)
+    with stage("chat.completions"):
+        resp = await api(client.chat.completions.create, model=MODEL, messages=messages, tokens=tokens)
+    await admission.settle(tokens, getattr(resp, "usage", None))
+    note(run_id=resp.id)
+    assistant_msg = resp.choices[0].message.content if resp.choices else None
+    if not assistant_msg:
+        metrics.inc("leandro_run_failures_total", status="no_reply")
+        raise HTTPException(500, "Não foi possível obter a resposta do assistente")
+    await asyncio.to_thread(conversations.append, thread_id, {"role": "user", "content": message},
+                            {"role": "assistant", "content": assistant_msg})
+    return {"assistant_message": assistant_msg, "thread_id": thread_id, "run_id": resp.id}
+
+
+@app.post("/chat")
+async def chat(req: ChatRequest):
+    with track_request(new_timing("chat")):
+        return await _chat(req)
+
+
+async def _chat(req: ChatRequest):
+    if req.callback_url:
+        check_callback_url(req.callback_url)
+
+    # Thread
+    thread_id = await ensure_thread(req.thread_id, req.session_id)
+    note(thread_id=thread_id)
+
+    if CHAT_ENGINE == "completions":
+        turn = lanes.coalesce(
+            thread_id, req.message,
+            lambda message: run_turn_completions(thread_id, message, req.market, req.role),
+        )
+        if req.async_job or req.callback_url:
+            job = await scheduler.submit_turn(thread_id, turn, req.callback_url)
+            note(job_id=job["job_id"])
+            return JSONResponse(status_code=202, content=job_view(job))
+        with stage("coalesce.wait_and_run"):
+            return await turn
+
+    state = load_state()
+    assistant_id = state["assistant_id"]
+
+    if req.async_job or req.callback_url:
+        # O thread fica reservado até o scheduler finalizar o job
+        release = await lanes.acquire(thread_id)
+        try:
+            await add_user_message(thread_id, req.message)
+            options = await run_options(req.message, req.market, req.role, thread_id)
+            with stage("runs.create"):
+                run = await api(client.beta.threads.runs.create, thread_id=thread_id, assistant_id=assistant_id,
+                                tokens=run_tokens(req.message, options), idempotent=False, **options)
+        except BaseException:
+            release()
+            raise
+        job = await scheduler.submit(thread_id, run.id, req.callback_url, on_done=release, record_reply=True)
+        note(run_id=run.id, job_id=job["job_id"])
+        return JSONResponse(status_code=202, content=job_view(job))
+
+    # Mensagens que chegarem enquanto houver run ativo neste thread entram juntas no próximo run
+    with stage("coalesce.wait_and_run"):
+        return await lanes.coalesce(
+            thread_id, req.message,
+            lambda message: run_turn(thread_id, assistant_id, message, req.market, req.role),
+        )
+
+
+@app.get("/chat/jobs/{job_id}")
+async def chat_job(job_id: str):
+    job = await scheduler.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job não encontrado (inexistente ou expirado)")
+    return job_view(job)
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def assistants_stream_events(stream) -> AsyncIterator[tuple[str, object]]:
+    # Normaliza os eventos do run em streaming: run, delta, message, error
+    try:
+        async for ev in stream:
+            if ev.event == "thread.run.created":
+                yield "run", ev.data.id
+            elif ev.event == "thread.message.delta":
+                for c in ev.data.delta.content or []:
+                    if c.type == "text" and c.text and c.text.value:
+                        yield "delta", c.text.value
+            elif ev.event == "thread.message.completed":
+                yield "message", message_text(ev.data)
+            elif ev.event in ("thread.run.failed", "thread.run.cancelled", "thread.run.expired"):
+                status = ev.event.rsplit(".", 1)[-1]
+                yield "error", {"status": status, "detail": f"Run terminou com status={status}"}
+                return
+            elif ev.event == "error":
+                yield "error", {"status": "error", "detail": str(ev.data)}
+                return
+    finally:
+        await stream.close()
+
+
+async def completions_stream_events(thread_id: str, message: str, market: Optional[str] = None,
+                                    role: Optional[str] = None) -> AsyncIterator[tuple[str, object]]:
+    messages = await completion_messages(thread_id, message, market, role)
+    with stage("chat.completions.create"):
+        stream = await api(client.chat.completions.create, model=MODEL, messages=messages, stream=True,
+                           tokens=completion_tokens(messages))
+    parts = []
+    try:
+        async for chunk in stream:
+            if not parts and chunk.id:
+                yield "run", chunk.id
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    parts.append(choice.delta.content)
+                    yield "delta", choice.delta.content
+    finally:
+        await stream.close()
+    assistant_msg = "".join(parts)
+    if assistant_msg:
+        await asyncio.to_thread(conversations.append, thread_id, {"role": "user", "content": message},
+                                {"role": "assistant", "content": assistant_msg})
+    yield "message", assistant_msg
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Mesmo contrato de /chat, mas via Server-Sent Events com o run em streaming.
+    Eventos: start {thread_id, run_id} -> delta {text}* -> done {assistant_message, thread_id, run_id}
+    ou error {detail, thread_id, run_id}.
+    """
+    timing = new_timing("chat_stream")
+    with timing_scope(timing):
+        thread_id = await ensure_thread(req.thread_id, req.session_id)
+        note(thread_id=thread_id)
+
+    async def open_source() -> AsyncIterator[tuple[str, object]]:
+        if CHAT_ENGINE == "completions":
+            return completions_stream_events(thread_id, req.message, req.market, req.role)
+        state = load_state()
+        assistant_id = state["assistant_id"]
+        await add_user_message(thread_id, req.message)
+        options = await run_options(req.message, req.market, req.role, thread_id)
+        with stage("runs.create"):
+            stream = await api(
+                client.beta.threads.runs.create, thread_id=thread_id, assistant_id=assistant_id,
+                stream=True, tokens=run_tokens(req.message, options), idempotent=False, **options
+            )
+        return assistants_stream_events(stream)
+
+    async def events():
+        run_id = None
+        deltas = []
+        assistant_msg = None
+        with track_request(timing):
+            # Sem agrupamento aqui (cada cliente quer o próprio stream). O thread só é reservado quando o corpo
+            # começa a ser enviado: se o cliente cai antes disso, nada fica preso nem é criado na API.
+            release = await lanes.acquire(thread_id)
+            source = None
+            finished = False
+            try:
+                try:
+                    source = await open_source()
+                except Exception as e:
+                    # Os headers já saíram: a falha vira evento de erro em vez de status HTTP
+                    metrics.inc("leandro_run_failures_total", status="start_failed")
+                    detail = e.detail if isinstance(e, HTTPException) else f"Falha ao iniciar o run: {e}"
+                    yield sse("error", {"detail": detail, "thread_id": thread_id, "run_id": None})
+                    return
+                with stage("run.stream"):
+                    async for kind, value in source:
+                        if kind == "run":
+                            run_id = value
+                            note(run_id=run_id)
+                            yield sse("start", {"thread_id": thread_id, "run_id": run_id})
+                        elif kind == "delta":
+                            if not deltas:
+                                # Tempo até o primeiro token, desde o início da requisição
+                                ttft = time.perf_counter() - timing["start"]
+                                metrics.observe("leandro_stage_seconds", ttft, stage="stream.first_delta")
+                                note(first_delta_ms=round(ttft * 1000, 1))
+                            deltas.append(value)
+                            yield sse("delta", {"text": value})
+                        elif kind == "message":
+                            assistant_msg = value
+                        elif kind == "error":
+                            metrics.inc("leandro_run_failures_total", status=value["status"])
+                            finished = True
+                            yield sse("error", {"detail": value["detail"], "thread_id": thread_id, "run_id": run_id})
+                            return
+                finished = True
+                if CHAT_ENGINE != "completions" and (assistant_msg or deltas):
+                    # Resposta na cópia local para a nota de memória, antes de liberar o thread para o próximo turno
+                    await asyncio.to_thread(conversations.append, thread_id,
+                                            {"role": "assistant", "content": assistant_msg or "".join(deltas)})
+            finally:
+                if source is not None:
+                    await source.aclose()
+                if not finished and run_id and CHAT_ENGINE != "completions":
+                    # Cliente caiu no meio do run: cancela para o próximo turno não esbarrar no run ativo
+                    try:
+                        await api(client.beta.threads.runs.cancel, thread_id=thread_id, run_id=run_id,
+                                  priority=PRIORITY_RUN)
+                    except Exception as e:
+                        print(f"[WARN] Falha ao cancelar o run {run_id} do stream abandonado: {e}")
+                release()
+
+            assistant_msg = assistant_msg or "".join(deltas)
+            if not assistant_msg:
+                metrics.inc("leandro_run_failures_total", status="no_reply")
+                yield sse("error", {"detail": "Não foi possível obter a resposta do assistente",
+                                    "thread_id": thread_id, "run_id": run_id})
+                return
+            yield sse("done", {"assistant_message": assistant_msg, "thread_id": thread_id, "run_id": run_id})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,16 +1,23 @@
+import argparse
+import hashlib
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import NotFoundError, OpenAI
 
 ROOT = Path(__file__).resolve().parents[1]
 STATE_PATH = ROOT / ".assistant_state.json"
 INSTR_PATH = ROOT / "gpt_instructions.txt"
 PROFILE_PATH = ROOT / "perfil completot odos dados ia.txt"
 EXAMPLES_PATH = ROOT / "gpt_conversation_examples.json"
+KNOWLEDGE_FILES = [PROFILE_PATH, EXAMPLES_PATH]
+ASSISTANT_NAME = "Agente Leandro Uchoa"
 
 load_dotenv(ROOT / "backend" / ".env", override=False)
 load_dotenv(ROOT / ".env", override=False)
@@ -19,6 +26,7 @@ API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 VECTOR_STORE_ID = os.getenv("VECTOR_STORE_ID")
+UPLOAD_WORKERS = int(os.getenv("BOOTSTRAP_UPLOAD_WORKERS", "4"))
 
 assert API_KEY, "Defina OPENAI_API_KEY em .env ou no ambiente"
 
@@ -30,8 +38,20 @@ def read_text(path: Path) -> str:
         return f.read()
 
 
-def ensure_vector_store() -> str:
+def sha256_file(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_state() -> dict:
+    if not STATE_PATH.exists():
+        return {}
+    return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+
+
+def ensure_vector_store(state: dict) -> str:
     global VECTOR_STORE_ID
+    # Env tem prioridade; senão reaproveita o do último bootstrap em vez de criar outro
+    VECTOR_STORE_ID = VECTOR_STORE_ID or state.get("vector_store_id")
     if VECTOR_STORE_ID:
         return VECTOR_STORE_ID
     vs = client.vector_stores.create(name="LeandroKnowledge")
@@ -39,62 +59,236 @@ def ensure_vector_store() -> str:
     return VECTOR_STORE_ID
 
 
-def upload_file_to_vector_store(vs_id: str, path: Path) -> None:
-    if not path.exists():
-        print(f"[WARN] Arquivo não encontrado: {path}")
-        return
-    f = client.files.create(file=open(path, "rb"), purpose="assistants")
+def delete_remote_file(vs_id: str, file_id: str) -> bool:
+    """Desanexa do vector store e apaga de Files. False se o arquivo pode ter ficado em Files."""
+    try:
+        client.vector_stores.files.delete(vector_store_id=vs_id, file_id=file_id)
+    except Exception as e:
+        # Já desanexado (ou vector store apagado): o que importa é sair de Files
+        print(f"[WARN] Não foi possível desanexar {file_id}: {e}")
+    try:
+        client.files.delete(file_id)
+    except NotFoundError:
+        pass
+    except Exception as e:
+        print(f"[WARN] Não foi possível remover {file_id} (fica em orphan_files para a próxima execução): {e}")
+        return False
+    return True
+
+
+def stale_copies_by_name(vs_id: str, names: set[str]) -> dict[str, list[str]]:
+    """Cópias já presentes no vector store para os nomes dados (estado antigo, sem file_id registrado)."""
+    found: dict[str, list[str]] = {}
+    for vs_file in client.vector_stores.files.list(vector_store_id=vs_id):
+        try:
+            name = client.files.retrieve(vs_file.id).filename
+        except Exception:
+            continue
+        if name in names:
+            found.setdefault(name, []).append(vs_file.id)
+    return found
+
+
+def upload_file_to_vector_store(vs_id: str, path: Path) -> str:
+    with open(path, "rb") as fh:
+        f = client.files.create(file=fh, purpose="assistants")
     client.vector_stores.files.create(vector_store_id=vs_id, file_id=f.id)
     print(f"[OK] Upload: {path.name} -> vector_store={vs_id}")
+    return f.id
 
 
-def ensure_assistant(instructions: str, vs_id: str) -> str:
-    global ASSISTANT_ID
-    tools = [
-        {"type": "file_search"},
-        {"type": "code_interpreter"},
-    ]
+def plan_files(state: dict, vs_changed: bool) -> list[dict]:
+    """
+    Compara o hash local de cada arquivo com o registrado no estado: keep, upload
+    ou replace; arquivos registrados que não existem mais localmente viram remove.
+    """
+    recorded = {} if vs_changed else state.get("files", {})
+    plan = []
+    for path in KNOWLEDGE_FILES:
+        if not path.exists():
+            print(f"[WARN] Arquivo não encontrado: {path}")
+            continue
+        digest = sha256_file(path)
+        prev = recorded.get(path.name)
+        if prev and prev.get("sha256") == digest:
+            action = "keep"
+        elif prev:
+            action = "replace"
+        else:
+            action = "upload"
+        plan.append({"path": path, "sha256": digest, "action": action, "old_file_id": (prev or {}).get("file_id")})
+    # Apagado localmente (ou fora de KNOWLEDGE_FILES): a cópia não pode continuar no file_search
+    local = {item["path"].name for item in plan}
+    for name, prev in recorded.items():
+        if name not in local and prev.get("file_id"):
+            plan.append({"path": Path(name), "sha256": prev.get("sha256"), "action": "remove",
+                         "old_file_id": prev["file_id"]})
+    return plan
+
+
+def assistant_config(instructions: str, vs_id: str) -> dict:
+    return {
+        "name": ASSISTANT_NAME,
+        "model": MODEL,
+        "instructions": instructions,
+        "tools": [
+            {"type": "file_search"},
+            {"type": "code_interpreter"},
+        ],
+        "tool_resources": {"file_search": {"vector_store_ids": [vs_id]}},
+    }
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def ensure_assistant(config: dict) -> str:
     if ASSISTANT_ID:
-        asst = client.beta.assistants.update(
-            assistant_id=ASSISTANT_ID,
-            model=MODEL,
-            instructions=instructions,
-            tools=tools,
-            tool_resources={"file_search": {"vector_store_ids": [vs_id]}},
-            name="Agente Leandro Uchoa",
-        )
+        asst = client.beta.assistants.update(assistant_id=ASSISTANT_ID, **config)
         return asst.id
-    asst = client.beta.assistants.create(
-        name="Agente Leandro Uchoa",
-        model=MODEL,
-        instructions=instructions,
-        tools=tools,
-        tool_resources={"file_search": {"vector_store_ids": [vs_id]}},
-    )
+    asst = client.beta.assistants.create(**config)
     return asst.id
 
 
-def save_state(assistant_id: str, vs_id: str):
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump({"assistant_id": assistant_id, "vector_store_id": vs_id}, f, ensure_ascii=False, indent=2)
-    print(f"[OK] Estado salvo em {STATE_PATH}")
+def save_state(state: dict) -> None:
+    # Regravado a cada arquivo: escrita atômica para nunca ficar pela metade
+    tmp = STATE_PATH.with_name(STATE_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, STATE_PATH)
+
 
+def sync_files(vs_id: str, plan: list[dict], state: dict, progress: dict) -> None:
+    """
+    Sobe o que mudou e só depois remove a cópia anterior. progress (o estado em
+    construção, com files e orphan_files) é salvo a cada arquivo: um upload que
+    falha não perde a cópia antiga, e os que deram certo ficam registrados.
+    """
+    files, orphans = progress["files"], progress["orphan_files"]
+    commit = committer(progress)
+    todo = [item for item in plan if item["action"] in ("upload", "replace")]
+    legacy = {item["path"].name for item in todo if item["action"] == "upload"}
+    # Estado antigo não guardava file_id: as cópias já presentes com o mesmo nome saem depois do novo upload
+    stale = stale_copies_by_name(vs_id, legacy) if legacy and state.get("vector_store_id") == vs_id else {}
 
-def main():
+    def replace(name: str, record: Optional[dict], old_ids: list[str]) -> None:
+        # Registra a cópia nova e marca as antigas para remoção, numa única gravação
+        if record:
+            files[name] = record
+        else:
+            files.pop(name, None)
+        orphans.update(dict.fromkeys(old_ids, vs_id))
+
+    def sync(item: dict) -> None:
+        name = item["path"].name
+        file_id = upload_file_to_vector_store(vs_id, item["path"])
+        old_ids = ([item["old_file_id"]] if item["old_file_id"] else []) + stale.get(name, [])
+        record = {"sha256": item["sha256"], "file_id": file_id, "uploaded_at": int(time.time())}
+        commit(replace, name, record, old_ids)
+        delete_orphans(progress, old_ids, commit)
+
+    for item in plan:
+        if item["action"] == "keep":
+            print(f"[SKIP] {item['path'].name} inalterado")
+        elif item["action"] == "remove":
+            commit(replace, item["path"].name, None, [item["old_file_id"]])
+            delete_orphans(progress, [item["old_file_id"]], commit)
+            print(f"[OK] Removido: {item['path'].name} ({item['old_file_id']}) do vector_store={vs_id}")
+    if todo:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            futures = [pool.submit(sync, item) for item in todo]
+        # Sem pool.map: uma falha não cancela os uploads que ainda estão na fila; sobe depois de todos
+        for future in futures:
+            future.result()
+
+
+def committer(progress: dict) -> Callable:
+    """commit(update, *args): aplica a mudança em progress e salva, uma thread por vez."""
+    lock = threading.Lock()
+
+    def commit(update: Callable, *args) -> None:
+        with lock:
+            update(*args)
+            save_state(progress)
+    return commit
+
+
+def delete_orphans(progress: dict, file_ids: list[str], commit: Callable) -> None:
+    """Apaga cópias antigas registradas em orphan_files; as que falharem ficam para a próxima execução."""
+    orphans = progress["orphan_files"]
+    for file_id in file_ids:
+        if file_id in orphans and delete_remote_file(orphans[file_id], file_id):
+            commit(orphans.pop, file_id, None)
+
+
+def print_diff(plan: list[dict], assistant_action: str, vs_id: str, orphans: dict) -> None:
+    marks = {"keep": "=", "upload": "+", "replace": "~", "remove": "-"}
+    print(f"vector_store: {vs_id or '+ (novo)'}")
+    for item in plan:
+        extra = f" (remove {item['old_file_id']})" if item["action"] in ("replace", "remove") else ""
+        print(f"  {marks[item['action']]} {item['path'].name} sha256={item['sha256'][:12]}{extra}")
+    for file_id, old_vs in orphans.items():
+        print(f"  - {file_id} (cópia antiga em {old_vs})")
+    print(f"assistant: {assistant_action}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria/atualiza o Assistente e o knowledge de forma incremental.")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que mudaria, sem chamar a API para alterar nada.")
+    args = parser.parse_args(argv)
+
+    global ASSISTANT_ID
     print("[BOOTSTRAP] Iniciando...")
+    state = load_state()
     instructions = read_text(INSTR_PATH)
-    vs_id = ensure_vector_store()
+    ASSISTANT_ID = ASSISTANT_ID or state.get("assistant_id")
 
-    # Upload perfil e exemplos (se existir)
-    upload_file_to_vector_store(vs_id, PROFILE_PATH)
-    if EXAMPLES_PATH.exists():
-        upload_file_to_vector_store(vs_id, EXAMPLES_PATH)
+    vs_id = VECTOR_STORE_ID or state.get("vector_store_id")
+    # Vector store diferente do registrado: os file_ids antigos não valem para ele
+    vs_changed = bool(state.get("vector_store_id")) and vs_id != state.get("vector_store_id")
+    plan = plan_files(state, vs_changed)
+    # Cópias que ainda precisam sair: as de uma execução interrompida e, com vector store novo, as do anterior
+    orphans = dict(state.get("orphan_files", {}))
+    if vs_changed:
+        orphans.update({rec["file_id"]: state["vector_store_id"]
+                        for rec in state.get("files", {}).values() if rec.get("file_id")})
 
-    assistant_id = ensure_assistant(instructions, vs_id)
-    save_state(assistant_id, vs_id)
+    if args.dry_run:
+        config = assistant_config(instructions, vs_id or "<novo>")
+        if not ASSISTANT_ID:
+            action = "+ create"
+        elif vs_id and config_hash(config) == state.get("assistant_config_sha256"):
+            action = "= inalterado (sem assistants.update)"
+        else:
+            action = "~ update"
+        print_diff(plan, action, vs_id, orphans)
+        return
+
+    vs_id = ensure_vector_store(state)
+    progress = {
+        "assistant_id": state.get("assistant_id"),
+        "vector_store_id": vs_id,
+        "files": {} if vs_changed else dict(state.get("files", {})),
+        "assistant_config_sha256": state.get("assistant_config_sha256"),
+        "orphan_files": orphans,
+    }
+    save_state(progress)
+    sync_files(vs_id, plan, state, progress)
+
+    config = assistant_config(instructions, vs_id)
+    digest = config_hash(config)
+    if ASSISTANT_ID and digest == state.get("assistant_config_sha256") and state.get("assistant_id") == ASSISTANT_ID:
+        assistant_id = ASSISTANT_ID
+        print("[SKIP] Assistente inalterado (instruções/tools/modelo)")
+    else:
+        assistant_id = ensure_assistant(config)
+    progress.update(assistant_id=assistant_id, assistant_config_sha256=digest)
+    save_state(progress)
+    # Só com o assistente já apontando para o vector store atual
+    delete_orphans(progress, list(orphans), committer(progress))
+    print(f"[OK] Estado salvo em {STATE_PATH}")
     print(f"[READY] assistant_id={assistant_id} | vector_store_id={vs_id}")
 
 
 if __name__ == "__main__":
     main()
-
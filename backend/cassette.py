@@ -0,0 +1,216 @@
+"""
+Gravação/reprodução (cassette) das chamadas HTTP do cliente OpenAI do backend.
+
+    OPENAI_CASSETTE=tests/cassettes/suites.jsonl OPENAI_CASSETTE_MODE=record  -> chama a API e grava
+    OPENAI_CASSETTE=tests/cassettes/suites.jsonl OPENAI_CASSETTE_MODE=replay  -> serve do disco; o que faltar vai à API e é gravado
+    OPENAI_CASSETTE=tests/cassettes/suites.jsonl OPENAI_CASSETTE_MODE=strict  -> só do disco; chamada não gravada é erro
+
+Cada linha do cassette é um par requisição/resposta. A chave da requisição é normalizada: método, path,
+query ordenada e corpo JSON com chaves ordenadas (multipart sem o boundary aleatório); headers (inclusive
+a chave da API) não entram nem são gravados. Requisições iguais (ex.: vários threads.create) são servidas
+na ordem gravada. Como a ordem muda quando as chamadas são concorrentes, uma requisição sem par exato casa
+com a próxima gravação de mesmo formato (ids trocados por curingas) e o id vivo passa a valer pelo gravado
+(ex.: thread_B no lugar de thread_A) no resto da sessão.
+
+Gravação: um processo por arquivo (trava exclusiva); com vários workers do uvicorn o segundo recusa subir.
+
+Polling: respostas de GET com run ainda em andamento (queued/in_progress/cancelling) não são gravadas,
+então na reprodução o retrieve já devolve o estado final, sem a espera entre as consultas.
+"""
+import base64
+import json
+import re
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos na gravação
+    fcntl = None
+
+try:
+    import httpx
+except ImportError:  # versões recentes do SDK da openai usam o httpx2 (mesma API)
+    import httpx2 as httpx
+
+from openai import DefaultAsyncHttpxClient
+
+MODES = ("record", "replay", "strict")
+_ID = re.compile(r"\b(?:thread|run|msg|asst|file|vs|step|chatcmpl)_[A-Za-z0-9]+")
+_PENDING_RUN = re.compile(rb'"status"\s*:\s*"(?:queued|in_progress|cancelling)"')
+_BOUNDARY = re.compile(r"boundary=([^\s;]+)")
+
+
+class CassetteMiss(RuntimeError):
+    """Chamada sem gravação no modo strict."""
+
+
+def normalize(request) -> dict:
+    url = request.url
+    query = urlencode(sorted(parse_qsl(url.query.decode("ascii") if isinstance(url.query, bytes) else url.query)))
+    body = request.content or b""
+    ctype = request.headers.get("content-type", "")
+    if body and "json" in ctype:
+        text = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    elif body and "multipart" in ctype:
+        m = _BOUNDARY.search(ctype)
+        raw = body.replace(m.group(1).encode("latin-1"), b"BOUNDARY") if m else body
+        text = raw.decode("utf-8", "replace")
+    else:
+        text = body.decode("utf-8", "replace")
+    # Só o path depois de /v1: o mesmo cassette vale para outra base_url (ex.: proxy, servidor local)
+    path = url.path.split("/v1", 1)[-1] if "/v1" in url.path else url.path
+    return {"method": request.method, "path": path, "query": query, "body": text}
+
+
+def entry_key(req: dict) -> str:
+    return f"{req['method']} {req['path']}?{req['query']}\n{req['body']}"
+
+
+def template_key(req: dict) -> str:
+    return _ID.sub("<id>", entry_key(req))
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in MODES:
+            raise ValueError(f"OPENAI_CASSETTE_MODE inválido: {mode} (use {', '.join(MODES)})")
+        self.path = Path(path)
+        self.mode = mode
+        self.entries: list[dict] = []
+        self.by_key: dict[str, deque] = {}
+        self.by_template: dict[str, deque] = {}
+        self.last: dict[str, dict] = {}  # último servido por chave
+        self.alias: dict[str, str] = {}  # id vivo -> id gravado
+        self.misses: list[str] = []
+        self._lock = threading.Lock()
+        self._owner = None
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._owner = open(self.path, "a", encoding="utf-8")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Cada worker do uvicorn abriria o mesmo arquivo e apagaria o que os outros gravaram
+                    self._owner.close()
+                    raise RuntimeError(f"Cassette {self.path} já está sendo gravado por outro processo: "
+                                       "grave com um único worker (uvicorn sem --workers)") from None
+            self._owner.truncate(0)
+        elif self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        elif mode == "strict":
+            raise FileNotFoundError(f"Cassette não encontrado: {self.path}")
+
+    def close(self) -> None:
+        """Libera a trava de gravação (outro processo pode gravar no mesmo arquivo)."""
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+
+    def _index(self, entry: dict) -> None:
+        entry["_used"] = False
+        self.entries.append(entry)
+        self.by_key.setdefault(entry_key(entry["request"]), deque()).append(entry)
+        self.by_template.setdefault(template_key(entry["request"]), deque()).append(entry)
+
+    def _translate(self, req: dict) -> dict:
+        if not self.alias:
+            return req
+        sub = lambda m: self.alias.get(m.group(0), m.group(0))
+        return {**req, "path": _ID.sub(sub, req["path"]), "query": _ID.sub(sub, req["query"]),
+                "body": _ID.sub(sub, req["body"])}
+
+    @staticmethod
+    def _take(queue: Optional[deque]) -> Optional[dict]:
+        while queue:
+            entry = queue.popleft()
+            if not entry["_used"]:
+                entry["_used"] = True
+                return entry
+        return None
+
+    def lookup(self, request) -> Optional[dict]:
+        with self._lock:
+            req = self._translate(normalize(request))
+            key = entry_key(req)
+            entry = self._take(self.by_key.get(key))
+            if entry is None:
+                entry = self._take(self.by_template.get(template_key(req)))
+                if entry is not None:
+                    # Mesma chamada em outra ordem: os ids vivos passam a apontar para os gravados
+                    for live, recorded in zip(_ID.findall(entry_key(req)), _ID.findall(entry_key(entry["request"]))):
+                        if live != recorded:
+                            self.alias[live] = recorded
+            if entry is None:
+                # Só leituras repetem a última resposta (polling além do gravado); escrita sem par é miss
+                entry = self.last.get(key) if req["method"] == "GET" else None
+            else:
+                self.last[key] = entry
+            return entry
+
+    def record(self, request, status: int, headers, content: bytes) -> None:
+        req = normalize(request)
+        if request.method == "GET" and _PENDING_RUN.search(content):
+            return
+        try:
+            body = {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"base64": base64.b64encode(content).decode("ascii")}
+        entry = {"request": req, "response": {"status": status, "content_type": headers.get("content-type", ""),
+                                              **body}}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self.mode == "replay":
+                self._index(entry)
+                entry["_used"] = True
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, live: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.live = live
+
+    async def handle_async_request(self, request):
+        if self.cassette.mode != "record":
+            entry = self.cassette.lookup(request)
+            if entry is not None:
+                resp = entry["response"]
+                content = resp["text"].encode("utf-8") if "text" in resp else base64.b64decode(resp["base64"])
+                return httpx.Response(resp["status"], headers={"content-type": resp["content_type"]},
+                                      content=content, request=request)
+            if self.cassette.mode == "strict":
+                key = entry_key(normalize(request))
+                self.cassette.misses.append(key)
+                print(f"[CASSETTE] chamada não gravada: {key.splitlines()[0]}", file=sys.stderr)
+                raise CassetteMiss(f"Chamada não gravada no cassette {self.cassette.path}: {key[:300]}")
+        if self.live is None:
+            self.live = httpx.AsyncHTTPTransport()
+        await request.aread()
+        resp = await self.live.handle_async_request(request)
+        content = await resp.aread()
+        await resp.aclose()
+        self.cassette.record(request, resp.status_code, resp.headers, content)
+        headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in ("content-encoding", "content-length",
+                                                                               "transfer-encoding")]
+        return httpx.Response(resp.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self) -> None:
+        self.cassette.close()
+        if self.live is not None:
+            await self.live.aclose()
+
+
+def cassette_http_client(path: Optional[str], mode: str = "replay", **kwargs):
+    """http_client para o AsyncOpenAI com o cassette em `path`; None (cliente padrão) se não houver cassette."""
+    if not path:
+        return None
+    return DefaultAsyncHttpxClient(transport=CassetteTransport(Cassette(path, mode)), **kwargs)
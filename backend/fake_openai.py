@@ -0,0 +1,603 @@
+"""
+Servidor local que imita o subconjunto da API da OpenAI usado por app.py e assistants_bootstrap.py:
+assistants, threads, messages, runs (create/retrieve/cancel, com e sem stream), files, vector stores
+e chat.completions. Serve para benchmark e teste de carga sem rede e sem custo.
+
+    python -m backend.fake_openai --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 uvicorn backend.app:app --port 8080
+
+O SDK da OpenAI já lê OPENAI_BASE_URL, então nada muda em app.py/bootstrap. O estado vive em memória.
+
+Os runs avançam num relógio simulado (FAKE_OPENAI_TIME_SCALE segundos simulados por segundo real;
+POST /_fake/advance adianta o relógio): queued -> in_progress -> completed/failed/expired, com durações
+sorteadas das distribuições configuradas. Distribuições: "fixed:s", "uniform:a,b", "exp:média",
+"normal:média,dp" ou "lognormal:mediana,sigma" (em segundos simulados).
+"""
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TIME_SCALE = float(os.getenv("FAKE_OPENAI_TIME_SCALE", "1"))
+API_LATENCY = os.getenv("FAKE_OPENAI_API_LATENCY", "fixed:0.02")  # cada chamada HTTP
+QUEUE_LATENCY = os.getenv("FAKE_OPENAI_QUEUE_LATENCY", "fixed:0.3")  # tempo em queued
+RUN_LATENCY = os.getenv("FAKE_OPENAI_RUN_LATENCY", "lognormal:2,0.4")  # in_progress até a resposta
+FAIL_RATE = float(os.getenv("FAKE_OPENAI_FAIL_RATE", "0"))  # runs que terminam em failed
+EXPIRE_RATE = float(os.getenv("FAKE_OPENAI_EXPIRE_RATE", "0"))  # runs que ficam presos até expirar
+EXPIRE_AFTER_S = float(os.getenv("FAKE_OPENAI_EXPIRE_AFTER_S", "600"))
+ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))  # chamadas respondidas com HTTP 500
+RATE_LIMIT_RATE = float(os.getenv("FAKE_OPENAI_RATE_LIMIT_RATE", "0"))  # chamadas respondidas com HTTP 429
+REPLIES_PATH = os.getenv("FAKE_OPENAI_REPLIES")  # JSON com respostas fixas/templates (ver load_replies)
+SEED = os.getenv("FAKE_OPENAI_SEED")
+DEFAULT_REPLY = "Resposta simulada para: {message}"
+STREAM_WORDS_PER_DELTA = 3
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'lognormal:2,0.4' -> função que sorteia uma duração (s) com o Random dado; nunca negativa."""
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rnd: params[0]
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(params[0], params[1])
+    if kind == "exp":
+        return lambda rnd: rnd.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+    if kind == "normal":
+        return lambda rnd: max(0.0, rnd.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda rnd: rnd.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"Distribuição de latência desconhecida: {spec!r}")
+
+
+def load_replies(path: Optional[str]) -> tuple[list[tuple[re.Pattern, str]], str]:
+    """
+    {"replies": [{"match": "regex", "reply": "template"}, ...], "default": "template"}
+    O primeiro match (case-insensitive) contra a mensagem do usuário vence. Templates usam
+    {message}, {thread_id}, {turn} e {model}.
+    """
+    if not path:
+        return [], DEFAULT_REPLY
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = [(re.compile(r["match"], re.IGNORECASE), r["reply"]) for r in data.get("replies", [])]
+    return rules, data.get("default", DEFAULT_REPLY)
+
+
+class SimClock:
+    """Relógio simulado: corre `scale` vezes mais rápido que o real e pode ser adiantado."""
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self._real0 = time.monotonic()
+        self._sim0 = time.time()
+        self.offset = 0.0
+
+    def now(self) -> float:
+        return self._sim0 + (time.monotonic() - self._real0) * self.scale + self.offset
+
+    def advance(self, seconds: float) -> None:
+        self.offset += seconds
+
+    async def sleep(self, seconds: float) -> None:
+        await self.sleep_until(self.now() + seconds)
+
+    async def sleep_until(self, t: float) -> None:
+        # Em fatias curtas para acordar logo quando o relógio for adiantado
+        while (remaining := t - self.now()) > 0:
+            await asyncio.sleep(min(remaining / self.scale, 0.05))
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, kind: str = "invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.kind = kind
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def page(items: list[dict], params) -> dict:
+    """Lista paginada por cursor, como a API (order, limit, after, before)."""
+    if params.get("order", "desc") == "desc":
+        items = items[::-1]
+    ids = [it["id"] for it in items]
+    if params.get("after") in ids:
+        items = items[ids.index(params["after"]) + 1:]
+    elif params.get("before") in ids:
+        items = items[:ids.index(params["before"])]
+    limit = int(params.get("limit", 20))
+    data = items[:limit]
+    return {"object": "list", "data": data, "first_id": data[0]["id"] if data else None,
+            "last_id": data[-1]["id"] if data else None, "has_more": len(items) > limit}
+
+
+class FakeOpenAI:
+    """Estado em memória + máquina de estados dos runs sobre o relógio simulado."""
+
+    def __init__(self, time_scale: float = TIME_SCALE, api_latency: str = API_LATENCY,
+                 queue_latency: str = QUEUE_LATENCY, run_latency: str = RUN_LATENCY,
+                 fail_rate: float = FAIL_RATE, expire_rate: float = EXPIRE_RATE,
+                 expire_after_s: float = EXPIRE_AFTER_S, error_rate: float = ERROR_RATE,
+                 rate_limit_rate: float = RATE_LIMIT_RATE, replies_path: Optional[str] = REPLIES_PATH,
+                 seed: Optional[int] = int(SEED) if SEED else None):
+        self.clock = SimClock(time_scale)
+        self.rnd = random.Random(seed)
+        self.api_latency = parse_latency(api_latency)
+        self.queue_latency = parse_latency(queue_latency)
+        self.run_latency = parse_latency(run_latency)
+        self.fail_rate = fail_rate
+        self.expire_rate = expire_rate
+        self.expire_after_s = expire_after_s
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.replies, self.default_reply = load_replies(replies_path)
+        self.assistants: dict[str, dict] = {}
+        self.threads: dict[str, dict] = {}
+        self.messages: dict[str, list[dict]] = {}
+        self.runs: dict[str, dict] = {}
+        self.thread_runs: dict[str, list[str]] = {}
+        self.files: dict[str, dict] = {}
+        self.vector_stores: dict[str, dict] = {}
+        self.vector_store_files: dict[str, dict[str, dict]] = {}
+        self.calls: dict[str, int] = {}
+
+    # ---- respostas ----
+    def reply_for(self, message: str, thread_id: str = "", turn: int = 1, model: str = "") -> str:
+        template = next((reply for pattern, reply in self.replies if pattern.search(message)), self.default_reply)
+        return template.format(message=message, thread_id=thread_id, turn=turn, model=model)
+
+    # ---- assistants ----
+    def save_assistant(self, body: dict, assistant_id: Optional[str] = None) -> dict:
+        asst = self.assistants.get(assistant_id) or {
+            "id": assistant_id or new_id("asst"), "object": "assistant", "created_at": int(self.clock.now()),
+            "name": None, "description": None, "model": "gpt-4.1", "instructions": None, "tools": [],
+            "tool_resources": {}, "metadata": {}, "temperature": 1.0, "top_p": 1.0, "response_format": "auto",
+        }
+        asst.update({k: v for k, v in body.items() if k in asst})
+        self.assistants[asst["id"]] = asst
+        return asst
+
+    def assistant(self, assistant_id: str) -> dict:
+        # Ids desconhecidos (ex.: .assistant_state.json de um bootstrap real) viram um assistente padrão
+        return self.assistants.get(assistant_id) or self.save_assistant({}, assistant_id)
+
+    # ---- threads/messages ----
+    def create_thread(self, body: dict) -> dict:
+        th = {"id": new_id("thread"), "object": "thread", "created_at": int(self.clock.now()),
+              "metadata": body.get("metadata") or {}, "tool_resources": body.get("tool_resources") or {}}
+        self.threads[th["id"]] = th
+        self.messages[th["id"]] = []
+        self.thread_runs[th["id"]] = []
+        for m in body.get("messages") or []:
+            self.add_message(th["id"], m.get("role", "user"), m.get("content", ""))
+        return th
+
+    def thread(self, thread_id: str) -> dict:
+        if thread_id not in self.threads:
+            raise ApiError(404, f"No thread found with id '{thread_id}'.")
+        return self.threads[thread_id]
+
+    def add_message(self, thread_id: str, role: str, content: Any, run_id: Optional[str] = None,
+                    assistant_id: Optional[str] = None, created_at: Optional[float] = None) -> dict:
+        if isinstance(content, list):
+            content = "".join(p.get("text", "") for p in content if isinstance(p, dict))
+        msg = {"id": new_id("msg"), "object": "thread.message", "created_at": int(created_at or self.clock.now()),
+               "thread_id": thread_id, "role": role, "status": "completed", "assistant_id": assistant_id,
+               "run_id": run_id, "attachments": [], "metadata": {},
+               "content": [{"type": "text", "text": {"value": content, "annotations": []}}]}
+        self.messages[thread_id].append(msg)
+        return msg
+
+    def active_run(self, thread_id: str) -> Optional[dict]:
+        for run_id in reversed(self.thread_runs.get(thread_id, [])):
+            run = self.advance(self.runs[run_id])
+            if run["status"] in ("queued", "in_progress", "cancelling", "requires_action"):
+                return run
+        return None
+
+    def create_message(self, thread_id: str, body: dict) -> dict:
+        self.thread(thread_id)
+        active = self.active_run(thread_id)
+        if active:
+            raise ApiError(400, f"Can't add messages to {thread_id} while a run {active['id']} is active.")
+        return self.add_message(thread_id, body.get("role", "user"), body.get("content", ""))
+
+    def list_messages(self, thread_id: str, params) -> dict:
+        self.thread(thread_id)
+        for run_id in self.thread_runs[thread_id]:
+            self.advance(self.runs[run_id])
+        return page(self.messages[thread_id], params)
+
+    # ---- runs ----
+    def create_run(self, thread_id: str, body: dict) -> dict:
+        self.thread(thread_id)
+        active = self.active_run(thread_id)
+        if active:
+            raise ApiError(400, f"Thread {thread_id} already has an active run {active['id']}.")
+        asst = self.assistant(body.get("assistant_id", ""))
+        now = self.clock.now()
+        start_at = now + self.queue_latency(self.rnd)
+        draw = self.rnd.random()
+        outcome = "failed" if draw < self.fail_rate else "expired" if draw < self.fail_rate + self.expire_rate else "completed"
+        run = {"id": new_id("run"), "object": "thread.run", "created_at": int(now), "thread_id": thread_id,
+               "assistant_id": asst["id"], "status": "queued", "model": body.get("model") or asst["model"],
+               "instructions": body.get("instructions") or asst["instructions"],
+               "additional_instructions": body.get("additional_instructions"),
+               "tools": body.get("tools") or asst["tools"], "metadata": body.get("metadata") or {},
+               "started_at": None, "completed_at": None, "failed_at": None, "cancelled_at": None,
+               "expires_at": int(now + self.expire_after_s), "last_error": None, "usage": None,
+               "required_action": None, "incomplete_details": None, "temperature": 1.0, "top_p": 1.0,
+               "truncation_strategy": {"type": "auto", "last_messages": None}, "response_format": "auto",
+               "tool_choice": "auto", "parallel_tool_calls": True,
+               "_start_at": start_at, "_end_at": start_at + self.run_latency(self.rnd), "_outcome": outcome}
+        self.runs[run["id"]] = run
+        self.thread_runs[thread_id].append(run["id"])
+        return run
+
+    def run(self, thread_id: str, run_id: str) -> dict:
+        run = self.runs.get(run_id)
+        if not run or run["thread_id"] != thread_id:
+            raise ApiError(404, f"No run found with id '{run_id}'.")
+        return self.advance(run)
+
+    def pending_user_text(self, thread_id: str) -> tuple[str, int]:
+        """Mensagens do usuário desde a última resposta (um run pode cobrir várias) e o número do turno."""
+        msgs = self.messages[thread_id]
+        pending = []
+        for m in reversed(msgs):
+            if m["role"] == "assistant":
+                break
+            pending.append(m["content"][0]["text"]["value"])
+        turn = sum(1 for m in msgs if m["role"] == "assistant") + 1
+        return "\n".join(reversed(pending)), turn
+
+    def advance(self, run: dict) -> dict:
+        """Leva o run ao estado que ele tem no instante atual do relógio simulado."""
+        if run["status"] in ("completed", "failed", "cancelled", "expired"):
+            return run
+        now = self.clock.now()
+        if run["status"] == "cancelling":
+            if now >= run["_cancel_at"]:
+                run.update(status="cancelled", cancelled_at=int(run["_cancel_at"]))
+            return run
+        if now < run["_start_at"]:
+            return run
+        run.update(status="in_progress", started_at=int(run["_start_at"]))
+        if run["_outcome"] == "expired":
+            if now >= run["expires_at"]:
+                run.update(status="expired")
+            return run
+        if now < run["_end_at"]:
+            return run
+        end = run["_end_at"]
+        if run["_outcome"] == "failed":
+            run.update(status="failed", failed_at=int(end),
+                       last_error={"code": "server_error", "message": "Simulated failure (FAKE_OPENAI_FAIL_RATE)."})
+            return run
+        text, turn = self.pending_user_text(run["thread_id"])
+        reply = self.reply_for(text, run["thread_id"], turn, run["model"])
+        self.add_message(run["thread_id"], "assistant", reply, run_id=run["id"], assistant_id=run["assistant_id"],
+                         created_at=end)
+        prompt_tokens = max(1, len(text) // 4)
+        completion_tokens = max(1, len(reply) // 4)
+        run.update(status="completed", completed_at=int(end),
+                   usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens})
+        return run
+
+    def cancel_run(self, thread_id: str, run_id: str) -> dict:
+        run = self.run(thread_id, run_id)
+        if run["status"] in ("completed", "failed", "cancelled", "expired"):
+            raise ApiError(400, f"Cannot cancel run with status '{run['status']}'.")
+        run.update(status="cancelling", _cancel_at=self.clock.now() + 0.1)
+        return run
+
+    # ---- files / vector stores ----
+    def create_file(self, filename: str, data: bytes, purpose: str) -> dict:
+        f = {"id": new_id("file"), "object": "file", "bytes": len(data), "created_at": int(self.clock.now()),
+             "filename": filename, "purpose": purpose, "status": "processed"}
+        self.files[f["id"]] = f
+        return f
+
+    def file(self, file_id: str) -> dict:
+        if file_id not in self.files:
+            raise ApiError(404, f"No such File object: {file_id}")
+        return self.files[file_id]
+
+    def create_vector_store(self, body: dict) -> dict:
+        vs = {"id": new_id("vs"), "object": "vector_store", "created_at": int(self.clock.now()),
+              "name": body.get("name"), "status": "completed", "usage_bytes": 0, "metadata": body.get("metadata") or {},
+              "file_counts": {"in_progress": 0, "completed": 0, "failed": 0, "cancelled": 0, "total": 0},
+              "last_active_at": int(self.clock.now()), "expires_after": None, "expires_at": None}
+        self.vector_stores[vs["id"]] = vs
+        self.vector_store_files[vs["id"]] = {}
+        return vs
+
+    def vector_store(self, vs_id: str) -> dict:
+        if vs_id not in self.vector_stores:
+            raise ApiError(404, f"No vector store found with id '{vs_id}'.")
+        vs = self.vector_stores[vs_id]
+        total = len(self.vector_store_files[vs_id])
+        vs["file_counts"].update(completed=total, total=total)
+        return vs
+
+    def attach_file(self, vs_id: str, file_id: str) -> dict:
+        self.vector_store(vs_id)
+        f = self.file(file_id)
+        vsf = {"id": file_id, "object": "vector_store.file", "created_at": int(self.clock.now()),
+               "vector_store_id": vs_id, "status": "completed", "usage_bytes": f["bytes"], "last_error": None}
+        self.vector_store_files[vs_id][file_id] = vsf
+        return vsf
+
+    def detach_file(self, vs_id: str, file_id: str) -> dict:
+        self.vector_store(vs_id)
+        if self.vector_store_files[vs_id].pop(file_id, None) is None:
+            raise ApiError(404, f"No file found with id '{file_id}' in vector store '{vs_id}'.")
+        return {"id": file_id, "object": "vector_store.file.deleted", "deleted": True}
+
+    # ---- chat completions ----
+    def completion(self, body: dict) -> tuple[dict, str]:
+        messages = body.get("messages") or []
+        text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        if isinstance(text, list):
+            text = "".join(p.get("text", "") for p in text if isinstance(p, dict))
+        turn = sum(1 for m in messages if m.get("role") == "assistant") + 1
+        reply = self.reply_for(text, "", turn, body.get("model", ""))
+        prompt_tokens = max(1, sum(len(str(m.get("content") or "")) for m in messages) // 4)
+        completion_tokens = max(1, len(reply) // 4)
+        resp = {"id": new_id("chatcmpl"), "object": "chat.completion", "created": int(self.clock.now()),
+                "model": body.get("model", ""), "system_fingerprint": None,
+                "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                             "message": {"role": "assistant", "content": reply, "refusal": None}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}}
+        return resp, reply
+
+
+def public(obj: dict) -> dict:
+    return {k: v for k, v in obj.items() if not k.startswith("_")}
+
+
+def sse(event: Optional[str], data: Any) -> str:
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return (f"event: {event}\n" if event else "") + f"data: {payload}\n\n"
+
+
+def chunks(text: str, words: int = STREAM_WORDS_PER_DELTA) -> list[str]:
+    parts = re.findall(r"\S+\s*|\s+", text)
+    return ["".join(parts[i:i + words]) for i in range(0, len(parts), words)] or [""]
+
+
+async def run_events(fake: FakeOpenAI, run: dict):
+    """Eventos SSE do run em stream, no ritmo do relógio simulado."""
+    yield sse("thread.run.created", public(run))
+    yield sse("thread.run.queued", public(run))
+    await fake.clock.sleep_until(run["_start_at"])
+    fake.advance(run)
+    if run["status"] == "in_progress":
+        yield sse("thread.run.in_progress", public(run))
+    wait_until = run["expires_at"] if run["_outcome"] == "expired" else run["_end_at"]
+    while run["status"] in ("queued", "in_progress", "cancelling") and fake.clock.now() < wait_until:
+        await fake.clock.sleep(min(0.5, max(0.0, wait_until - fake.clock.now())))
+        fake.advance(run)
+    fake.advance(run)
+    if run["status"] == "completed":
+        msg = next(m for m in reversed(fake.messages[run["thread_id"]]) if m["run_id"] == run["id"])
+        text = msg["content"][0]["text"]["value"]
+        yield sse("thread.message.created", {**msg, "status": "in_progress", "content": []})
+        for i, part in enumerate(chunks(text)):
+            yield sse("thread.message.delta", {"id": msg["id"], "object": "thread.message.delta", "delta": {
+                "content": [{"index": 0, "type": "text", "text": {"value": part, "annotations": []}}]}})
+            await asyncio.sleep(0)
+        yield sse("thread.message.completed", msg)
+    yield sse(f"thread.run.{run['status']}", public(run))
+    yield sse("done", "[DONE]")
+
+
+async def completion_events(fake: FakeOpenAI, resp: dict, reply: str):
+    base = {"id": resp["id"], "object": "chat.completion.chunk", "created": resp["created"], "model": resp["model"],
+            "system_fingerprint": None}
+    yield sse(None, {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                         "finish_reason": None, "logprobs": None}]})
+    for part in chunks(reply):
+        yield sse(None, {**base, "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None,
+                                             "logprobs": None}]})
+        await asyncio.sleep(0)
+    yield sse(None, {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}]})
+    yield sse(None, "[DONE]")
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict[str, tuple[Optional[str], bytes]]:
+    """multipart/form-data -> {campo: (filename, bytes)} só com a stdlib (sem python-multipart)."""
+    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    fields = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+
+def create_app(fake: Optional[FakeOpenAI] = None) -> FastAPI:
+    fake = fake or FakeOpenAI()
+    api = FastAPI(title="Fake OpenAI (local)")
+    api.state.fake = fake
+
+    @api.exception_handler(ApiError)
+    async def api_error(_: Request, e: ApiError):
+        return JSONResponse(status_code=e.status,
+                            content={"error": {"message": str(e), "type": e.kind, "param": None, "code": None}})
+
+    @api.middleware("http")
+    async def inject(request: Request, call_next):
+        if not request.url.path.startswith("/v1/"):
+            return await call_next(request)
+        route = f"{request.method} {re.sub(r'/[a-z]+_[0-9a-f]{24}', '/{id}', request.url.path)}"
+        fake.calls[route] = fake.calls.get(route, 0) + 1
+        await fake.clock.sleep(fake.api_latency(fake.rnd))
+        draw = fake.rnd.random()
+        if draw < fake.rate_limit_rate:
+            return JSONResponse(status_code=429, headers={"retry-after": "1"}, content={"error": {
+                "message": "Simulated rate limit (FAKE_OPENAI_RATE_LIMIT_RATE).", "type": "rate_limit_exceeded",
+                "param": None, "code": "rate_limit_exceeded"}})
+        if draw < fake.rate_limit_rate + fake.error_rate:
+            return JSONResponse(status_code=500, content={"error": {
+                "message": "Simulated server error (FAKE_OPENAI_ERROR_RATE).", "type": "server_error",
+                "param": None, "code": None}})
+        return await call_next(request)
+
+    async def body(request: Request) -> dict:
+        raw = await request.body()
+        return json.loads(raw) if raw else {}
+
+    # assistants
+    @api.post("/v1/assistants")
+    async def create_assistant(request: Request):
+        return fake.save_assistant(await body(request))
+
+    @api.get("/v1/assistants/{assistant_id}")
+    async def get_assistant(assistant_id: str):
+        if assistant_id not in fake.assistants:
+            raise ApiError(404, f"No assistant found with id '{assistant_id}'.")
+        return fake.assistants[assistant_id]
+
+    @api.post("/v1/assistants/{assistant_id}")
+    async def update_assistant(assistant_id: str, request: Request):
+        return fake.save_assistant(await body(request), assistant_id)
+
+    # threads / messages
+    @api.post("/v1/threads")
+    async def create_thread(request: Request):
+        return fake.create_thread(await body(request))
+
+    @api.get("/v1/threads/{thread_id}")
+    async def get_thread(thread_id: str):
+        return fake.thread(thread_id)
+
+    @api.post("/v1/threads/{thread_id}/messages")
+    async def create_message(thread_id: str, request: Request):
+        return fake.create_message(thread_id, await body(request))
+
+    @api.get("/v1/threads/{thread_id}/messages")
+    async def list_messages(thread_id: str, request: Request):
+        return fake.list_messages(thread_id, request.query_params)
+
+    # runs
+    @api.post("/v1/threads/{thread_id}/runs")
+    async def create_run(thread_id: str, request: Request):
+        data = await body(request)
+        run = fake.create_run(thread_id, data)
+        if data.get("stream"):
+            return StreamingResponse(run_events(fake, run), media_type="text/event-stream")
+        return public(run)
+
+    @api.get("/v1/threads/{thread_id}/runs/{run_id}")
+    async def get_run(thread_id: str, run_id: str):
+        return public(fake.run(thread_id, run_id))
+
+    @api.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+    async def cancel_run(thread_id: str, run_id: str):
+        return public(fake.cancel_run(thread_id, run_id))
+
+    # files
+    @api.post("/v1/files")
+    async def create_file(request: Request):
+        fields = parse_multipart(request.headers.get("content-type", ""), await request.body())
+        filename, data = fields.get("file", (None, b""))
+        purpose = fields.get("purpose", (None, b"assistants"))[1].decode("utf-8")
+        return fake.create_file(filename or "upload", data, purpose)
+
+    @api.get("/v1/files/{file_id}")
+    async def get_file(file_id: str):
+        return fake.file(file_id)
+
+    @api.delete("/v1/files/{file_id}")
+    async def delete_file(file_id: str):
+        fake.file(file_id)
+        del fake.files[file_id]
+        return {"id": file_id, "object": "file", "deleted": True}
+
+    # vector stores
+    @api.post("/v1/vector_stores")
+    async def create_vector_store(request: Request):
+        return fake.create_vector_store(await body(request))
+
+    @api.get("/v1/vector_stores/{vs_id}")
+    async def get_vector_store(vs_id: str):
+        return fake.vector_store(vs_id)
+
+    @api.post("/v1/vector_stores/{vs_id}/files")
+    async def attach_file(vs_id: str, request: Request):
+        return fake.attach_file(vs_id, (await body(request)).get("file_id", ""))
+
+    @api.get("/v1/vector_stores/{vs_id}/files")
+    async def list_vector_store_files(vs_id: str, request: Request):
+        fake.vector_store(vs_id)
+        return page(list(fake.vector_store_files[vs_id].values()), request.query_params)
+
+    @api.delete("/v1/vector_stores/{vs_id}/files/{file_id}")
+    async def detach_file(vs_id: str, file_id: str):
+        return fake.detach_file(vs_id, file_id)
+
+    # chat completions
+    @api.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        data = await body(request)
+        resp, reply = fake.completion(data)
+        draw = fake.rnd.random()
+        await fake.clock.sleep(fake.run_latency(fake.rnd))
+        if draw < fake.fail_rate:
+            raise ApiError(500, "Simulated failure (FAKE_OPENAI_FAIL_RATE).", "server_error")
+        if data.get("stream"):
+            return StreamingResponse(completion_events(fake, resp, reply), media_type="text/event-stream")
+        return resp
+
+    # controle (fora de /v1: sem latência nem falhas injetadas)
+    @api.post("/_fake/advance")
+    async def advance(request: Request):
+        fake.clock.advance(float((await body(request)).get("seconds", 0)))
+        return {"now": fake.clock.now()}
+
+    @api.get("/_fake/stats")
+    async def stats():
+        statuses: dict[str, int] = {}
+        for run in fake.runs.values():
+            fake.advance(run)
+            statuses[run["status"]] = statuses.get(run["status"], 0) + 1
+        return {"calls": fake.calls, "runs": statuses, "threads": len(fake.threads), "files": len(fake.files),
+                "vector_stores": len(fake.vector_stores), "assistants": len(fake.assistants)}
+
+    return api
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API da OpenAI simulada localmente (assistants/threads/runs/files).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print(f"[FAKE] OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    uvicorn.run("backend.fake_openai:app", host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Protocol
+
+from backend.knowledge import fold, normalize_market, normalize_role
+
+# Histórico com orçamento de tokens por thread. Enquanto a conversa cabe no
+# orçamento, vai inteira para o modelo; passou dele, os turnos mais antigos
+# viram uma nota de memória curta (fatos do cliente + resumo extrativo, sem
+# chamada extra à API) e só os turnos recentes seguem literais. A nota e até
+# onde ela cobre ficam no SQLite, compartilhados entre workers.
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# Pistas no texto do cliente (já sem acento/minúsculo) quando o request não traz market/role
+MARKET_HINTS = (
+    ("US", re.compile(r"\b(eua|usa|estados unidos|united states|miami|texas|florida|new york|california)\b")),
+    ("LATAM", re.compile(r"\b(mexico|colombia|chile|peru|argentina|panama|latam|america latina)\b")),
+    ("EU", re.compile(r"\b(europa|europe|portugal|espanha|spain|italia|italy|alemanha|germany|franca|france)\b")),
+    ("ME", re.compile(r"\b(dubai|emirados|arabia|qatar|oriente medio|middle east)\b")),
+    ("BR", re.compile(r"\b(brasil|brazil)\b")),
+)
+ROLE_HINTS = (
+    ("marmorista", re.compile(r"\b(marmorista|marmoraria|fabricator|marmoleria)\b")),
+    ("distribuidor", re.compile(r"\b(distribuidor|distribuidora|distributor|importador|importer|revenda)\b")),
+    ("arquiteto", re.compile(r"\b(arquiteto|arquiteta|architect|interior designer)\b")),
+    ("construtora", re.compile(r"\b(construtora|incorporadora|builder|contractor|constructora)\b")),
+)
+OBJECTIONS = (
+    ("preço", re.compile(r"\b(caro|cara|preco|precos|price|prices|expensive|precio|desconto|discount)\b")),
+    ("container/volume", re.compile(r"\b(container|conteiner|contenedor|moq|volume minimo|pedido minimo|minimum order)\b")),
+    ("frete/logística", re.compile(r"\b(frete|logistica|logistics|shipping|freight|envio|importacao)\b")),
+    ("prazo", re.compile(r"\b(prazo|demora|lead time|delivery time|plazo)\b")),
+    ("qualidade", re.compile(r"\b(qualidade|quality|calidad|defeito|trinca|crack|cracks)\b")),
+    ("pagamento", re.compile(r"\b(pagamento|payment|pago|adiantamento|deposit|carta de credito|letter of credit)\b")),
+    ("fornecedor atual", re.compile(r"\b(fornecedor|supplier|proveedor|concorrente|competitor|ja compro)\b")),
+)
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    """Estimativa local de tokens (sem tokenizer da OpenAI): cada palavra conta ~1 token a cada 4 letras, pontuação 1."""
+    if not text:
+        return 0
+    return sum((len(piece) + 3) // 4 for piece in _PIECE.findall(text))
+
+
+def clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+def extract_facts(facts: dict, messages: list[dict]) -> dict:
+    """Completa mercado/papel e acrescenta objeções a partir das mensagens do cliente (não apaga o que já havia)."""
+    facts = {"market": facts.get("market"), "role": facts.get("role"), "objections": list(facts.get("objections", []))}
+    for m in messages:
+        if m["role"] != "user":
+            continue
+        text = fold(m["content"])
+        if not facts["market"]:
+            facts["market"] = next((code for code, pattern in MARKET_HINTS if pattern.search(text)), None)
+        if not facts["role"]:
+            facts["role"] = next((role for role, pattern in ROLE_HINTS if pattern.search(text)), None)
+        for name, pattern in OBJECTIONS:
+            if name not in facts["objections"] and pattern.search(text):
+                facts["objections"].append(name)
+    return facts
+
+
+def summary_points(messages: list[dict]) -> list[str]:
+    # Extrativo: a fala do cliente resumida e a primeira frase de cada resposta
+    points = []
+    for m in messages:
+        if m["role"] == "user":
+            points.append(f"Cliente: {clip(m['content'], 160)}")
+        else:
+            points.append(f"Leandro: {clip(_SENTENCE.split(m['content'].strip(), 1)[0], 120)}")
+    return points
+
+
+def render_note(facts: dict, points: list[str]) -> str:
+    lines = ["Memória da conversa (turnos anteriores resumidos; siga daqui sem repetir o que já foi dito):"]
+    who = [f"mercado {facts['market']}" if facts.get("market") else "", f"papel {facts['role']}" if facts.get("role") else ""]
+    if any(who):
+        lines.append("- Cliente: " + ", ".join(w for w in who if w))
+    if facts.get("objections"):
+        lines.append("- Objeções já levantadas: " + ", ".join(facts["objections"]))
+    if points:
+        lines.append("- Resumo dos turnos anteriores:")
+        lines.extend(f"  {p}" for p in points)
+    return "\n".join(lines)
+
+
+class MessageSource(Protocol):
+    def since(self, thread_id: str, after_id: int) -> list[tuple[int, str, str, int]]:
+        """(id, role, content, tokens) das mensagens do thread com id > after_id, em ordem."""
+
+
+class HistoryManager:
+    """
+    Decide o que do histórico entra no prompt de cada turno. Acima de
+    `budget_tokens` (ou de `max_messages`), os turnos antigos são dobrados na
+    nota de memória até sobrar no máximo `recent_tokens` literais, começando
+    num turno do cliente; a nota fica abaixo de `note_max_tokens` descartando
+    os pontos mais antigos do resumo (os fatos sempre ficam).
+    """
+
+    def __init__(self, source: MessageSource, db_path: str, budget_tokens: int, recent_tokens: int,
+                 max_messages: int, note_max_tokens: int = 400, ttl_s: int = 7 * 24 * 3600,
+                 purge_interval_s: int = 300):
+        self.source = source
+        self.budget_tokens = budget_tokens
+        self.recent_tokens = recent_tokens
+        self.max_messages = max_messages
+        self.note_max_tokens = note_max_tokens
+        self.ttl_s = ttl_s
+        self.purge_interval_s = purge_interval_s
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS thread_memory ("
+            " thread_id TEXT PRIMARY KEY,"
+            " upto_id INTEGER NOT NULL,"
+            " facts TEXT NOT NULL,"
+            " points TEXT NOT NULL,"
+            " note TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def memory(self, thread_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT upto_id, facts, points, note FROM thread_memory WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        if row is None:
+            return {"upto_id": 0, "facts": {}, "points": [], "note": ""}
+        return {"upto_id": row[0], "facts": json.loads(row[1]), "points": json.loads(row[2]), "note": row[3]}
+
+    def _save(self, thread_id: str, memory: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO thread_memory(thread_id, upto_id, facts, points, note, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET upto_id = excluded.upto_id, facts = excluded.facts, "
+                "points = excluded.points, note = excluded.note, updated_at = excluded.updated_at",
+                (thread_id, memory["upto_id"], json.dumps(memory["facts"], ensure_ascii=False),
+                 json.dumps(memory["points"], ensure_ascii=False), memory["note"], now),
+            )
+            if now - self._last_purge >= self.purge_interval_s:
+                self._last_purge = now
+                self._db.execute("DELETE FROM thread_memory WHERE updated_at < ?", (now - self.ttl_s,))
+
+    def context(self, thread_id: str, market: Optional[str] = None, role: Optional[str] = None) -> dict:
+        """
+        {"note", "messages", "tokens", "compacted"}: a nota (vazia enquanto não houve compactação), as
+        mensagens literais ({"role", "content"}) e os tokens estimados dos dois.
+        """
+        memory = self.memory(thread_id)
+        rows = self.source.since(thread_id, memory["upto_id"])
+        facts = dict(memory["facts"])
+        # O que o request informa vale mais que o que foi deduzido do texto
+        known = {"market": normalize_market(market), "role": normalize_role(role)}
+        changed = any(v and v != facts.get(k) for k, v in known.items())
+        facts.update({k: v for k, v in known.items() if v})
+        total = sum(r[3] for r in rows)
+        compacted = False
+        if total > self.budget_tokens or len(rows) > self.max_messages:
+            keep, kept_tokens = 0, 0
+            for r in reversed(rows):
+                if keep and (kept_tokens + r[3] > self.recent_tokens or keep >= self.max_messages // 2):
+                    break
+                keep += 1
+                kept_tokens += r[3]
+            # Os literais começam numa mensagem do cliente: a troca fica inteira
+            while keep > 1 and rows[len(rows) - keep][1] != "user":
+                keep -= 1
+            folded = [{"role": r[1], "content": r[2]} for r in rows[:len(rows) - keep]]
+            if folded:
+                facts = extract_facts(facts, folded)
+                points = memory["points"] + summary_points(folded)
+                note = render_note(facts, points)
+                while len(points) > 1 and count_tokens(note) > self.note_max_tokens:
+                    points = points[1:]
+                    note = render_note(facts, points)
+                memory = {"upto_id": rows[len(rows) - keep - 1][0], "facts": facts, "points": points, "note": note}
+                rows = rows[len(rows) - keep:]
+                compacted, changed = True, True
+                self.compactions += 1
+        if changed:
+            if not compacted and memory["note"]:
+                memory = {**memory, "note": render_note(facts, memory["points"])}
+            self._save(thread_id, {**memory, "facts": facts})
+        messages = [{"role": r[1], "content": r[2]} for r in rows]
+        return {"note": memory["note"], "messages": messages,
+                "tokens": count_tokens(memory["note"]) + sum(r[3] for r in rows), "compacted": compacted}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
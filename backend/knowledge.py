@@ -0,0 +1,229 @@
+import hashlib
+import json
+import math
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Optional
+
+# Índice BM25 local sobre o perfil do Leandro e os exemplos de conversa.
+# Substitui o round trip do file_search: a busca roda em memória, offline,
+# e o índice só é reconstruído quando o conteúdo dos arquivos-fonte muda.
+
+INDEX_VERSION = 1
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    # pt
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas", "um", "uma",
+    "que", "se", "por", "para", "pra", "com", "sem", "ao", "aos", "mas", "ou", "eu", "voce", "ele", "ela",
+    "me", "te", "lhe", "seu", "sua", "meu", "minha", "isso", "esse", "essa", "este", "esta", "ja", "nao",
+    "sim", "mais", "muito", "tem", "ter", "ser", "sao", "foi", "como", "quando", "tambem",
+    # en
+    "the", "an", "of", "to", "in", "on", "and", "or", "is", "are", "it", "we", "you", "your", "our", "my",
+    "for", "with", "can", "be", "this", "that", "have", "has", "at", "from", "not", "do", "don",
+    # es
+    "el", "la", "los", "las", "del", "en", "con", "por", "para", "es", "mi", "tu", "su", "lo", "al", "y",
+}
+
+_TOKEN = re.compile(r"\w+")
+
+# Rótulos de mercado dos exemplos -> códigos usados no resto do projeto (BR/US/LATAM/EU...)
+MARKET_TAGS = (
+    ("america latina", "LATAM"),
+    ("brasil", "BR"),
+    ("eua", "US"),
+    ("europa", "EU"),
+    ("oriente medio", "ME"),
+    ("asia", "ASIA"),
+)
+
+ROLE_ALIASES = {
+    "arquiteta": "arquiteto",
+    "arquiteto": "arquiteto",
+    "architect": "arquiteto",
+    "marmorista": "marmorista",
+    "fabricator": "marmorista",
+    "distribuidor": "distribuidor",
+    "distributor": "distribuidor",
+    "prospect": "prospect",
+}
+
+
+def fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(fold(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+def market_tags(label: str) -> list[str]:
+    folded = fold(label or "")
+    return [code for name, code in MARKET_TAGS if name in folded]
+
+
+def normalize_market(market: Optional[str]) -> Optional[str]:
+    if not market:
+        return None
+    tags = market_tags(market)
+    return tags[0] if tags else market.strip().upper()
+
+
+def normalize_role(role: Optional[str]) -> Optional[str]:
+    if not role:
+        return None
+    folded = fold(role).strip()
+    return ROLE_ALIASES.get(folded, folded)
+
+
+def chunk_markdown(text: str, max_words: int = 120) -> list[dict]:
+    """Quebra o perfil por seção (#/##) e empacota parágrafos em trechos de até max_words palavras."""
+    chunks = []
+    title = ""
+    buf: list[str] = []
+
+    def flush():
+        if buf:
+            chunks.append({"title": title, "text": "\n".join(buf).strip()})
+            buf.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            flush()
+            title = stripped.lstrip("#").strip()
+            continue
+        if not stripped or stripped == "---":
+            continue
+        if buf and sum(len(x.split()) for x in buf) + len(stripped.split()) > max_words:
+            flush()
+        buf.append(stripped)
+    flush()
+    return chunks
+
+
+def source_hash(*paths: Path) -> str:
+    h = hashlib.sha256(f"v{INDEX_VERSION}".encode())
+    for path in paths:
+        h.update(path.name.encode("utf-8"))
+        h.update(path.read_bytes() if path.exists() else b"<missing>")
+    return h.hexdigest()
+
+
+class KnowledgeIndex:
+    def __init__(self, docs: list[dict], postings: dict[str, list], source_hash: str = ""):
+        self.docs = docs
+        self.postings = postings
+        self.source_hash = source_hash
+        self.built = False
+
+    @classmethod
+    def from_docs(cls, docs: list[dict], source_hash: str = "") -> "KnowledgeIndex":
+        tokens = [tokenize(d["text"]) for d in docs]
+        n = len(docs)
+        avgdl = (sum(len(t) for t in tokens) / n) if n else 0.0
+        df: dict[str, int] = {}
+        for toks in tokens:
+            for term in set(toks):
+                df[term] = df.get(term, 0) + 1
+        postings: dict[str, list] = {}
+        # Peso BM25 de cada (termo, doc) já calculado: a busca vira só somas
+        for i, toks in enumerate(tokens):
+            tf: dict[str, int] = {}
+            for term in toks:
+                tf[term] = tf.get(term, 0) + 1
+            norm = K1 * (1 - B + B * len(toks) / avgdl) if avgdl else K1
+            for term, f in tf.items():
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                postings.setdefault(term, []).append([i, round(idf * f * (K1 + 1) / (f + norm), 6)])
+        index = cls(docs, postings, source_hash)
+        index.built = True
+        return index
+
+    @classmethod
+    def build(cls, profile_path: Path, examples_path: Path) -> "KnowledgeIndex":
+        docs = []
+        if profile_path.exists():
+            for chunk in chunk_markdown(profile_path.read_text(encoding="utf-8")):
+                docs.append({"kind": "profile", "title": chunk["title"], "text": f"{chunk['title']}\n{chunk['text']}"})
+        if examples_path.exists():
+            data = json.loads(examples_path.read_text(encoding="utf-8"))
+            for ex in data.get("examples", []):
+                docs.append({
+                    "kind": "example",
+                    "market": ex.get("market", ""),
+                    "markets": market_tags(ex.get("market", "")),
+                    "role": normalize_role(ex.get("role")),
+                    "cliente": ex.get("cliente", ""),
+                    "leandro": ex.get("leandro", ""),
+                    "text": f"{ex.get('market', '')} {ex.get('role', '')}\n{ex.get('cliente', '')}\n{ex.get('leandro', '')}",
+                })
+        return cls.from_docs(docs, source_hash(profile_path, examples_path))
+
+    @classmethod
+    def load_or_build(cls, index_path: Path, profile_path: Path, examples_path: Path) -> "KnowledgeIndex":
+        current = source_hash(profile_path, examples_path)
+        if index_path.exists():
+            try:
+                data = json.loads(index_path.read_text(encoding="utf-8"))
+                if data.get("version") == INDEX_VERSION and data.get("source_hash") == current:
+                    return cls(data["docs"], data["postings"], current)
+            except (ValueError, KeyError):
+                pass
+        index = cls.build(profile_path, examples_path)
+        index.save(index_path)
+        return index
+
+    def save(self, index_path: Path) -> None:
+        tmp = index_path.with_name(index_path.name + f".{os.getpid()}.tmp")
+        payload = {"version": INDEX_VERSION, "source_hash": self.source_hash,
+                   "docs": self.docs, "postings": self.postings}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, index_path)
+
+    def scores(self, query: str) -> dict[int, float]:
+        acc: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            for doc, weight in self.postings.get(term, ()):
+                acc[doc] = acc.get(doc, 0.0) + weight
+        return acc
+
+    def search(self, query: str, k: int = 3, kind: str = "profile") -> list[dict]:
+        scored = [(s, i) for i, s in self.scores(query).items() if self.docs[i]["kind"] == kind]
+        scored.sort(reverse=True)
+        return [self.docs[i] for _, i in scored[:k]]
+
+    def examples_for(self, query: str, market: Optional[str] = None, role: Optional[str] = None,
+                     k: int = 2) -> list[dict]:
+        """Top-k exemplos: primeiro os que batem mercado e papel, depois só um dos dois, desempatando por BM25."""
+        market = normalize_market(market)
+        role = normalize_role(role)
+        scores = self.scores(query)
+        ranked = []
+        for i, doc in enumerate(self.docs):
+            if doc["kind"] != "example":
+                continue
+            tag = 2 * (market in doc["markets"]) + (role is not None and role == doc["role"])
+            score = scores.get(i, 0.0)
+            if tag or score:
+                ranked.append((tag, score, i))
+        ranked.sort(key=lambda r: (-r[0], -r[1], r[2]))
+        return [self.docs[i] for _, _, i in ranked[:k]]
+
+    def context(self, query: str, market: Optional[str] = None, role: Optional[str] = None,
+                k_chunks: int = 3, k_examples: int = 2) -> str:
+        parts = []
+        chunks = self.search(query, k=k_chunks)
+        if chunks:
+            parts.append("Conhecimento relevante do perfil do Leandro:")
+            parts.extend(f"- {c['text']}" for c in chunks)
+        examples = self.examples_for(query, market=market, role=role, k=k_examples)
+        if examples:
+            parts.append("\nExemplos reais de como o Leandro responde (inspire-se no tom, não copie):")
+            for ex in examples:
+                parts.append(f"[{ex['market']}] Cliente: {ex['cliente']}\nLeandro: {ex['leandro']}")
+        return "\n".join(parts).strip()
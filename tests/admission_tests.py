@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import warnings
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+import uvicorn
+from openai import APIStatusError, AsyncOpenAI
+from backend import app as backend_app
+from backend.app import AdmissionController, RateLimiter, RunPacer
+from backend.cassette import httpx
+from backend.fake_openai import FakeOpenAI, create_app
+from load_test_tests import free_port
+from stub_openai import StubAsyncOpenAI
+
+RUN_S = 2.0
+
+
+def check_shared_buckets(db_path: str) -> None:
+    # Dois workers (duas conexões no mesmo arquivo) dividem os mesmos buckets
+    a = RateLimiter(db_path, rpm=60, tpm=6000, burst_s=5)
+    b = RateLimiter(db_path, rpm=60, tpm=6000, burst_s=5)
+    assert all(w == 0 for w in [a.take(100) for _ in range(3)] + [b.take(100) for _ in range(2)])
+    wait = a.take(100)
+    assert 0.9 < wait <= 1.0, wait
+    time.sleep(1.05)
+    assert b.take(100) == 0
+    # Bucket de tokens: 500 de capacidade, 100/s; o usage real devolve o que foi estimado a mais
+    time.sleep(0.05)
+    c = RateLimiter(db_path + ".tokens", rpm=0, tpm=6000, burst_s=5)
+    assert c.take(450) == 0 and c.take(200) > 1.0
+    c.adjust(-300)
+    assert c.take(200) == 0
+    c.drain()
+    assert c.take(1) > 0
+    for limiter in (a, b, c):
+        limiter.close()
+    print("Buckets compartilhados entre workers, acerto pelo usage e dreno após 429 OK.")
+
+
+async def check_priority(db_path: str) -> None:
+    # 10 req/s com capacidade 1: a fila decide quem sai primeiro
+    ctl = backend_app.admission = AdmissionController(RateLimiter(db_path, rpm=600, tpm=0, burst_s=0.1), 0)
+    order = []
+
+    async def call(label: str, priority: int) -> None:
+        async def fn():
+            order.append(label)
+        await ctl.call(fn, priority=priority)
+
+    tasks = [asyncio.create_task(call(f"new{i}", backend_app.PRIORITY_NEW)) for i in range(4)]
+    await asyncio.sleep(0.01)
+    tasks += [asyncio.create_task(call(f"reply{i}", backend_app.PRIORITY_REPLY)) for i in range(2)]
+    tasks.append(asyncio.create_task(call("run", backend_app.PRIORITY_RUN)))
+    await asyncio.sleep(0.01)
+    health = await backend_app.healthz()
+    assert health["admission"]["queued"] == 6, health
+    assert health["admission"]["queued_by_priority"] == {"run": 1, "reply": 2, "new": 3, "background": 0}, health
+    await asyncio.gather(*tasks)
+    assert order == ["new0", "run", "reply0", "reply1", "new1", "new2", "new3"], order
+    await ctl.stop()
+    print(f"Prioridade OK: {order}")
+
+
+async def fake_chats(n: int) -> list:
+    backend_app.CHAT_ENGINE = "assistants"
+    outs = await asyncio.gather(*[backend_app.chat(backend_app.ChatRequest(message=f"Cliente {i}")) for i in range(n)],
+                                return_exceptions=True)
+    await backend_app.client.close()
+    return outs
+
+
+async def check_idempotency() -> None:
+    # messages.create/runs.create não são idempotentes: 500 e erro de conexão sobem na hora, 429 ainda é repetido
+    ctl = AdmissionController(RateLimiter(":memory:", 0, 0, 10), max_retries=3, backoff_base_s=0.01, backoff_max_s=0.01)
+    request = httpx.Request("POST", "http://api.local/v1/threads/t/runs")
+
+    def failing(*codes):
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            if len(calls) <= len(codes):
+                code = codes[len(calls) - 1]
+                raise APIStatusError("falha", response=httpx.Response(code, request=request), body=None)
+            return "ok"
+        return fn, calls
+
+    fn, calls = failing(500)
+    try:
+        await ctl.call(fn, idempotent=False)
+        raise AssertionError("500 em chamada não idempotente não deveria ser repetido")
+    except APIStatusError:
+        assert len(calls) == 1, calls
+    fn, calls = failing(429)
+    assert await ctl.call(fn, idempotent=False) == "ok" and len(calls) == 2, calls
+    fn, calls = failing(500, 502)
+    assert await ctl.call(fn) == "ok" and len(calls) == 3, calls
+    print("Retries só em chamadas idempotentes (ou 429) OK.")
+
+
+def check_retries(db_path: str) -> None:
+    # 30% de 429 e 10% de 500 na API simulada: o 429 é repetido (e esvazia o bucket) em qualquer chamada, o 500
+    # só nas idempotentes; um 500 em messages.create/runs.create chega ao cliente em vez de duplicar a mensagem/run.
+    port = free_port()
+    fake = FakeOpenAI(time_scale=20, api_latency="fixed:0", queue_latency="fixed:0.2", run_latency="fixed:1",
+                      rate_limit_rate=0.3, error_rate=0.1, seed=3)
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        backend_app.client = AsyncOpenAI(base_url=f"http://127.0.0.1:{port}/v1", max_retries=0)
+        backend_app.run_pacer = RunPacer(0.05, 0.2)
+        ctl = backend_app.admission = AdmissionController(
+            RateLimiter(db_path, rpm=6000, tpm=0, burst_s=10), max_retries=10, backoff_base_s=0.01, backoff_max_s=0.05
+        )
+        outs = asyncio.run(fake_chats(8))
+        failed = [o for o in outs if isinstance(o, BaseException)]
+        assert all(isinstance(o, APIStatusError) and o.status_code == 500 for o in failed), failed
+        assert len(failed) < len(outs) and all(o["assistant_message"] for o in outs if o not in failed), outs
+        stats = ctl.stats()
+        assert stats["retries"] > 0 and stats["rate_limited"] > 0, stats
+        print(f"Retries com jitter contra 429/500 injetados OK: {stats}")
+    finally:
+        server.should_exit = True
+
+
+async def paced_chats(n: int) -> tuple[float, float]:
+    await backend_app.chat(backend_app.ChatRequest(message="aquecimento"))
+    before = backend_app.client.calls["runs.retrieve"]
+    start = time.perf_counter()
+    await asyncio.gather(*[backend_app.chat(backend_app.ChatRequest(message=f"m{i}")) for i in range(n)])
+    return (backend_app.client.calls["runs.retrieve"] - before) / n, time.perf_counter() - start
+
+
+def check_poll_volume() -> None:
+    # Runs de 2s: o poll fixo de 1s fazia 3 runs.retrieve por run; com a duração aprendida, ~2
+    backend_app.client = StubAsyncOpenAI(latency_s=0.02, run_s=RUN_S)
+    backend_app.run_pacer = RunPacer(0.25, 1.0)
+    backend_app.admission = AdmissionController(RateLimiter(":memory:", 0, 0, 10), 0)
+    per_run, elapsed = asyncio.run(paced_chats(8))
+    print(f"runs.retrieve por run: {per_run:.2f} (antes: 3) | 8 conversas em {elapsed:.2f}s "
+          f"| duração aprendida {backend_app.run_pacer.expected_s:.2f}s")
+    assert per_run <= 2.5, per_run
+    assert elapsed < RUN_S + 0.6, elapsed
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    with tempfile.TemporaryDirectory() as tmp:
+        check_shared_buckets(os.path.join(tmp, "rate.sqlite3"))
+        asyncio.run(check_priority(os.path.join(tmp, "priority.sqlite3")))
+        asyncio.run(check_idempotency())
+        check_retries(os.path.join(tmp, "retries.sqlite3"))
+    check_poll_volume()
+    print("Admissão OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import random
+import resource
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora import audit
+
+BANNED = "A gente só fecha negócio se fizer sentido pros dois lados. Combinado?"
+BULK_TURNS = int(os.getenv("AUDIT_BULK_TURNS", "300000"))
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def corpus(tmp):
+    rounds = {"round": 1, "items": [
+        {"scenario": "Prospect US – distributor (primeiro contato)", "user": "First contact.",
+         "assistant": "Hi! We ship full containers every week. Faz sentido pra você?"},
+        {"scenario": "Distribuidor US – não fecha container", "user": "We can't close a full container now.",
+         "assistant": "No problem, we can share a container with other buyers."},
+        {"scenario": "Distribuidor BR – preço alto", "user": "Seus preços estão altos.",
+         "assistant": f"Entendo. {BANNED}"},
+        {"scenario": "Distribuidor BR – preço alto", "user": "Seus preços estão altos.", "assistant": ""},
+    ]}
+    write(os.path.join(tmp, "round_1.json"), json.dumps(rounds, ensure_ascii=False))
+    write(os.path.join(tmp, "us-tagged.txt"), "[user] [Perfil] Distribuidor US · avoid logistics upfront.\n"
+          "[assistant] Hi, Leandro here.\n[assistant] Logistics is easy with us.\n"
+          "[user] What about containers?\n[assistant] A container takes 30 days.\n")
+    write(os.path.join(tmp, "us-plain.txt"), "[Perfil] Distribuidor US · avoid logistics upfront.\n"
+          "Hi! Quer que eu te envie as fotos reais?\n\nChecks: no premature \"container\" mention (OK)\n")
+    lines = [
+        {"phone": "1", "role": "user", "text": "Oi", "market": "BR"},
+        {"phone": "2", "role": "user", "text": "Hello", "market": "us"},
+        {"phone": "1", "role": "assistant", "text": "Oi! Deixa eu separar uns lotes.", "market": "BR"},
+        {"phone": "2", "role": "assistant", "text": "Our logistics team handles it.", "market": "us"},
+        {"phone": "2", "role": "user", "text": "Can you ship a container?", "market": "us"},
+        {"phone": "2", "role": "assistant", "text": "Yes, one container per month.", "market": "us"},
+        {"phone": "3", "role": "user", "text": "Do you ship containers to Houston?", "market": "us"},
+        {"phone": "3", "role": "assistant", "text": "Yes, every month.", "market": "us"},
+        {"phone": "3", "role": "user", "text": "And the prices?", "market": "us"},
+        {"phone": "3", "role": "assistant", "text": "They depend on the container mix.", "market": "us"},
+        {"user": "Oi", "assistant": BANNED, "market": "LATAM", "scenario": "export"},
+    ]
+    write(os.path.join(tmp, "whatsapp.jsonl"), "\n".join(json.dumps(l, ensure_ascii=False) for l in lines) + "\n")
+    return [os.path.join(tmp, n) for n in ("round_1.json", "us-tagged.txt", "us-plain.txt", "whatsapp.jsonl")]
+
+
+def bulk(path, n):
+    rnd = random.Random(0)
+    replies = ["Oi! Deixa eu separar algo pra você.", "Hi, happy to help with premium slabs.",
+               "Our logistics are simple.", "Hola, ¿qué materiales buscas?", f"Certo. {BANNED}"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            conv = str(rnd.randrange(5000))
+            market = ("BR", "US", "LATAM", "EU")[i % 4]
+            f.write(json.dumps({"phone": conv, "role": "user", "text": "Olá, tudo bem?", "market": market}) + "\n")
+            f.write(json.dumps({"phone": conv, "role": "assistant", "text": replies[i % 5], "market": market}) + "\n")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = corpus(tmp)
+        out = os.path.join(tmp, "audit.json")
+        viol = os.path.join(tmp, "violations.jsonl")
+        result = audit.run(paths, out, viol, workers=2, chunk_size=2, flush_every=1)
+        m = result["by_market"]
+        # US: container sem o cliente trazer (round + logistics no tagged + whatsapp) falha; com o cliente trazendo,
+        # mesmo num turno anterior da conversa, não
+        assert m["US"]["turns"] == 9, m["US"]  # linhas [assistant] seguidas formam um turno
+        assert m["US"]["rules"] == {"US.avoid_container_opening": 3}, m["US"]
+        assert m["BR"]["turns"] == 3 and m["BR"]["rules"] == {"banned_phrases[0]": 1, "empty": 1}, m["BR"]
+        assert m["BR"]["empty"] == 1 and m["BR"]["failed"] == 2, m["BR"]
+        assert m["LATAM"]["rules"] == {"banned_phrases[0]": 1}, m["LATAM"]
+        assert m["US"]["with_signature"] == 2 and m["BR"]["with_signature"] == 1, m
+        assert result["by_scenario"]["us-plain"]["failed"] == 0, result["by_scenario"]["us-plain"]
+        assert result["by_scenario"]["export"]["failed"] == 1
+        with open(out, encoding="utf-8") as f:
+            assert json.load(f)["done"] is True
+        with open(viol, encoding="utf-8") as f:
+            violations = [json.loads(l) for l in f]
+        assert len(violations) == 6, violations
+        print("Regras e agregados por mercado/cenário OK.")
+
+        # Volume: memória do processo principal não cresce com o número de turnos
+        big = os.path.join(tmp, "big.jsonl")
+        bulk(big, BULK_TURNS)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        result = audit.run([big], out, None, workers=os.cpu_count() or 2)
+        elapsed = time.perf_counter() - start
+        grown_mib = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+        assert result["turns"] == BULK_TURNS, result["turns"]
+        assert result["by_market"]["BR"]["rules"]["banned_phrases[0]"] == BULK_TURNS // 20, result["by_market"]["BR"]
+        assert grown_mib < 64, f"RSS cresceu {grown_mib:.0f} MiB"
+        print(f"{BULK_TURNS} turnos em {elapsed:.1f}s ({BULK_TURNS / elapsed:.0f}/s), RSS +{grown_mib:.0f} MiB")
+    print("Audit OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+# Latência de rede por chamada e tempo de geração do modelo simulados no stub
+NETWORK_S = float(os.getenv("BENCH_NETWORK_S", "0.08"))
+GENERATION_S = float(os.getenv("BENCH_GENERATION_S", "1.2"))
+TURNS = int(os.getenv("BENCH_TURNS", "3"))
+
+TURN_MESSAGES = [
+    "Sou marmorista no Brasil. Primeiro contato contigo.",
+    "Seu preço está alto em relação ao concorrente.",
+    "Quais materiais têm girado melhor aí?",
+]
+
+
+async def conversation(engine: str) -> tuple[list[float], dict]:
+    backend_app.CHAT_ENGINE = engine
+    stub = backend_app.client = StubAsyncOpenAI(latency_s=NETWORK_S, run_s=GENERATION_S)
+    thread_id = None
+    latencies = []
+    for i in range(TURNS):
+        msg = TURN_MESSAGES[i % len(TURN_MESSAGES)]
+        start = time.perf_counter()
+        out = await backend_app.chat(backend_app.ChatRequest(message=msg, thread_id=thread_id))
+        latencies.append(time.perf_counter() - start)
+        # Contrato da API igual nos dois engines
+        assert set(out) == {"assistant_message", "thread_id", "run_id"}, out
+        assert out["assistant_message"] == f"Resposta para: {msg}", out
+        assert thread_id in (None, out["thread_id"]), out
+        thread_id = out["thread_id"]
+    return latencies, stub
+
+
+def main():
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+
+    assistants, stub_a = asyncio.run(conversation("assistants"))
+    completions, stub_c = asyncio.run(conversation("completions"))
+
+    # O engine completions mantém o histórico local e usa as instruções do repo
+    last_prompt = stub_c.prompts[-1]
+    assert last_prompt[0]["role"] == "system" and last_prompt[0]["content"] == backend_app.load_instructions()
+    assert len(last_prompt) == 1 + 2 * (TURNS - 1) + 1, len(last_prompt)
+
+    print(f"Stub: rede {NETWORK_S * 1000:.0f} ms/chamada, geração {GENERATION_S * 1000:.0f} ms, {TURNS} turnos\n")
+    print(f"{'engine':<12} {'média (s)':>10} {'mediana (s)':>12} {'chamadas remotas':>18}")
+    for name, lat, stub in (("assistants", assistants, stub_a), ("completions", completions, stub_c)):
+        calls = sum(stub.calls.values())
+        print(f"{name:<12} {statistics.mean(lat):>10.2f} {statistics.median(lat):>12.2f} {calls:>18}")
+    speedup = statistics.mean(assistants) / statistics.mean(completions)
+    print(f"\ncompletions é {speedup:.1f}x mais rápido por turno")
+    assert speedup > 1, "Engine completions deveria ser mais rápido que threads/runs"
+
+
+if __name__ == "__main__":
+    main()
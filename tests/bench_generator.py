@@ -0,0 +1,237 @@
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora.constraints import ConstraintEngine
+from ai_vendedora.generator import (CompiledProfile, LeandroOpeningGenerator, clear_profile_cache,
+                                    generate_opening_message, load_profile)
+
+# Microbenchmarks for ai_vendedora.generator against a synthetic profile, so numbers do not move when
+# leandro_profile.json is edited. Results go to reports/bench/; --update-baseline stores the baseline,
+# later runs fail when a benchmark's ops/s drops more than --threshold below it.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.join(ROOT, "reports", "bench")
+BASELINE_PATH = os.path.join(BENCH_DIR, "generator_baseline.json")
+LATEST_PATH = os.path.join(BENCH_DIR, "generator_latest.json")
+BANNED_SIZES = (1, 100, 1000)
+MARKETS = ("BR", "US", "LATAM", "EU")
+ROLES = ("prospect", "marmorista", "distribuidor", "arquiteto")
+
+
+def synthetic_profile(banned: int = 1, seed: int = 0) -> dict:
+    """Same shape as leandro_profile.json, with deterministic filler text."""
+    rnd = random.Random(seed)
+
+    def phrase(n_words=8):
+        return " ".join(rnd.choice(["lote", "pedra", "granito", "stone", "slab", "quartzito", "piedra", "finish",
+                                    "exportação", "curadoria", "padrão", "photos"]) for _ in range(n_words)) + "."
+
+    def words(n):
+        return " ".join("".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 8)))
+                        for _ in range(n))
+
+    languages = {"BR": "pt", "US": "en", "LATAM": "es", "EU": "en"}
+    return {
+        "persona": {"name": "Synthetic"},
+        "language_signatures": [phrase() for _ in range(5)],
+        "banned_phrases": ["A gente só fecha negócio se fizer sentido pros dois lados. Combinado?"]
+                          + [words(rnd.randint(2, 6)) for _ in range(banned - 1)],
+        "markets": {
+            market: {
+                "language": lang,
+                "avoid_container_opening": market == "US",
+                "greeting_variants": [phrase(4) for _ in range(3)],
+                "role_hooks": {role: [phrase() for _ in range(2)] for role in ROLES},
+            } for market, lang in languages.items()
+        },
+        "ctas": {lang: [phrase(6) for _ in range(4)] for lang in ("pt", "en", "es")},
+        "closings": {lang: [phrase(3)] for lang in ("pt", "en", "es")},
+    }
+
+
+def contacts(n: int) -> list:
+    return [{"name": f"Contato {i}", "role": ROLES[i % 4], "market": MARKETS[(i // 4) % 4]} for i in range(n)]
+
+
+def measure(fn, min_time: float) -> dict:
+    """ops/s over repeated batches for at least min_time, then allocations over one batch under tracemalloc."""
+    fn()  # warm up
+    gc.collect()
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        ops += fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    n = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(s.size_diff for s in after.compare_to(before, "filename") if s.size_diff > 0)
+    return {"ops_per_s": ops / elapsed, "us_per_op": elapsed / ops * 1e6,
+            "alloc_bytes_per_op": allocated / n, "peak_kib": peak / 1024}
+
+
+def phases(gen: LeandroOpeningGenerator, items: list, repeat: int = 20) -> dict:
+    """Time per generate() phase: table lookup, choice draws, composition (incl. constraints)."""
+    totals = {"table": 0.0, "draw": 0.0, "compose": 0.0}
+    clock = time.perf_counter
+    for _ in range(repeat):
+        for i, contact in enumerate(items):
+            t0 = clock()
+            table = gen._table(contact)
+            t1 = clock()
+            rng = random.Random(i)
+            picks = [rng.choice(s) if s else "" for s in table.slots()]
+            t2 = clock()
+            gen._compose(table, contact, picks, i)
+            t3 = clock()
+            totals["table"] += t1 - t0
+            totals["draw"] += t2 - t1
+            totals["compose"] += t3 - t2
+    n = repeat * len(items)
+    return {k: v / n * 1e6 for k, v in totals.items()}
+
+
+def run_benchmarks(tmp: str, min_time: float) -> dict:
+    profile_path = os.path.join(tmp, "leandro_profile.json")
+    with open(profile_path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_profile(), f, ensure_ascii=False)
+    gen = LeandroOpeningGenerator(profile_path)
+    batch = contacts(200)
+    results = {}
+
+    def generate_single():
+        for i, c in enumerate(batch):
+            gen.generate(c, seed=i)
+        return len(batch)
+
+    def generate_many():
+        gen.generate_many(batch, seeds=range(len(batch)))
+        return len(batch)
+
+    results["generate"] = measure(generate_single, min_time)
+    results["generate_many"] = measure(generate_many, min_time)
+
+    def opening_warm():
+        for i, c in enumerate(batch[:50]):
+            generate_opening_message(c, seed=i, profile_path=profile_path)
+        return 50
+
+    def opening_cold():
+        for i, c in enumerate(batch[:20]):
+            clear_profile_cache()
+            generate_opening_message(c, seed=i, profile_path=profile_path)
+        return 20
+
+    results["opening_message_warm"] = measure(opening_warm, min_time)
+    results["opening_message_cold"] = measure(opening_cold, min_time)
+
+    def profile_load():
+        for _ in range(10):
+            clear_profile_cache()
+            load_profile(profile_path)
+        return 10
+
+    results["profile_load"] = measure(profile_load, min_time)
+    with open(profile_path, "rb") as f:
+        raw = f.read()
+    t0 = time.perf_counter()
+    for _ in range(50):
+        parsed = json.loads(raw.decode("utf-8"))
+    t1 = time.perf_counter()
+    for _ in range(50):
+        CompiledProfile(parsed)
+    t2 = time.perf_counter()
+    results["profile_load"]["phases_us"] = {"json_parse": (t1 - t0) / 50 * 1e6, "compile": (t2 - t1) / 50 * 1e6}
+    results["generate"]["phases_us"] = phases(gen, batch)
+
+    messages = [gen.generate(c, seed=i)["message"] for i, c in enumerate(batch)]
+    for size in BANNED_SIZES:
+        engine = ConstraintEngine.from_profile(synthetic_profile(banned=size, seed=size))
+
+        def constraints(engine=engine):
+            for i, m in enumerate(messages):
+                engine.apply(m, MARKETS[i % 4])
+            return len(messages)
+
+        results[f"constraints_{size}"] = measure(constraints, min_time)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        now = results.get(name)
+        if now is None:
+            continue
+        floor = base["ops_per_s"] * (1 - threshold)
+        if now["ops_per_s"] < floor:
+            regressions.append(f"{name}: {now['ops_per_s']:.0f} ops/s < {floor:.0f} "
+                               f"(baseline {base['ops_per_s']:.0f}, -{threshold:.0%})")
+    return regressions
+
+
+def print_table(results: dict, baseline: dict) -> None:
+    base = baseline.get("results", {})
+    print(f"{'benchmark':<22} {'ops/s':>11} {'us/op':>9} {'alloc B/op':>11} {'peak KiB':>9} {'vs base':>8}")
+    for name, r in results.items():
+        delta = f"{r['ops_per_s'] / base[name]['ops_per_s'] - 1:+.0%}" if name in base else "-"
+        print(f"{name:<22} {r['ops_per_s']:>11.0f} {r['us_per_op']:>9.2f} {r['alloc_bytes_per_op']:>11.0f} "
+              f"{r['peak_kib']:>9.1f} {delta:>8}")
+        for phase, us in r.get("phases_us", {}).items():
+            print(f"  {phase:<20} {'':>11} {us:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks / regression gate for ai_vendedora.generator")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25")),
+                        help="max allowed ops/s drop vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=float(os.getenv("BENCH_MIN_TIME", "0.5")),
+                        help="seconds per benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmarks(tmp, args.min_time)
+        clear_profile_cache()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "machine": platform.platform(), "results": results}
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(LATEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.update_baseline or not baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print(f"\nNo regression beyond {args.threshold:.0%} vs baseline ({baseline.get('created_at', '?')}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from backend.history import HistoryManager, count_tokens
+from stub_openai import StubAsyncOpenAI
+
+# Rede e geração fixas; o processamento do prompt cresce com os tokens enviados
+NETWORK_S = float(os.getenv("BENCH_NETWORK_S", "0.02"))
+GENERATION_S = float(os.getenv("BENCH_GENERATION_S", "0.1"))
+PREFILL_S_PER_1K = float(os.getenv("BENCH_PREFILL_S_PER_1K", "0.05"))
+TURNS = int(os.getenv("BENCH_TURNS", "40"))
+REPORT_AT = [t for t in (1, 5, 10, 20, 30, 40, 60, 80) if t <= TURNS]
+
+TURN_MESSAGES = [
+    "Sou distribuidor nos EUA, compro quartzito e mármore para revenda em Houston e Dallas.",
+    "Seu preço está acima do meu fornecedor atual, que me entrega com frete incluso.",
+    "Qual o prazo de produção e de embarque até o porto de Houston?",
+    "Não consigo fechar um container inteiro, dá para dividir com outro cliente?",
+    "Quais materiais exóticos você tem em bloco agora? Manda fotos reais.",
+    "Como funciona o pagamento, quanto de adiantamento vocês pedem?",
+    "Já tive problema de qualidade com trincas em chapas de outro fornecedor.",
+    "Se eu fechar dois containers no trimestre, melhora a condição?",
+]
+
+
+class PrefillStub(StubAsyncOpenAI):
+    """Stub em que a latência da completion cresce com o tamanho do prompt, como na API real."""
+
+    def __init__(self, latency_s: float, run_s: float):
+        super().__init__(latency_s, run_s)
+        create = self.chat.completions.create
+
+        async def timed_create(model: str, messages: list, stream: bool = False, **kwargs):
+            tokens = sum(count_tokens(m["content"]) for m in messages)
+            self.prompt_tokens.append(tokens)
+            await asyncio.sleep(tokens / 1000 * PREFILL_S_PER_1K)
+            return await create(model=model, messages=messages, stream=stream, **kwargs)
+
+        self.prompt_tokens: list[int] = []
+        self.chat.completions.create = timed_create
+
+    def reply(self, user_msg: str) -> str:
+        # Respostas do tamanho das do Leandro, para o histórico crescer como numa conversa real
+        return (f"Entendi seu ponto sobre: {user_msg} Trabalho direto da pedreira, então consigo montar uma "
+                "proposta com os materiais que giram melhor no seu mercado, fotos reais dos blocos e um cronograma "
+                "de embarque claro. Me conta o volume que você costuma girar por mês e os acabamentos que mais vende?")
+
+
+async def conversation(manager: HistoryManager) -> tuple[list[float], list[int]]:
+    backend_app.CHAT_ENGINE = "completions"
+    backend_app.history = manager
+    stub = backend_app.client = PrefillStub(latency_s=NETWORK_S, run_s=GENERATION_S)
+    thread_id = None
+    latencies = []
+    for i in range(TURNS):
+        start = time.perf_counter()
+        out = await backend_app.chat(backend_app.ChatRequest(message=TURN_MESSAGES[i % len(TURN_MESSAGES)],
+                                                             thread_id=thread_id, market="US"))
+        latencies.append(time.perf_counter() - start)
+        thread_id = out["thread_id"]
+    return latencies, stub.prompt_tokens
+
+
+def main():
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    conversations = backend_app.conversations
+    full = asyncio.run(conversation(HistoryManager(conversations, ":memory:", 10 ** 9, 10 ** 9, 10 ** 6)))
+    budget = backend_app.HISTORY_BUDGET_TOKENS
+    compacted = asyncio.run(conversation(HistoryManager(
+        conversations, ":memory:", budget, backend_app.HISTORY_RECENT_TOKENS,
+        backend_app.CHAT_HISTORY_MAX_MESSAGES, backend_app.HISTORY_NOTE_MAX_TOKENS,
+    )))
+
+    print(f"Stub: rede {NETWORK_S * 1000:.0f} ms/chamada, geração {GENERATION_S * 1000:.0f} ms, "
+          f"prompt {PREFILL_S_PER_1K * 1000:.0f} ms/1k tokens | orçamento do histórico {budget} tokens\n")
+    print(f"{'turno':>5} {'tokens (tudo)':>14} {'tokens (compactado)':>20} {'latência (tudo)':>16} "
+          f"{'latência (compactado)':>22}")
+    for turn in REPORT_AT:
+        i = turn - 1
+        print(f"{turn:>5} {full[1][i]:>14} {compacted[1][i]:>20} {full[0][i]:>15.3f}s {compacted[0][i]:>21.3f}s")
+
+    # Sem compactação o prompt cresce a cada turno; com ela, fica limitado pelo orçamento
+    fixed = compacted[1][0] - count_tokens(TURN_MESSAGES[0])
+    assert all(b > a for a, b in zip(full[1], full[1][1:])), full[1]
+    assert max(compacted[1]) <= fixed + budget + backend_app.HISTORY_NOTE_MAX_TOKENS + 200, compacted[1]
+    if TURNS >= 20:
+        assert compacted[1][-1] < full[1][-1] and compacted[0][-1] < full[0][-1]
+        print(f"\nNo turno {TURNS}: histórico de {full[1][-1] - fixed} tokens sem compactação e "
+              f"{compacted[1][-1] - fixed} com ({fixed} de instruções + conhecimento em todo turno)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora import generator as gen_mod
+from ai_vendedora.generator import LeandroOpeningGenerator, generate_opening_message, load_profile, clear_profile_cache
+
+CALLS = int(os.getenv("BENCH_CALLS", "2000"))
+CONTACT = {"name": "Tiago", "role": "marmorista", "market": "BR", "language": "pt"}
+
+
+def per_call_us(fn) -> float:
+    start = time.perf_counter()
+    for i in range(CALLS):
+        fn(i)
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+
+def check_hot_reload(tmpdir):
+    path = os.path.join(tmpdir, "profile.json")
+    shutil.copy(gen_mod.DEFAULT_PROFILE_PATH, path)
+    first = load_profile(path)
+    assert load_profile(path) is first, "unchanged file should hit the cache"
+
+    profile = json.loads(json.dumps(first))
+    profile["markets"]["BR"]["greeting_variants"] = ["Olá reload!"]
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    msg = LeandroOpeningGenerator(path).generate(CONTACT, seed=1)["message"]
+    assert msg.startswith("Olá reload!"), msg
+
+    # Half-written file: keep serving the last good version
+    current = load_profile(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"markets": {')
+    assert load_profile(path) is current
+
+
+def check_concurrent_readers(tmpdir):
+    path = os.path.join(tmpdir, "profile_concurrent.json")
+    shutil.copy(gen_mod.DEFAULT_PROFILE_PATH, path)
+    base = load_profile(path)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                LeandroOpeningGenerator(path).generate(CONTACT, seed=7)
+            except Exception as e:
+                errors.append(e)
+
+    def writer():
+        for i in range(50):
+            profile = json.loads(json.dumps(base))
+            profile["markets"]["BR"]["greeting_variants"] = [f"Oi {i}!"]
+            tmp = f"{path}.{i}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            time.sleep(0.002)
+        stop.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:3]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        check_hot_reload(tmpdir)
+        check_concurrent_readers(tmpdir)
+    print("Hot reload OK.")
+
+    def uncached(i):
+        # Previous behavior: JSON re-read and parsed on every call
+        clear_profile_cache()
+        generate_opening_message(CONTACT, seed=i)
+
+    def cached(i):
+        generate_opening_message(CONTACT, seed=i)
+
+    before = per_call_us(uncached)
+    cached(0)
+    after = per_call_us(cached)
+    print(f"generate_opening_message, {CALLS} calls")
+    print(f"  reload per call: {before:8.1f} us/call")
+    print(f"  cached profile:  {after:8.1f} us/call")
+    print(f"  speedup: {before / after:.1f}x")
+    assert after < before, "cached profile should be cheaper than re-reading the JSON"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import io
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import warnings
+from pathlib import Path
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# O bootstrap cria o cliente no import: a API simulada precisa estar no ambiente antes
+PORT = free_port()
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ["OPENAI_API_KEY"] = "sk-test-local"
+os.environ.pop("ASSISTANT_ID", None)
+os.environ.pop("VECTOR_STORE_ID", None)
+
+import uvicorn
+from backend import assistants_bootstrap as bootstrap
+from backend.fake_openai import FakeOpenAI, create_app
+
+MUTATIONS = ("POST /v1/files", "DELETE /v1/files/{id}", "POST /v1/vector_stores", "POST /v1/vector_stores/{id}/files",
+             "DELETE /v1/vector_stores/{id}/files/{id}", "POST /v1/assistants", "POST /v1/assistants/{id}")
+
+
+def start_server(fake: FakeOpenAI) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        assert time.time() < deadline, "servidor simulado não subiu"
+        time.sleep(0.05)
+    return server
+
+
+def run_bootstrap(*argv: str, vector_store_id: str | None = None) -> tuple[dict, str]:
+    """Uma execução como um processo novo: ids só do ambiente/estado. Devolve as chamadas que alteram algo e a saída."""
+    bootstrap.ASSISTANT_ID = None
+    bootstrap.VECTOR_STORE_ID = vector_store_id
+    before = dict(fake.calls)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        bootstrap.main(list(argv))
+    calls = {r: fake.calls.get(r, 0) - before.get(r, 0) for r in MUTATIONS}
+    return {r: n for r, n in calls.items() if n}, out.getvalue()
+
+
+def attached(vs_id: str) -> dict[str, str]:
+    """filename -> file_id das cópias no vector store (falha se houver duas com o mesmo nome)."""
+    names = {}
+    for file_id in fake.vector_store_files[vs_id]:
+        name = fake.files[file_id]["filename"]
+        assert name not in names, f"cópia duplicada de {name} no vector store"
+        names[name] = file_id
+    return names
+
+
+fake = FakeOpenAI(time_scale=50, api_latency="fixed:0", queue_latency="fixed:0", run_latency="fixed:0", seed=3)
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)  # Assistants API marcada como deprecated no SDK
+    server = start_server(fake)
+    tmp = tempfile.TemporaryDirectory()
+    root = Path(tmp.name)
+    profile, examples, instructions = root / "perfil.txt", root / "exemplos.json", root / "instrucoes.txt"
+    profile.write_text("Perfil do Leandro, versão 1", encoding="utf-8")
+    examples.write_text('{"exemplos": []}', encoding="utf-8")
+    instructions.write_text("Instruções v1", encoding="utf-8")
+    bootstrap.STATE_PATH = root / ".assistant_state.json"
+    bootstrap.INSTR_PATH = instructions
+    bootstrap.KNOWLEDGE_FILES = [profile, examples]
+    try:
+        # 1ª execução: cria vector store e assistente, sobe os dois arquivos
+        calls, _ = run_bootstrap()
+        assert calls == {"POST /v1/vector_stores": 1, "POST /v1/files": 2, "POST /v1/vector_stores/{id}/files": 2,
+                         "POST /v1/assistants": 1}, calls
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        vs_id = state["vector_store_id"]
+        assert attached(vs_id) == {name: f["file_id"] for name, f in state["files"].items()}, state
+
+        # 2ª execução sem mudanças: nenhum upload, nenhum assistants.update (hash da configuração)
+        calls, out = run_bootstrap()
+        assert calls == {}, calls
+        assert "[SKIP] Assistente inalterado" in out and out.count("inalterado") == 3, out
+        assert json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))["files"] == state["files"]
+
+        # --dry-run mostra o diff e não chama nada que altere
+        profile.write_text("Perfil do Leandro, versão 2", encoding="utf-8")
+        instructions.write_text("Instruções v2", encoding="utf-8")
+        saved = bootstrap.STATE_PATH.read_text(encoding="utf-8")
+        calls, out = run_bootstrap("--dry-run")
+        assert calls == {}, calls
+        assert "~ perfil.txt" in out and f"(remove {state['files']['perfil.txt']['file_id']})" in out, out
+        assert "= exemplos.json" in out and "assistant: ~ update" in out, out
+        assert bootstrap.STATE_PATH.read_text(encoding="utf-8") == saved
+
+        # replace: só o arquivo alterado sobe; a cópia antiga sai do vector store e dos files
+        calls, _ = run_bootstrap()
+        assert calls == {"POST /v1/files": 1, "POST /v1/vector_stores/{id}/files": 1,
+                         "DELETE /v1/vector_stores/{id}/files/{id}": 1, "DELETE /v1/files/{id}": 1,
+                         "POST /v1/assistants/{id}": 1}, calls
+        old_id = state["files"]["perfil.txt"]["file_id"]
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert old_id not in fake.files and attached(vs_id)["perfil.txt"] == state["files"]["perfil.txt"]["file_id"]
+
+        # Arquivo apagado localmente: a cópia é desanexada e apagada, e sai do estado
+        removed_id = state["files"]["exemplos.json"]["file_id"]
+        examples.unlink()
+        calls, out = run_bootstrap("--dry-run")
+        assert calls == {} and "- exemplos.json" in out, (calls, out)
+        calls, _ = run_bootstrap()
+        assert calls == {"DELETE /v1/vector_stores/{id}/files/{id}": 1, "DELETE /v1/files/{id}": 1}, calls
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert list(state["files"]) == ["perfil.txt"] and removed_id not in fake.files
+        assert list(attached(vs_id)) == ["perfil.txt"]
+        assert run_bootstrap()[0] == {}
+
+        # Estado antigo (sem file_id): as cópias com o mesmo nome são removidas antes do novo upload
+        examples.write_text('{"exemplos": [1]}', encoding="utf-8")
+        legacy = {k: v for k, v in state.items() if k != "files"}
+        bootstrap.STATE_PATH.write_text(json.dumps(legacy), encoding="utf-8")
+        calls, _ = run_bootstrap()
+        assert calls == {"POST /v1/files": 2, "POST /v1/vector_stores/{id}/files": 2,
+                         "DELETE /v1/vector_stores/{id}/files/{id}": 1, "DELETE /v1/files/{id}": 1}, calls
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert attached(vs_id) == {name: f["file_id"] for name, f in state["files"].items()}, state
+        assert run_bootstrap()[0] == {}
+
+        # Upload que falha no meio: a cópia antiga fica, o upload que deu certo fica registrado
+        profile.write_text("Perfil do Leandro, versão 3", encoding="utf-8")
+        examples.write_text('{"exemplos": [2]}', encoding="utf-8")
+        upload = bootstrap.upload_file_to_vector_store
+
+        def flaky(vs, path):
+            if path.name == "perfil.txt":
+                raise RuntimeError("upload interrompido")
+            return upload(vs, path)
+        bootstrap.upload_file_to_vector_store = flaky
+        try:
+            run_bootstrap()
+            raise AssertionError("a falha do upload deveria subir")
+        except RuntimeError:
+            pass
+        finally:
+            bootstrap.upload_file_to_vector_store = upload
+        partial = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert partial["files"]["perfil.txt"] == state["files"]["perfil.txt"], "a cópia antiga continua valendo"
+        assert partial["files"]["exemplos.json"]["file_id"] != state["files"]["exemplos.json"]["file_id"], (partial, state)
+        assert attached(vs_id) == {name: f["file_id"] for name, f in partial["files"].items()}
+        calls, _ = run_bootstrap()
+        assert calls == {"POST /v1/files": 1, "POST /v1/vector_stores/{id}/files": 1,
+                         "DELETE /v1/vector_stores/{id}/files/{id}": 1, "DELETE /v1/files/{id}": 1}, calls
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert attached(vs_id) == {name: f["file_id"] for name, f in state["files"].items()} and not state["orphan_files"]
+
+        # Vector store novo: tudo sobe nele e as cópias do anterior são apagadas (e listadas no dry-run)
+        new_vs = fake.create_vector_store({"name": "outro"})["id"]
+        old_ids = [f["file_id"] for f in state["files"].values()]
+        calls, out = run_bootstrap("--dry-run", vector_store_id=new_vs)
+        assert calls == {} and all(f"- {i} (cópia antiga em {vs_id})" in out for i in old_ids), out
+        calls, _ = run_bootstrap(vector_store_id=new_vs)
+        assert calls["POST /v1/files"] == 2 and calls["DELETE /v1/files/{id}"] == 2, calls
+        state = json.loads(bootstrap.STATE_PATH.read_text(encoding="utf-8"))
+        assert state["vector_store_id"] == new_vs and not state["orphan_files"]
+        assert not any(i in fake.files for i in old_ids) and not fake.vector_store_files[vs_id]
+        assert attached(new_vs) == {name: f["file_id"] for name, f in state["files"].items()}
+        assert run_bootstrap()[0] == {}
+    finally:
+        server.should_exit = True
+        tmp.cleanup()
+    print("Bootstrap incremental OK: 2ª execução sem uploads, dry-run, replace, remoção, cópias antigas, "
+          "upload interrompido e troca de vector store.")
+
+
+if __name__ == "__main__":
+    main()
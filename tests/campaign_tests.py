@@ -0,0 +1,95 @@
+import os
+import sys
+import csv
+import json
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora.campaign import contact_seed, run
+from ai_vendedora.generator import LeandroOpeningGenerator
+
+CONTACTS = int(os.getenv("BENCH_CONTACTS", "20000"))
+MARKETS = ("BR", "US", "LATAM", "EU")
+ROLES = ("prospect", "marmorista", "distribuidor", "arquiteto")
+
+
+def make_contacts(n):
+    return [{"id": f"c{i}", "name": f"Contato {i}", "role": ROLES[i % 4], "market": MARKETS[(i // 4) % 4],
+             "language": "", "company": f"Empresa {i % 97}", "last_contact_date": "2024-09-01"} for i in range(n)]
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def main():
+    contacts = make_contacts(CONTACTS)
+    gen = LeandroOpeningGenerator()
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "contacts.csv")
+        jsonl_path = os.path.join(tmp, "contacts.jsonl")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(contacts[0]))
+            writer.writeheader()
+            writer.writerows(contacts)
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(c, ensure_ascii=False) + "\n" for c in contacts)
+
+        out_csv = os.path.join(tmp, "from_csv.jsonl")
+        start = time.perf_counter()
+        assert run(csv_path, out_csv, workers=2, chunk_size=1000, salt="camp") == CONTACTS
+        elapsed = time.perf_counter() - start
+        rows = read_jsonl(out_csv)
+        assert [r["offset"] for r in rows] == list(range(CONTACTS)), "output must keep input order"
+        for r in rows[:: max(1, CONTACTS // 500)]:
+            c = contacts[r["offset"]]
+            want = gen.generate(c, seed=contact_seed(c["id"], "camp"))
+            assert r["id"] == c["id"] and r["message"] == want["message"] and r["meta"] == want["meta"], r
+
+        # Same ids + salt -> same openers, whatever the input format or worker count
+        out_jsonl = os.path.join(tmp, "from_jsonl.jsonl")
+        run(jsonl_path, out_jsonl, workers=3, chunk_size=777, salt="camp")
+        assert read_jsonl(out_jsonl) == rows
+        other = os.path.join(tmp, "other_salt.jsonl")
+        run(jsonl_path, other, workers=1, chunk_size=5000, salt="outra")
+        changed = sum(a["message"] != b["message"] for a, b in zip(read_jsonl(other), rows))
+        assert changed > CONTACTS // 2, "a different salt should reshuffle most openers"
+
+        # Crash mid-write: torn last line, then resume
+        with open(out_jsonl, "rb") as f:
+            data = f.read()
+        cut = data.index(b"\n", len(data) // 3) + 40
+        with open(out_jsonl, "wb") as f:
+            f.write(data[:cut])
+        resumed = run(jsonl_path, out_jsonl, workers=2, chunk_size=1000, salt="camp", resume=True)
+        assert resumed < CONTACTS
+        assert read_jsonl(out_jsonl) == rows, "resume should complete the file exactly"
+
+        # Resume keeps --start-offset: records continue at start + written, not at the line count
+        partial = os.path.join(tmp, "partial.jsonl")
+        run(jsonl_path, partial, workers=1, chunk_size=10, salt="camp", start_offset=50)
+        with open(partial, encoding="utf-8") as f:
+            head = f.readlines()[:30]
+        with open(partial, "w", encoding="utf-8") as f:
+            f.writelines(head)
+            f.write('{"offset": 80, "id": "c8')
+        run(jsonl_path, partial, workers=2, chunk_size=10, salt="camp", start_offset=50, resume=True)
+        assert read_jsonl(partial) == rows[50:], "resume with a start offset must not repeat or skip records"
+
+        # --near-duplicates: single writer, index checked in input order
+        small = os.path.join(tmp, "small.jsonl")
+        with open(small, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(c, ensure_ascii=False) + "\n" for c in contacts[:200])
+        deduped = os.path.join(tmp, "deduped.jsonl")
+        assert run(small, deduped, chunk_size=64, salt="camp", near_duplicates=os.path.join(tmp, "index")) == 200
+        out_rows = read_jsonl(deduped)
+        assert [r["offset"] for r in out_rows] == list(range(200))
+        assert all("similarity" in r["meta"] for r in out_rows) and any(r["meta"]["redraws"] for r in out_rows)
+
+    print(f"Campaign OK: {CONTACTS} openers in {elapsed:.2f}s with 2 workers ({CONTACTS / elapsed:.0f}/s).")
+
+
+if __name__ == "__main__":
+    main()
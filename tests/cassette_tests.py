@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import warnings
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+import uvicorn
+from openai import APIConnectionError, AsyncOpenAI
+from backend import app as backend_app
+from backend.cassette import Cassette, CassetteMiss, cassette_http_client
+from backend.fake_openai import FakeOpenAI, create_app
+from load_test_tests import free_port
+from stream_tests import parse_sse
+
+CONVERSATIONS = 6
+FOLLOW_UP = "E o prazo de entrega?"
+
+
+def start_fake(port: int, replies_path: str) -> uvicorn.Server:
+    fake = FakeOpenAI(time_scale=20, api_latency="fixed:0", queue_latency="fixed:0.2", run_latency="fixed:1",
+                      replies_path=replies_path)
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def use_client(base_url: str, path: str, mode: str) -> None:
+    # Processo "novo": a duração típica dos runs aprendida antes não vale para o que vem do disco
+    backend_app.run_pacer = backend_app.RunPacer(backend_app.POLL_MIN_INTERVAL_S, backend_app.POLL_MAX_INTERVAL_S)
+    backend_app.client = AsyncOpenAI(base_url=base_url, max_retries=0,
+                                     http_client=cassette_http_client(path, mode))
+
+
+async def conversation(i: int) -> tuple[str, str, str]:
+    first = await backend_app.chat(backend_app.ChatRequest(message=f"Sou o cliente {i}, quero ver lotes."))
+    second = await backend_app.chat(backend_app.ChatRequest(message=FOLLOW_UP, thread_id=first["thread_id"]))
+    assert second["thread_id"] == first["thread_id"], (first, second)
+    return f"cliente {i}", first["assistant_message"], second["assistant_message"]
+
+
+async def session(order: list[int], extra: list[str] = ()) -> dict:
+    # Conversas concorrentes: a ordem das chamadas muda entre gravação e reprodução
+    results = await asyncio.gather(*[conversation(i) for i in order])
+    resp = await backend_app.chat_stream(backend_app.ChatRequest(message="Pode mandar fotos?"))
+    events = parse_sse("".join([chunk async for chunk in resp.body_iterator]))
+    assert events[-1][0] == "done", events
+    out = {name: (a, b) for name, a, b in results}
+    out["stream"] = events[-1][1]["assistant_message"]
+    for msg in extra:
+        out[msg] = (await backend_app.chat(backend_app.ChatRequest(message=msg)))["assistant_message"]
+    await backend_app.client.close()
+    return out
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    backend_app.CHAT_ENGINE = "assistants"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}/v1"
+    with tempfile.TemporaryDirectory() as tmp:
+        replies = os.path.join(tmp, "replies.json")
+        with open(replies, "w", encoding="utf-8") as f:
+            json.dump({"default": "{message} #{turn} @{thread_id}"}, f)
+        path = os.path.join(tmp, "cassette.jsonl")
+        server = start_fake(port, replies)
+        try:
+            use_client(base_url, path, "record")
+            t0 = time.perf_counter()
+            recorded = asyncio.run(session(list(range(CONVERSATIONS))))
+            record_s = time.perf_counter() - t0
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(l) for l in f]
+            assert lines and all("authorization" not in json.dumps(l).lower() for l in lines)
+            assert not any('"in_progress"' in l["response"].get("text", "") for l in lines if l["request"]["method"] == "GET")
+
+            # replay: o que está gravado vem do disco, chamada nova vai à API e é anexada
+            use_client(base_url, path, "replay")
+            replayed = asyncio.run(session(list(range(CONVERSATIONS))[::-1], extra=["Mensagem nova"]))
+            assert replayed.pop("Mensagem nova").startswith("Mensagem nova #1")
+            assert replayed == recorded, (replayed, recorded)
+            with open(path, encoding="utf-8") as f:
+                assert sum(1 for _ in f) > len(lines)
+        finally:
+            server.should_exit = True
+            time.sleep(0.3)
+
+        # strict, sem servidor: tudo do disco, em outra ordem e sem esperar polling
+        use_client(base_url, path, "strict")
+        t0 = time.perf_counter()
+        strict = asyncio.run(session([3, 1, 5, 0, 2, 4], extra=["Mensagem nova"]))
+        strict_s = time.perf_counter() - t0
+        assert strict.pop("Mensagem nova").startswith("Mensagem nova #1")
+        assert strict == recorded, (strict, recorded)
+        assert strict_s < record_s / 2 and strict_s < 1.0, (strict_s, record_s)
+        print(f"Gravação {record_s:.2f}s | reprodução strict {strict_s:.2f}s, mesmas respostas")
+
+        use_client(base_url, path, "strict")
+        try:
+            asyncio.run(backend_app.chat(backend_app.ChatRequest(message="Nunca gravada")))
+            raise AssertionError("strict deveria falhar em chamada não gravada")
+        except (CassetteMiss, APIConnectionError):
+            pass
+        transport = backend_app.client._client._transport
+        misses = transport.cassette.misses
+        assert len(misses) == 1 and "Nunca gravada" in misses[0], misses
+
+        # Gravação: um processo por arquivo. Um segundo worker não pode truncar o que o primeiro grava
+        first = Cassette(path, "record")
+        try:
+            Cassette(path, "record")
+            raise AssertionError("segundo gravador no mesmo cassette deveria ser recusado")
+        except RuntimeError as e:
+            assert "outro processo" in str(e), e
+        first.close()
+        Cassette(path, "record").close()
+    print("Cassette OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+
+async def send(thread_id: str, message: str, delay_s: float = 0.0) -> dict:
+    await asyncio.sleep(delay_s)
+    return await backend_app.chat(backend_app.ChatRequest(message=message, thread_id=thread_id))
+
+
+async def scenario(stub: StubAsyncOpenAI) -> None:
+    thread_id = (await stub.beta.threads.create()).id
+    # Primeira linha abre um run; as três seguintes chegam com o run ativo
+    first, *rest = await asyncio.gather(
+        send(thread_id, "Oi Leandro"),
+        send(thread_id, "tudo bem?", 0.3),
+        send(thread_id, "queria ver o Taj Mahal", 0.35),
+        send(thread_id, "tem foto do lote?", 0.4),
+    )
+    assert first["assistant_message"] == "Resposta para: Oi Leandro", first
+    expected = "Resposta para: tudo bem?\nqueria ver o Taj Mahal\ntem foto do lote?"
+    for out in rest:
+        assert out["assistant_message"] == expected, out
+        assert out["run_id"] == rest[0]["run_id"] != first["run_id"], out
+    assert stub.calls["runs.create"] == 2, stub.calls
+    assert backend_app.lanes.active() == 0, "Lane do thread não foi liberada"
+
+    # Job e stream no mesmo thread também esperam o run ativo terminar
+    job_resp, stream_resp = await asyncio.gather(
+        backend_app.chat(backend_app.ChatRequest(message="job", thread_id=thread_id, async_job=True)),
+        backend_app.chat_stream(backend_app.ChatRequest(message="stream", thread_id=thread_id)),
+    )
+    body = "".join([chunk async for chunk in stream_resp.body_iterator])
+    assert "event: done" in body, body
+    await backend_app.scheduler.stop()
+    print(f"4 mensagens -> 2 runs; chamadas: {stub.calls}")
+
+
+def main():
+    stub = backend_app.client = StubAsyncOpenAI(latency_s=0.05, run_s=0.5)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    backend_app.scheduler = backend_app.RunScheduler(interval_s=0.1, timeout_s=30, concurrency=8, ttl_s=60)
+    asyncio.run(scenario(stub))
+    print("Serialização e agrupamento por thread OK.")
+
+
+if __name__ == "__main__":
+    main()
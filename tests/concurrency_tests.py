@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+LATENCY_S = 0.2
+PARALLEL = 20
+
+
+async def timed_chats(n: int) -> float:
+    start = time.perf_counter()
+    outs = await asyncio.gather(*[
+        backend_app.chat(backend_app.ChatRequest(message=f"Mensagem {i}")) for i in range(n)
+    ])
+    elapsed = time.perf_counter() - start
+    for i, out in enumerate(outs):
+        assert out["assistant_message"] == f"Resposta para: Mensagem {i}", out
+        assert out["thread_id"], out
+    return elapsed
+
+
+def main():
+    backend_app.client = StubAsyncOpenAI(latency_s=LATENCY_S)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+
+    single = asyncio.run(timed_chats(1))
+    parallel = asyncio.run(timed_chats(PARALLEL))
+    print(f"1 chamada: {single:.2f}s | {PARALLEL} chamadas paralelas: {parallel:.2f}s")
+    # Se alguma chamada bloqueasse o event loop, o tempo cresceria ~linearmente com N.
+    assert parallel < single * 2, "Chamadas paralelas a /chat estão sendo serializadas"
+    print("Concorrência OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import random
+import string
+import re
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora.constraints import SUBSTRING_PREFILTER_MAX, CompiledRules, ConstraintEngine, Rule
+from ai_vendedora.generator import LeandroOpeningGenerator
+
+BANNED = "A gente só fecha negócio se fizer sentido pros dois lados. Combinado?"
+
+
+def is_word(text, i):
+    return 0 <= i < len(text) and re.match(r"\w", text[i]) is not None
+
+
+def naive_apply(phrases, text):
+    # Reference: leftmost-longest case-insensitive removal of whole words, phrase by phrase at each position
+    lowered = [p.lower() for p in phrases]
+    out, i = [], 0
+    while i < len(text):
+        hits = [p for p in lowered if text[i:i + len(p)].lower() == p
+                and not (is_word(text, i - 1) and is_word(p, 0))
+                and not (is_word(text, i + len(p)) and is_word(p, len(p) - 1))]
+        if hits:
+            i += max(len(p) for p in hits)
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def check_profile_rules(engine):
+    text, fired = engine.apply(f"Oi! {BANNED.upper()} Tudo certo?", "BR")
+    assert BANNED.lower() not in text.lower() and fired == ("banned_phrases[0]",), (text, fired)
+
+    # The old US filter only matched lowercase; "Container"/"LOGISTICS" slipped through
+    text, fired = engine.apply(" Our Container and LOGISTICS desk, containers too. ", "us")
+    assert "contain" not in text.lower() and "logistic" not in text.lower(), text
+    assert fired == ("US.avoid_container_opening",) and text == text.strip(), (text, fired)
+
+    # "İ" grows when lowercased: falls back to the IGNORECASE pattern, offsets stay right
+    assert engine.apply("İstanbul CONTAINER hub", "US") == ("İstanbul  hub", ("US.avoid_container_opening",))
+
+    # Whole words only: longer words that merely contain a term are left alone
+    text = "Our logistical team, the containership Logistica and subcontainers"
+    assert engine.apply(text, "US") == (text, ()), engine.apply(text, "US")
+    assert engine.apply("logistics, containers.", "US") == (", .", ("US.avoid_container_opening",))
+    assert engine.scan(f"{BANNED}!", "BR") == ("banned_phrases[0]",) and not engine.scan(f"x{BANNED}", "BR")
+
+    # Market rules stay in their market; banned phrases apply everywhere
+    assert engine.apply("container", "BR") == ("container", ())
+    assert engine.scan(f"container {BANNED}", "EU") == ("banned_phrases[0]",)
+    assert engine.scan(f"{BANNED} Container", "US") == ("banned_phrases[0]", "US.avoid_container_opening")
+
+
+def check_against_naive():
+    rnd = random.Random(5)
+    for _ in range(200):
+        phrases = ["".join(rnd.choice("abcAB ?") for _ in range(rnd.randint(1, 5))) for _ in range(rnd.randint(1, 8))]
+        # Below and above SUBSTRING_PREFILTER_MAX: the prefilter must not change the result
+        padding = [f"zz{i}" for i in range(rnd.choice((0, SUBSTRING_PREFILTER_MAX)))]
+        rules = CompiledRules([Rule(f"r{i}", [p]) for i, p in enumerate(phrases + padding)])
+        for _ in range(10):
+            text = "".join(rnd.choice("abcABx ?") for _ in range(rnd.randint(0, 30)))
+            assert rules.apply(text)[0] == naive_apply([p for p in phrases if p], text), (phrases, text)
+
+
+def loop_apply(phrases, text):
+    # Previous _ensure_constraints: one `in` + replace per banned phrase
+    for banned in phrases:
+        if banned in text:
+            text = text.replace(banned, "")
+    return text
+
+
+def cost_us(fn, messages):
+    start = time.perf_counter()
+    for msg in messages:
+        fn(msg)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def scan_costs(n_phrases, messages):
+    rnd = random.Random(n_phrases)
+    phrases = [BANNED] + [" ".join("".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(3, 9)))
+                                   for _ in range(rnd.randint(2, 6))) for _ in range(n_phrases - 1)]
+    rules = CompiledRules([Rule(f"banned_phrases[{i}]", [p]) for i, p in enumerate(phrases)])
+    return cost_us(rules.apply, messages), cost_us(lambda m: loop_apply(phrases, m), messages)
+
+
+def main():
+    gen = LeandroOpeningGenerator()
+    check_profile_rules(gen.constraints)
+    check_profile_rules(ConstraintEngine.from_profile(gen.profile))
+    check_against_naive()
+    print("Constraint rules OK.")
+
+    messages = [gen.generate({"name": "Tiago", "market": m, "role": "prospect"}, seed=i)["message"]
+                for i, m in enumerate(["BR", "US", "LATAM", "EU"] * 500)]
+    costs = {n: scan_costs(n, messages) for n in (1, 10, 100, 1000, 10000)}
+    print(f"  {'phrases':>7} {'engine (us/msg)':>16} {'per-phrase loop':>16}")
+    for n, (engine, loop) in costs.items():
+        print(f"  {n:>7} {engine:>16.2f} {loop:>16.2f}")
+    # The old loop was case-sensitive; matching "Container" too means lowering the message once, which is
+    # most of what a small list costs now (the substring prefilter skips the regex for clean messages)
+    lower = cost_us(str.lower, messages)
+    print(f"  lowering the message alone: {lower:.2f} us/msg")
+    assert costs[1][0] < 2 * (lower + costs[1][1]), "small lists should cost about one lowering plus the old loop"
+    assert costs[10000][0] < costs[100][0] * 10, "engine cost should grow far slower than the banned list"
+    assert costs[10000][0] < costs[10000][1], "engine should beat the per-phrase loop on large lists"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+import warnings
+from urllib import request
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Só a variável de ambiente aponta o backend para o servidor simulado
+PORT = free_port()
+BASE_URL = f"http://127.0.0.1:{PORT}/v1"
+os.environ["OPENAI_BASE_URL"] = BASE_URL
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+os.environ.setdefault("OPENAI_MAX_RETRIES", "0")
+
+import uvicorn
+from fastapi import HTTPException
+from openai import APIStatusError, OpenAI
+from backend import app as backend_app
+from backend.fake_openai import FakeOpenAI, create_app
+from stream_tests import parse_sse
+
+REPLIES = {"replies": [{"match": "container", "reply": "Sobre container: {message} (turno {turn})"}],
+           "default": "Oi! Você disse: {message}"}
+
+
+def start_server(fake: FakeOpenAI) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        assert time.time() < deadline, "servidor simulado não subiu"
+        time.sleep(0.05)
+    return server
+
+
+async def chat(message: str, thread_id: str | None = None) -> dict:
+    return await backend_app.chat(backend_app.ChatRequest(message=message, thread_id=thread_id))
+
+
+async def stream(message: str) -> list:
+    resp = await backend_app.chat_stream(backend_app.ChatRequest(message=message))
+    return parse_sse("".join([chunk async for chunk in resp.body_iterator]))
+
+
+def check_bootstrap_subset(sync: OpenAI):
+    # Mesmas chamadas do assistants_bootstrap.py
+    vs = sync.vector_stores.create(name="LeandroKnowledge")
+    with tempfile.NamedTemporaryFile("wb", suffix=".json", delete=False) as tmp:
+        tmp.write(b'{"exemplo": true}')
+    with open(tmp.name, "rb") as fh:
+        f = sync.files.create(file=fh, purpose="assistants")
+    os.unlink(tmp.name)
+    assert f.bytes == 17 and f.filename == os.path.basename(tmp.name), f
+    sync.vector_stores.files.create(vector_store_id=vs.id, file_id=f.id)
+    listed = [vsf.id for vsf in sync.vector_stores.files.list(vector_store_id=vs.id)]
+    assert listed == [f.id], listed
+    assert sync.files.retrieve(f.id).filename == f.filename
+    sync.vector_stores.files.delete(vector_store_id=vs.id, file_id=f.id)
+    sync.files.delete(f.id)
+    assert not list(sync.vector_stores.files.list(vector_store_id=vs.id))
+    asst = sync.beta.assistants.create(name="Agente", model="gpt-4.1", instructions="x",
+                                       tools=[{"type": "file_search"}],
+                                       tool_resources={"file_search": {"vector_store_ids": [vs.id]}})
+    updated = sync.beta.assistants.update(assistant_id=asst.id, instructions="y")
+    assert updated.id == asst.id and updated.instructions == "y", updated
+    return asst.id
+
+
+async def backend_checks(fake: FakeOpenAI):
+    # Um único event loop: o AsyncOpenAI do backend fica preso ao loop em que abriu as conexões.
+    # Engine assistants: multi-turno no mesmo thread, respostas por template
+    backend_app.CHAT_ENGINE = "assistants"
+    first = await chat("Olá, tudo bem?")
+    assert first["assistant_message"] == "Oi! Você disse: Olá, tudo bem?", first
+    second = await chat("Não consigo fechar container.", first["thread_id"])
+    assert second["thread_id"] == first["thread_id"], second
+    assert second["assistant_message"] == "Sobre container: Não consigo fechar container. (turno 2)", second
+    run = fake.runs[second["run_id"]]
+    assert run["status"] == "completed" and run["usage"]["total_tokens"] > 0, run
+    assert run["completed_at"] - run["created_at"] in (2, 3), run
+
+    events = await stream("Pode mandar fotos?")
+    names = [e[0] for e in events]
+    assert names[0] == "start" and names[-1] == "done" and "delta" in names, names
+    assert events[-1][1]["assistant_message"] == "Oi! Você disse: Pode mandar fotos?", events[-1]
+    print("Engine assistants (poll + stream) OK.")
+
+    # Engine completions
+    backend_app.CHAT_ENGINE = "completions"
+    out = await chat("Quais padrões você tem?")
+    assert out["assistant_message"] == "Oi! Você disse: Quais padrões você tem?", out
+    events = await stream("E o preço?")
+    assert events[-1][0] == "done" and events[-1][1]["assistant_message"] == "Oi! Você disse: E o preço?", events
+    backend_app.CHAT_ENGINE = "assistants"
+    print("Engine completions (resposta + stream) OK.")
+
+    # Falha e expiração injetadas chegam ao backend como status do run
+    fake.fail_rate = 1.0
+    try:
+        await chat("vai falhar")
+        raise AssertionError("run failed deveria virar erro")
+    except HTTPException as e:
+        assert "status=failed" in e.detail, e.detail
+    fake.fail_rate, fake.expire_rate, fake.expire_after_s = 0.0, 1.0, 10
+    try:
+        await chat("vai expirar")
+        raise AssertionError("run expired deveria virar erro")
+    except HTTPException as e:
+        assert "status=expired" in e.detail, e.detail
+    fake.expire_rate = 0.0
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)  # Assistants API marcada como deprecated no SDK
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as tmp:
+        json.dump(REPLIES, tmp)
+    # 50x: run de 2s simulados leva ~40 ms reais
+    fake = FakeOpenAI(time_scale=50, api_latency="fixed:0", queue_latency="fixed:0.5", run_latency="fixed:2",
+                      replies_path=tmp.name, seed=7)
+    os.unlink(tmp.name)
+    server = start_server(fake)
+    try:
+        sync = OpenAI(max_retries=0)
+        assistant_id = check_bootstrap_subset(sync)
+        backend_app.load_state = lambda: {"assistant_id": assistant_id}
+        print("Bootstrap (vector store, files, assistants) OK.")
+
+        asyncio.run(backend_checks(fake))
+
+        # Cancelamento: cancelling -> cancelled; com run ativo o thread recusa mensagens
+        th = sync.beta.threads.create()
+        sync.beta.threads.messages.create(thread_id=th.id, role="user", content="oi")
+        fake.run_latency = lambda rnd: 1000.0
+        r = sync.beta.threads.runs.create(thread_id=th.id, assistant_id=assistant_id)
+        try:
+            sync.beta.threads.messages.create(thread_id=th.id, role="user", content="de novo")
+            raise AssertionError("mensagem com run ativo deveria falhar")
+        except APIStatusError as e:
+            assert e.status_code == 400, e
+        assert sync.beta.threads.runs.cancel(thread_id=th.id, run_id=r.id).status == "cancelling"
+        time.sleep(0.05)
+        assert sync.beta.threads.runs.retrieve(thread_id=th.id, run_id=r.id).status == "cancelled"
+
+        # Relógio simulado: adiantar completa o run sem esperar
+        r = sync.beta.threads.runs.create(thread_id=th.id, assistant_id=assistant_id)
+        assert sync.beta.threads.runs.retrieve(thread_id=th.id, run_id=r.id).status in ("queued", "in_progress")
+        req = request.Request(f"http://127.0.0.1:{PORT}/_fake/advance", data=b'{"seconds": 2000}', method="POST")
+        request.urlopen(req, timeout=10).close()
+        assert sync.beta.threads.runs.retrieve(thread_id=th.id, run_id=r.id).status == "completed"
+        print("Falha, expiração, cancelamento e relógio simulado OK.")
+
+        # Erros HTTP injetados
+        fake.error_rate = 1.0
+        try:
+            sync.beta.threads.create()
+            raise AssertionError("deveria responder 500")
+        except APIStatusError as e:
+            assert e.status_code == 500, e
+        fake.error_rate, fake.rate_limit_rate = 0.0, 1.0
+        try:
+            sync.beta.threads.create()
+            raise AssertionError("deveria responder 429")
+        except APIStatusError as e:
+            assert e.status_code == 429, e
+        fake.rate_limit_rate = 0.0
+        assert fake.calls["POST /v1/threads"] >= 3, fake.calls
+        print("Erros 500/429 injetados OK.")
+    finally:
+        server.should_exit = True
+    print("Fake OpenAI OK.")
+
+
+if __name__ == "__main__":
+    main()
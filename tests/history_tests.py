@@ -0,0 +1,160 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from backend.history import HistoryManager, count_tokens
+from stub_openai import StubAsyncOpenAI
+
+TURNS = [
+    "Oi Leandro, sou distribuidor nos EUA e trabalho com quartzito há 10 anos.",
+    "Seu preço está caro comparado ao meu fornecedor atual.",
+    "E o prazo de entrega até Houston, quanto tempo leva?",
+    "Não consigo fechar um container inteiro agora.",
+    "Quais materiais exóticos você tem em estoque?",
+    "Pode mandar fotos reais dos blocos?",
+    "Como funciona o pagamento, precisa de adiantamento?",
+    "Tive problema de qualidade com trincas em outro lote.",
+]
+
+
+def fill(store, thread_id: str, n: int) -> None:
+    for i in range(n):
+        msg = TURNS[i % len(TURNS)]
+        store.append(thread_id, {"role": "user", "content": msg},
+                     {"role": "assistant", "content": f"Entendi. Sobre isso: {msg} Vamos ver juntos o melhor caminho."})
+
+
+def check_manager(db_path: str) -> None:
+    assert count_tokens("Olá, tudo bem?") == 5
+    assert 0.15 < count_tokens("negociação " * 100) / len("negociação " * 100) < 0.35
+
+    store = backend_app.ConversationStore(db_path, ttl_s=3600)
+    manager = HistoryManager(store, db_path, budget_tokens=300, recent_tokens=120, max_messages=40, note_max_tokens=150)
+    fill(store, "t1", 3)
+    ctx = manager.context("t1")
+    assert not ctx["compacted"] and not ctx["note"] and len(ctx["messages"]) == 6, ctx
+    assert ctx["tokens"] == sum(count_tokens(m["content"]) for m in ctx["messages"]) < 300
+
+    fill(store, "t1", 5)
+    ctx = manager.context("t1")
+    assert ctx["compacted"] and ctx["messages"][0]["role"] == "user", ctx
+    literal = sum(count_tokens(m["content"]) for m in ctx["messages"])
+    assert literal <= 120 and ctx["messages"][-1]["content"].startswith("Entendi. Sobre isso: Quais"), ctx
+    assert "mercado US" in ctx["note"] and "papel distribuidor" in ctx["note"], ctx["note"]
+    for objection in ("preço", "fornecedor atual", "prazo"):
+        assert objection in ctx["note"], (objection, ctx["note"])
+    # O que ainda está literal não entra na nota
+    assert "container/volume" not in ctx["note"] and "container" in ctx["messages"][0]["content"]
+    assert count_tokens(ctx["note"]) <= 150, count_tokens(ctx["note"])
+
+    # Outro worker (outra conexão no mesmo arquivo) continua de onde a nota parou, sem recompactar
+    other = HistoryManager(backend_app.ConversationStore(db_path, ttl_s=3600), db_path, 300, 120, 40, 150)
+    again = other.context("t1")
+    assert not again["compacted"] and again["note"] == ctx["note"] and again["messages"] == ctx["messages"]
+    # Papel informado no request prevalece sobre o deduzido
+    assert "papel arquiteto" in other.context("t1", role="architect")["note"]
+
+    # Conversa longa: o prompt para de crescer
+    fill(store, "t2", 60)
+    sizes = []
+    for _ in range(3):
+        fill(store, "t2", 10)
+        sizes.append(manager.context("t2")["tokens"])
+    assert max(sizes) <= 150 + 300, sizes
+    print(f"Compactação OK: nota de {count_tokens(ctx['note'])} tokens, {len(ctx['messages'])} mensagens literais; "
+          f"conversa de 90 turnos com {sizes[-1]} tokens de histórico.")
+
+
+async def conversation(engine: str, turns: int, thread_id: str = None, fail_at: int = None,
+                       stub: StubAsyncOpenAI = None) -> StubAsyncOpenAI:
+    backend_app.CHAT_ENGINE = engine
+    stub = backend_app.client = stub or StubAsyncOpenAI(latency_s=0.001)
+    runs = []
+    create = stub.beta.threads.runs.create
+
+    async def record_run(**kwargs):
+        if len(runs) == fail_at:
+            runs.append(None)
+            raise RuntimeError("run recusado")
+        # O que o run vai ler do thread (as últimas last_messages mensagens) e o que a nota deixou literal
+        window = [dict(m) for m in stub.threads[kwargs["thread_id"]]]
+        if "truncation_strategy" in kwargs:
+            window = window[-kwargs["truncation_strategy"]["last_messages"]:]
+        upto_id = backend_app.history.memory(kwargs["thread_id"])["upto_id"]
+        literal = [{"role": r[1], "content": r[2]} for r in backend_app.conversations.since(kwargs["thread_id"], upto_id)]
+        runs.append({**kwargs, "window": window, "literal": literal})
+        return await create(**kwargs)
+
+    stub.beta.threads.runs.create = record_run
+    stub.run_kwargs = runs
+    for i in range(turns):
+        try:
+            out = await backend_app.chat(backend_app.ChatRequest(message=TURNS[i % len(TURNS)], thread_id=thread_id,
+                                                                 market="US"))
+        except RuntimeError:
+            continue
+        thread_id = out["thread_id"]
+    stub.thread_id = thread_id
+    return stub
+
+
+def check_window(stub) -> None:
+    # Cada run com truncation lê exatamente as mensagens que ficaram literais: a nota cobre todo o resto
+    for kwargs in stub.run_kwargs:
+        if kwargs is None or "truncation_strategy" not in kwargs:
+            continue
+        assert kwargs["window"] == kwargs["literal"], (kwargs["window"], kwargs["literal"])
+        assert kwargs["window"][0]["role"] == "user" and kwargs["window"][-1]["role"] == "user", kwargs["window"]
+
+
+def check_engines() -> None:
+    backend_app.history = HistoryManager(backend_app.conversations, ":memory:", budget_tokens=300, recent_tokens=120,
+                                         max_messages=40, note_max_tokens=150)
+    stub = asyncio.run(conversation("completions", 12))
+    system = [m["content"] for m in stub.prompts[-1] if m["role"] == "system"]
+    assert any(s.startswith("Memória da conversa") and "mercado US" in s for s in system), system
+    literal = [m for m in stub.prompts[-1] if m["role"] != "system"]
+    assert len(literal) < 2 * 12 and literal[-1]["content"] == TURNS[11 % len(TURNS)], literal
+
+    stub = asyncio.run(conversation("assistants", 12))
+    first, last = stub.run_kwargs[0], stub.run_kwargs[-1]
+    assert "truncation_strategy" not in first, first
+    assert last["truncation_strategy"]["type"] == "last_messages", last
+    assert last["truncation_strategy"]["last_messages"] < 2 * 12, last
+    check_window(stub)
+    assert "Memória da conversa" in last["additional_instructions"], last
+
+    # Run recusado no meio: a mensagem do cliente ficou no thread e na cópia local, a contagem continua batendo
+    failed = asyncio.run(conversation("assistants", 12, fail_at=6))
+    assert failed.run_kwargs[6] is None and any("truncation_strategy" in k for k in failed.run_kwargs[7:]), failed.run_kwargs
+    check_window(failed)
+
+    # Thread com mensagens de antes da cópia local: a nota vai, mas sem cortar o que ela nunca resumiu
+    old = StubAsyncOpenAI(latency_s=0.001)
+    old.threads["thread_antigo"] = [{"role": r, "content": f"Conversa antiga {i}"} for i in range(30)
+                                    for r in ("user", "assistant")]
+    old = asyncio.run(conversation("assistants", 12, thread_id="thread_antigo", stub=old))
+    assert "Memória da conversa" in old.run_kwargs[-1]["additional_instructions"], old.run_kwargs[-1]
+    assert not any("truncation_strategy" in k for k in old.run_kwargs), old.run_kwargs[-1]
+    print(f"Engines OK: completions com nota no prompt; assistants com "
+          f"last_messages={last['truncation_strategy']['last_messages']} e a nota nas instruções adicionais.")
+
+
+def main():
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    with tempfile.TemporaryDirectory() as tmp:
+        check_manager(os.path.join(tmp, "history.sqlite3"))
+    check_engines()
+    print("Histórico OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+JOBS = 200
+RUN_S = 1.5
+
+callbacks = []
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        callbacks.append(json.loads(body))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+async def burst(callback_url: str, store_path: str) -> None:
+    start = time.perf_counter()
+    accepted = await asyncio.gather(*[
+        backend_app.chat(backend_app.ChatRequest(message=f"Mensagem {i}", async_job=True)) for i in range(JOBS)
+    ])
+    accepted_s = time.perf_counter() - start
+    job_ids = []
+    for resp in accepted:
+        assert resp.status_code == 202, resp.status_code
+        body = json.loads(resp.body)
+        assert body["status"] == "pending" and body["run_id"], body
+        job_ids.append(body["job_id"])
+
+    # callback_url só para http(s) em hosts de JOB_CALLBACK_HOSTS (SSRF)
+    known = len(backend_app.scheduler.jobs)
+    for bad in ("http://169.254.169.254/latest/meta-data", "file:///etc/passwd", "ftp://127.0.0.1/x",
+                "http://127.0.0.1.evil.test/cb", "http://[::1/cb"):
+        try:
+            await backend_app.chat(backend_app.ChatRequest(message="Callback proibido", callback_url=bad))
+            raise AssertionError(f"callback_url aceito: {bad}")
+        except backend_app.HTTPException as e:
+            assert e.status_code == 400, (bad, e.status_code)
+    assert len(backend_app.scheduler.jobs) == known, "callback_url recusado não pode criar job"
+
+    with_cb = await backend_app.chat(backend_app.ChatRequest(message="Com callback", callback_url=callback_url))
+    cb_job = json.loads(with_cb.body)["job_id"]
+
+    while True:
+        views = [await backend_app.chat_job(j) for j in job_ids]
+        if all(v["status"] != "pending" for v in views):
+            break
+        await asyncio.sleep(0.1)
+    total_s = time.perf_counter() - start
+    for i, v in enumerate(views):
+        assert v["status"] == "completed", v
+        assert v["assistant_message"] == f"Resposta para: Mensagem {i}", v
+
+    while not callbacks:
+        await asyncio.sleep(0.05)
+    assert callbacks[0]["job_id"] == cb_job and callbacks[0]["status"] == "completed", callbacks[0]
+
+    # Outro worker (outro processo, mesmo SQLite) não tem o job em memória, mas responde pelo JobStore
+    other = backend_app.RunScheduler(interval_s=0.25, timeout_s=30, concurrency=4, ttl_s=60,
+                                     store=backend_app.JobStore(store_path, ttl_s=60))
+    for job_id in (job_ids[0], job_ids[-1], cb_job):
+        seen = await other.get(job_id)
+        assert seen and seen["status"] == "completed" and seen["assistant_message"], seen
+        assert "callback_url" not in seen
+    assert await other.get("inexistente") is None
+    other.store.close()
+
+    retrieves = backend_app.client.calls["runs.retrieve"]
+    print(f"{JOBS} jobs aceitos em {accepted_s:.2f}s, todos concluídos em {total_s:.2f}s "
+          f"({retrieves} runs.retrieve num único loop).")
+    await backend_app.scheduler.stop()
+
+
+def main():
+    backend_app.client = StubAsyncOpenAI(latency_s=0.05, run_s=RUN_S)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    backend_app.JOB_CALLBACK_HOSTS = ("127.0.0.1",)
+    tmp = tempfile.TemporaryDirectory()
+    store_path = os.path.join(tmp.name, "jobs.sqlite3")
+    backend_app.scheduler = backend_app.RunScheduler(
+        interval_s=0.25, timeout_s=30, concurrency=64, ttl_s=60, store=backend_app.JobStore(store_path, ttl_s=60)
+    )
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CallbackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        asyncio.run(burst(f"http://127.0.0.1:{server.server_port}/callback", store_path))
+    finally:
+        server.shutdown()
+        backend_app.scheduler.store.close()
+        tmp.cleanup()
+    print("Modo job OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from backend.knowledge import KnowledgeIndex
+from stub_openai import StubAsyncOpenAI
+
+ROOT = Path(__file__).resolve().parents[1]
+PROFILE = ROOT / "perfil completot odos dados ia.txt"
+EXAMPLES = ROOT / "gpt_conversation_examples.json"
+
+
+def check_persistence(tmp: Path) -> None:
+    profile, examples, index_path = tmp / PROFILE.name, tmp / EXAMPLES.name, tmp / "index.json"
+    shutil.copy(PROFILE, profile)
+    shutil.copy(EXAMPLES, examples)
+
+    first = KnowledgeIndex.load_or_build(index_path, profile, examples)
+    assert first.built and index_path.exists()
+    again = KnowledgeIndex.load_or_build(index_path, profile, examples)
+    assert not again.built, "Índice reconstruído sem mudança nas fontes"
+    assert again.docs == first.docs
+
+    # touch sem mudar conteúdo não reconstrói; mudança de conteúdo sim
+    os.utime(profile)
+    assert not KnowledgeIndex.load_or_build(index_path, profile, examples).built
+    profile.write_text(profile.read_text(encoding="utf-8") + "\n## Novo\nQuartzito Taj Mahal em promoção.\n",
+                       encoding="utf-8")
+    rebuilt = KnowledgeIndex.load_or_build(index_path, profile, examples)
+    assert rebuilt.built and "Taj Mahal" in rebuilt.search("quartzito taj mahal", k=1)[0]["text"]
+
+
+def check_retrieval() -> None:
+    index = KnowledgeIndex.build(PROFILE, EXAMPLES)
+    ex = index.examples_for("We can't close a full container now.", market="US", role="distributor", k=1)[0]
+    assert ex["markets"] == ["US"] and "container" in ex["cliente"].lower(), ex
+    ex = index.examples_for("Seu preço está alto", market="BR", role="marmorista", k=1)[0]
+    assert ex["market"] == "Marmoristas - Brasil" and "preço" in ex["cliente"].lower(), ex
+    # Sem tags, o BM25 sozinho ainda acha o exemplo certo
+    ex = index.examples_for("En mi mercado todos buscan precio", k=1)[0]
+    assert "América Latina" in ex["market"], ex
+
+    n = 2000
+    start = time.perf_counter()
+    for _ in range(n):
+        index.context("Meu cliente achou caro o material.", market="BR", role="arquiteto")
+    per_query_ms = (time.perf_counter() - start) / n * 1000
+    print(f"Busca local: {per_query_ms:.3f} ms por consulta ({len(index.docs)} documentos)")
+    assert per_query_ms < 1.0, per_query_ms
+
+
+async def check_prompt_injection(tmp: Path) -> None:
+    backend_app.KNOWLEDGE_MODE = "local"
+    backend_app.KNOWLEDGE_INDEX_PATH = tmp / "app-index.json"
+
+    backend_app.CHAT_ENGINE = "completions"
+    stub = backend_app.client = StubAsyncOpenAI(latency_s=0.01)
+    await backend_app.chat(backend_app.ChatRequest(message="We can't close a full container now.",
+                                                   market="US", role="distributor"))
+    system = [m["content"] for m in stub.prompts[-1] if m["role"] == "system"]
+    assert len(system) == 2 and "Distribuidores - EUA" in system[1], system
+
+    backend_app.CHAT_ENGINE = "assistants"
+    options = await backend_app.run_options("Seu preço está alto", "BR", "marmorista")
+    assert {"type": "file_search"} not in options["tools"], options
+    assert "Marmoristas - Brasil" in options["additional_instructions"], options
+
+
+def main():
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    with tempfile.TemporaryDirectory() as tmp:
+        check_persistence(Path(tmp))
+        check_retrieval()
+        asyncio.run(check_prompt_injection(Path(tmp)))
+    print("Conhecimento local OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:  # versões recentes do SDK da openai usam o httpx2 (mesma API)
+    import httpx2 as httpx
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from run_validation import BASE, REPORTS, SCENARIOS, validate
+
+# Gerador de carga assíncrono para /chat. Reaproveita os cenários de run_validation.py; cada conversa
+# abre com a mensagem do cenário e segue com --turns-1 mensagens de follow-up no mesmo thread_id.
+#   closed: --users usuários virtuais, cada um inicia a próxima conversa quando a anterior termina
+#   open:   conversas chegam a --rate por segundo (Poisson), independentemente de quanto o servidor demora
+# --endpoint stream usa o /chat/stream (SSE) e mede também o tempo até o primeiro delta.
+# Um httpx.AsyncClient por execução (o mesmo do SDK da openai): pool keep-alive sem limite de conexões.
+
+FOLLOW_UPS = [
+    "Entendi. Quais padrões você tem disponíveis agora?",
+    "Can you send me photos of the slabs?",
+    "Qual seria o próximo passo?",
+    "¿Cuánto tiempo tarda el envío?",
+    "Faz sentido, me conta mais.",
+]
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body[:200]}")
+        self.status = status
+
+
+class StreamError(Exception):
+    """Evento error no meio do /chat/stream (o status HTTP já foi 200)."""
+
+
+class LoadRun:
+    def __init__(self, base: str, turns: int, timeout: float, check: bool, seed: int | None,
+                 endpoint: str = "chat"):
+        self.base = base
+        self.endpoint = endpoint
+        self.turns = turns
+        self.timeout = timeout
+        self.check = check
+        self.rnd = random.Random(seed)
+        self.samples = []  # um registro por requisição
+        self.conversations = 0
+        self.dropped = 0
+        self.started = 0.0
+        self.client = None
+
+    async def send(self, payload: dict, sample: dict) -> dict:
+        """Um turno; devolve o JSON do /chat ou o evento done do /chat/stream."""
+        if self.endpoint == "chat":
+            resp = await self.client.post("/chat", json=payload)
+            if resp.status_code >= 400:
+                raise HttpError(resp.status_code, resp.text)
+            return resp.json()
+        t0 = time.perf_counter()
+        async with self.client.stream("POST", "/chat/stream", json=payload) as resp:
+            if resp.status_code >= 400:
+                raise HttpError(resp.status_code, (await resp.aread()).decode("utf-8", "replace"))
+            event = None
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "delta" and "first_delta" not in sample:
+                        sample["first_delta"] = time.perf_counter() - t0
+                    elif event == "error":
+                        raise StreamError(data.get("detail") or "erro sem detalhe")
+                    elif event == "done":
+                        return data
+        raise StreamError("stream terminou sem o evento done")
+
+    async def conversation(self, scenario: dict):
+        """Uma conversa multi-turno; para no primeiro erro, já que o thread_id deixa de ser confiável."""
+        self.conversations += 1
+        thread_id = None
+        for turn in range(self.turns):
+            msg = scenario["msg"] if turn == 0 else FOLLOW_UPS[(turn - 1) % len(FOLLOW_UPS)]
+            payload = {"message": msg}
+            if thread_id:
+                payload["thread_id"] = thread_id
+            sample = {"scenario": scenario["name"], "turn": turn + 1, "start": time.perf_counter() - self.started}
+            t0 = time.perf_counter()
+            try:
+                out = await asyncio.wait_for(self.send(payload, sample), self.timeout)
+            except asyncio.TimeoutError:
+                sample.update(latency=time.perf_counter() - t0, outcome="timeout")
+            except HttpError as e:
+                sample.update(latency=time.perf_counter() - t0, outcome="error", error=str(e), status=e.status)
+            except Exception as e:
+                sample.update(latency=time.perf_counter() - t0, outcome="error", error=f"{type(e).__name__}: {e}")
+            else:
+                sample.update(latency=time.perf_counter() - t0, outcome="ok")
+                thread_id = out.get("thread_id") or thread_id
+                if self.check and turn == 0:
+                    ok, reason, _ = validate(scenario["name"], msg, (out.get("assistant_message") or "").strip())
+                    if not ok:
+                        sample.update(outcome="invalid", error=reason)
+            self.samples.append(sample)
+            if sample["outcome"] in ("timeout", "error"):
+                return
+
+    async def closed_loop(self, users: int, duration: float, conversations: int | None):
+        deadline = time.perf_counter() + duration
+
+        async def user(uid: int):
+            while time.perf_counter() < deadline:
+                if conversations is not None and self.conversations >= conversations:
+                    return
+                await self.conversation(self.rnd.choice(SCENARIOS))
+
+        await asyncio.gather(*[user(i) for i in range(users)])
+
+    async def open_loop(self, rate: float, duration: float, max_inflight: int):
+        """Chegadas Poisson a `rate` conversas/s; acima de max_inflight a chegada é descartada (e contada)."""
+        tasks = set()
+        deadline = time.perf_counter() + duration
+        next_at = time.perf_counter()
+        while True:
+            next_at += self.rnd.expovariate(rate)
+            if next_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if len(tasks) >= max_inflight:
+                self.dropped += 1
+                continue
+            task = asyncio.create_task(self.conversation(self.rnd.choice(SCENARIOS)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run(self, mode: str, **opts) -> dict:
+        # Timeout por requisição fica com o asyncio.wait_for de cada turno
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        self.started = time.perf_counter()
+        async with httpx.AsyncClient(base_url=self.base, timeout=None, limits=limits) as self.client:
+            if mode == "open":
+                await self.open_loop(opts["rate"], opts["duration"], opts["max_inflight"])
+            else:
+                await self.closed_loop(opts["users"], opts["duration"], opts.get("conversations"))
+        elapsed = time.perf_counter() - self.started
+        return summarize(self.samples, elapsed, self.conversations, self.dropped)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Percentil por nearest-rank (sem interpolação)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(-(-p * len(sorted_values) // 100)) - 1))
+    return sorted_values[k]
+
+
+def latency_stats(latencies: list) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def summarize(samples: list, elapsed: float, conversations: int, dropped: int = 0) -> dict:
+    total = len(samples)
+    by_outcome = {}
+    for s in samples:
+        by_outcome[s["outcome"]] = by_outcome.get(s["outcome"], 0) + 1
+    answered = [s["latency"] for s in samples if s["outcome"] in ("ok", "invalid")]
+    per_turn = {}
+    for s in samples:
+        if s["outcome"] in ("ok", "invalid"):
+            per_turn.setdefault(s["turn"], []).append(s["latency"])
+    errors = {}
+    for s in samples:
+        if s["outcome"] == "error":
+            key = s["error"].split(":")[0]
+            errors[key] = errors.get(key, 0) + 1
+    first_delta = [s["first_delta"] for s in samples if "first_delta" in s]
+    return {
+        "elapsed_s": elapsed,
+        "conversations": conversations,
+        "dropped_arrivals": dropped,
+        "requests": total,
+        "throughput_rps": len(answered) / elapsed if elapsed else 0.0,
+        "outcomes": by_outcome,
+        "error_rate": by_outcome.get("error", 0) / total if total else 0.0,
+        "timeout_rate": by_outcome.get("timeout", 0) / total if total else 0.0,
+        "invalid_rate": by_outcome.get("invalid", 0) / total if total else 0.0,
+        "latency": latency_stats(answered),
+        "latency_by_turn": {str(t): latency_stats(v) for t, v in sorted(per_turn.items())},
+        # Só no /chat/stream: tempo até o primeiro delta de texto
+        "first_delta": latency_stats(first_delta) if first_delta else None,
+        "errors": errors,
+    }
+
+
+def write_reports(report: dict, samples: list, out_dir: Path = REPORTS) -> tuple[Path, Path]:
+    out_dir.mkdir(exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    json_path = out_dir / f"load_{stamp}.json"
+    md_path = out_dir / f"load_{stamp}.md"
+    json_path.write_text(json.dumps({**report, "samples": samples}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    s, cfg, lat = report["summary"], report["config"], report["summary"]["latency"]
+    lines = ["# Teste de carga – /chat\n"]
+    if cfg["mode"] == "open":
+        lines.append(f"- Modo: open-loop, {cfg['rate']} conversas/s por {cfg['duration']}s "
+                     f"(máx. {cfg['max_inflight']} em voo, {s['dropped_arrivals']} chegadas descartadas)")
+    else:
+        lines.append(f"- Modo: closed-loop, {cfg['users']} usuários virtuais por até {cfg['duration']}s")
+    lines.append(f"- Alvo: {cfg['base']} ({cfg.get('endpoint', 'chat')}) | turnos por conversa: {cfg['turns']} "
+                 f"| timeout: {cfg['timeout']}s")
+    lines.append(f"- Conversas: {s['conversations']} | requisições: {s['requests']} em {s['elapsed_s']:.1f}s")
+    lines.append(f"- Throughput: {s['throughput_rps']:.2f} req/s")
+    if s.get("first_delta"):
+        fd = s["first_delta"]
+        lines.append(f"- Primeiro delta: p50 {fd['p50_ms']:.0f}ms | p95 {fd['p95_ms']:.0f}ms | "
+                     f"p99 {fd['p99_ms']:.0f}ms | máx {fd['max_ms']:.0f}ms")
+    lines.append(f"- Erros: {s['error_rate']:.1%} | timeouts: {s['timeout_rate']:.1%} | "
+                 f"respostas reprovadas na validação: {s['invalid_rate']:.1%}\n")
+    lines.append("| turno | n | média (ms) | p50 | p95 | p99 | máx |")
+    lines.append("|---|---|---|---|---|---|---|")
+    rows = [("todos", lat)] + list(s["latency_by_turn"].items())
+    for name, st in rows:
+        lines.append(f"| {name} | {st['count']} | {st['mean_ms']:.0f} | {st['p50_ms']:.0f} | {st['p95_ms']:.0f} "
+                     f"| {st['p99_ms']:.0f} | {st['max_ms']:.0f} |")
+    if s["errors"]:
+        lines.append("\n## Erros\n")
+        for kind, n in sorted(s["errors"].items(), key=lambda kv: -kv[1]):
+            lines.append(f"- {kind}: {n}")
+    md_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return json_path, md_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga assíncrono para /chat")
+    parser.add_argument("--base", default=BASE, help="URL do backend (padrão: BASE_URL)")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--endpoint", choices=("chat", "stream"), default="chat", help="/chat ou /chat/stream (SSE)")
+    parser.add_argument("--users", type=int, default=10, help="closed: usuários virtuais")
+    parser.add_argument("--conversations", type=int, default=None, help="closed: para após N conversas")
+    parser.add_argument("--rate", type=float, default=2.0, help="open: conversas iniciadas por segundo")
+    parser.add_argument("--max-inflight", type=int, default=500, help="open: limite de conversas simultâneas")
+    parser.add_argument("--duration", type=float, default=60.0, help="segundos de geração de carga")
+    parser.add_argument("--turns", type=int, default=3, help="mensagens por conversa (mesmo thread_id)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="timeout por requisição (s)")
+    parser.add_argument("--no-check", action="store_true", help="não validar o conteúdo das respostas")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    load = LoadRun(args.base, args.turns, args.timeout, not args.no_check, args.seed, args.endpoint)
+    opts = {"users": args.users, "conversations": args.conversations, "rate": args.rate,
+            "max_inflight": args.max_inflight, "duration": args.duration}
+    summary = asyncio.run(load.run(args.mode, **opts))
+    config = {"mode": args.mode, "endpoint": args.endpoint, "base": args.base, "turns": args.turns,
+              "timeout": args.timeout, **opts}
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config, "summary": summary}
+    json_path, md_path = write_reports(report, load.samples)
+    lat = summary["latency"]
+    print(f"{summary['requests']} requisições em {summary['elapsed_s']:.1f}s | {summary['throughput_rps']:.2f} req/s | "
+          f"p50 {lat['p50_ms']:.0f}ms p95 {lat['p95_ms']:.0f}ms p99 {lat['p99_ms']:.0f}ms máx {lat['max_ms']:.0f}ms | "
+          f"erros {summary['error_rate']:.1%} timeouts {summary['timeout_rate']:.1%}")
+    print(f"Relatórios: {json_path} e {md_path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
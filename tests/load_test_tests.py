@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+import uvicorn
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+import load_test
+
+LATENCY_S = 0.05
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(backend_app.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        assert time.time() < deadline, "uvicorn não subiu"
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    backend_app.client = StubAsyncOpenAI(latency_s=LATENCY_S)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    port = free_port()
+    server = start_server(port)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        # Closed-loop: 5 usuários, 10 conversas de 3 turnos no mesmo thread_id
+        run = load_test.LoadRun(base, turns=3, timeout=10, check=True, seed=1)
+        summary = asyncio.run(run.run("closed", users=5, duration=30, conversations=10))
+        assert summary["conversations"] == 10, summary
+        assert summary["requests"] == 30 and summary["outcomes"] == {"ok": 30}, summary
+        assert summary["error_rate"] == summary["timeout_rate"] == 0.0, summary
+        lat = summary["latency"]
+        assert lat["p50_ms"] <= lat["p95_ms"] <= lat["p99_ms"] <= lat["max_ms"], lat
+        assert set(summary["latency_by_turn"]) == {"1", "2", "3"}, summary["latency_by_turn"]
+        # Cada conversa ficou num único thread: 10 threads com 3 mensagens do usuário cada
+        threads = backend_app.client.threads
+        user_turns = [sum(1 for m in msgs if m["role"] == "user") for msgs in threads.values()]
+        assert sorted(user_turns) == [3] * 10, user_turns
+        print(f"closed: {summary['requests']} req, {summary['throughput_rps']:.1f} req/s, "
+              f"p50 {lat['p50_ms']:.0f}ms p99 {lat['p99_ms']:.0f}ms")
+
+        # Open-loop: chegadas a 20/s por 1s não esperam respostas anteriores
+        run = load_test.LoadRun(base, turns=2, timeout=10, check=False, seed=2)
+        summary = asyncio.run(run.run("open", rate=20, duration=1.0, max_inflight=100))
+        assert summary["conversations"] >= 5 and summary["outcomes"] == {"ok": summary["requests"]}, summary
+        starts = sorted(s["start"] for s in run.samples if s["turn"] == 1)
+        assert starts[-1] - starts[0] < 1.0 + LATENCY_S * 10, starts
+        print(f"open: {summary['conversations']} conversas, {summary['throughput_rps']:.1f} req/s")
+
+        # /chat/stream (SSE, corpo chunked): resposta do evento done, thread_id mantido e tempo até o primeiro delta
+        before = len(backend_app.client.threads)
+        run = load_test.LoadRun(base, turns=2, timeout=10, check=True, seed=5, endpoint="stream")
+        summary = asyncio.run(run.run("closed", users=3, duration=30, conversations=6))
+        assert summary["requests"] == 12 and summary["outcomes"] == {"ok": 12}, summary
+        assert len(backend_app.client.threads) == before + 6, "cada conversa deve seguir no próprio thread"
+        fd = summary["first_delta"]
+        assert fd["count"] == 12 and fd["p50_ms"] <= summary["latency"]["max_ms"], fd
+        print(f"stream: {summary['requests']} req, primeiro delta p50 {fd['p50_ms']:.0f}ms")
+
+        # Timeout por requisição: contado à parte e encerra a conversa
+        backend_app.client.latency_s = 0.5
+        run = load_test.LoadRun(base, turns=3, timeout=0.2, check=False, seed=3)
+        summary = asyncio.run(run.run("closed", users=2, duration=30, conversations=2))
+        assert summary["outcomes"] == {"timeout": 2} and summary["timeout_rate"] == 1.0, summary
+        backend_app.client.latency_s = LATENCY_S
+
+        # Erro HTTP (servidor fora do ar numa porta livre) vira error_rate, não exceção
+        run = load_test.LoadRun(f"http://127.0.0.1:{free_port()}", turns=1, timeout=2, check=False, seed=4)
+        summary = asyncio.run(run.run("closed", users=1, duration=30, conversations=1))
+        assert summary["error_rate"] == 1.0 and "ConnectError" in summary["errors"], summary
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = {"created_at": "-", "config": {"mode": "closed", "endpoint": "chat", "base": base, "turns": 1,
+                                                    "timeout": 2, "users": 1, "duration": 30}, "summary": summary}
+            json_path, md_path = load_test.write_reports(report, run.samples, Path(tmp))
+            assert json_path.exists() and "| todos |" in md_path.read_text(encoding="utf-8")
+    finally:
+        server.should_exit = True
+    print("Load test OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import asyncio
+import contextlib
+import io
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from fastapi import HTTPException
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+
+async def scenario(stub: StubAsyncOpenAI) -> str:
+    await asyncio.gather(*[backend_app.chat(backend_app.ChatRequest(message=f"m{i}")) for i in range(3)])
+
+    # Run que não termina a tempo -> caminho 504 do poll_run
+    thread_id = (await stub.beta.threads.create()).id
+    stub.run_s = 10
+    await stub.beta.threads.messages.create(thread_id=thread_id, role="user", content="lento")
+    run = await stub.beta.threads.runs.create(thread_id=thread_id, assistant_id="asst_local")
+    try:
+        await backend_app.poll_run(thread_id, run.id, timeout_s=0)
+        raise AssertionError("poll_run deveria ter estourado o timeout")
+    except HTTPException as e:
+        assert e.status_code == 504, e
+
+    resp = await backend_app.metrics_endpoint()
+    return resp.body.decode("utf-8")
+
+
+def main():
+    stub = backend_app.client = StubAsyncOpenAI(latency_s=0.01)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    backend_app.TIMING_LOG = True
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        text = asyncio.run(scenario(stub))
+
+    for stage in ("threads.create", "messages.create", "runs.create", "run.wait", "messages.list"):
+        assert f'leandro_stage_seconds_count{{stage="{stage}"}}' in text, stage
+    assert 'leandro_request_seconds_count{endpoint="chat"} 3' in text, text
+    assert 'leandro_inflight_requests{endpoint="chat"} 0' in text, text
+    assert 'leandro_run_failures_total{status="timeout"} 1.0' in text, text
+    assert "leandro_poll_iterations_count 4" in text, text
+
+    lines = [line for line in log.getvalue().splitlines() if '"event": "timing"' in line]
+    assert len(lines) == 3, log.getvalue()
+    assert '"stages_ms"' in lines[0] and '"run.wait"' in lines[0] and '"poll_iterations": 1' in lines[0], lines[0]
+    print(lines[0])
+    print("Métricas OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora.generator import LeandroOpeningGenerator
+from ai_vendedora.near_dup import NearDuplicateIndex
+
+STORED = int(os.getenv("NEAR_DUP_STORED", "20000"))
+CONTACT = {"name": "John", "role": "distributor", "market": "US"}
+VOCAB = [f"w{i}" for i in range(5000)]
+
+
+def synthetic(rnd):
+    return " ".join(rnd.choice(VOCAB) for _ in range(rnd.randint(15, 40)))
+
+
+def check_basics(tmp):
+    gen = LeandroOpeningGenerator()
+    msg = gen.generate(CONTACT, seed=1)["message"]
+    other = gen.generate({"name": "Ana", "role": "prospect", "market": "BR"}, seed=2)["message"]
+    index = NearDuplicateIndex(os.path.join(tmp, "basics"))
+    sig = index.signature(msg)
+    assert index.similarity(sig, "US") == 0.0
+    index.add(sig, "US")
+    assert index.similarity(index.signature(msg), "US") == 1.0
+    assert index.similarity(sig, "BR") == 0.0, "markets are separate"
+    assert index.similarity(index.signature(other), "US") < index.threshold
+    index.close()
+
+    # Persistent: reopen and still find it
+    index = NearDuplicateIndex(os.path.join(tmp, "basics"))
+    assert index.similarity(index.signature(msg), "us") == 1.0 and len(index) == 1
+    index.close()
+
+    # The market comes from contact input: traversal or odd names never leave the index directory
+    root = os.path.join(tmp, "jail", "index")
+    index = NearDuplicateIndex(root)
+    for market in ("../../X", "../escaped", "/abs", "US/../..", "", None, "x" * 40):
+        index.add(sig, market)
+    index.close()
+    created = sorted(os.listdir(os.path.join(tmp, "jail")))
+    assert created == ["index"], created
+    assert sorted(os.listdir(root)) == ["_"], os.listdir(root)
+
+
+def check_growth(tmp):
+    rnd = random.Random(1)
+    index = NearDuplicateIndex(os.path.join(tmp, "growth"))
+    texts = [synthetic(rnd) for _ in range(3000)]
+    for text in texts:
+        index.add(index.signature(text), "EU")
+    index.close()
+    index = NearDuplicateIndex(os.path.join(tmp, "growth"))
+    for text in texts[::50]:
+        assert index.similarity(index.signature(text), "EU") == 1.0, "entries must survive table growth"
+    index.close()
+
+
+def check_generator(tmp):
+    plain = LeandroOpeningGenerator()
+    assert "similarity" not in plain.generate(CONTACT, seed=3)["meta"], "meta unchanged without an index"
+
+    index = NearDuplicateIndex(os.path.join(tmp, "gen"))
+    gen = LeandroOpeningGenerator(near_duplicates=index, max_redraws=8)
+    outs = [gen.generate(dict(CONTACT, name=f"Contato {i}"), seed=i) for i in range(12)]
+    assert len(index) == 12
+    assert all(o["meta"]["redraws"] <= 8 for o in outs)
+    assert sum(o["meta"]["redraws"] for o in outs) > 0, "similar openers should trigger re-draws"
+    assert outs[0]["meta"]["similarity"] == 0.0 and outs[0]["meta"]["redraws"] == 0
+    # Without the index the same seeds produce closer openers on average
+    probe = NearDuplicateIndex(os.path.join(tmp, "probe"))
+    def mean_similarity(messages):
+        scores = []
+        for i, m in enumerate(messages):
+            sig = probe.signature(m.split(",", 1)[-1])
+            scores.append(max([sum(a == b for a, b in zip(sig, probe.signature(p.split(",", 1)[-1]))) / 64
+                               for p in messages[:i]] or [0]))
+        return sum(scores) / len(scores)
+    baseline = [plain.generate(dict(CONTACT, name=f"Contato {i}"), seed=i)["message"] for i in range(12)]
+    assert mean_similarity([o["message"] for o in outs]) <= mean_similarity(baseline)
+    index.close()
+
+    # Bulk paths (generate_many is what campaign.py uses) query and record the index too
+    contacts = [dict(CONTACT, name=f"Contato {i}") for i in range(12)]
+    seeded = LeandroOpeningGenerator(near_duplicates=NearDuplicateIndex(os.path.join(tmp, "many")), max_redraws=8)
+    assert seeded.generate_many(contacts, seeds=range(12)) == outs, "seeded batch must match sequential generate()"
+    assert len(seeded.near_duplicates) == 12
+    mixed = LeandroOpeningGenerator(near_duplicates=NearDuplicateIndex(os.path.join(tmp, "mixed")), max_redraws=8)
+    batch = mixed.generate_many(contacts, seeds=[i if i % 2 else None for i in range(12)])
+    assert len(mixed.near_duplicates) == 12 and all("redraws" in o["meta"] for o in batch)
+    unique = LeandroOpeningGenerator(near_duplicates=NearDuplicateIndex(os.path.join(tmp, "unique")), max_redraws=8)
+    counters = {}
+    handed = list(unique.iter_unique(contacts, seed=5, counters=counters))
+    assert len(unique.near_duplicates) == 12
+    assert sum(counters.values()) == 12 + sum(o["meta"]["redraws"] for o in handed), "re-draws consume variants"
+    assert len({o["meta"]["variant"] for o in handed}) == 12, "no variant repeats inside the cycle"
+    for gen_ in (seeded, mixed, unique):
+        gen_.near_duplicates.close()
+
+
+def bench_lookup(tmp):
+    rnd = random.Random(7)
+    index = NearDuplicateIndex(os.path.join(tmp, "bench"))
+    start = time.perf_counter()
+    for _ in range(STORED):
+        index.add(index.signature(synthetic(rnd)), "BR")
+    build = time.perf_counter() - start
+    queries = [synthetic(rnd) for _ in range(2000)]
+    start = time.perf_counter()
+    for text in queries:
+        index.similarity(index.signature(text), "BR")
+    lookup_ms = (time.perf_counter() - start) / len(queries) * 1000
+    size_mb = sum(os.path.getsize(os.path.join(tmp, "bench", "BR", f)) for f in ("signatures.bin", "lsh.bin")) / 1e6
+    index.close()
+    print(f"{STORED} stored: build {build / STORED * 1e6:.0f} us/add, "
+          f"lookup incl. signature {lookup_ms:.3f} ms, files {size_mb:.1f} MB")
+    assert lookup_ms < 1.0, "lookups should stay sub-millisecond"
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_basics(tmp)
+        check_growth(tmp)
+        check_generator(tmp)
+        print("Near-duplicate index OK.")
+        bench_lookup(tmp)
+
+
+if __name__ == "__main__":
+    main()
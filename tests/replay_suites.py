@@ -0,0 +1,116 @@
+"""
+Roda smoke_tests.py, full_tests.py e run_validation.py contra um backend em processo ligado a um cassette
+(backend/cassette.py).
+
+    python tests/replay_suites.py                  # reproduz tests/cassettes/suites.jsonl em modo strict, sem rede
+    python tests/replay_suites.py --record         # regrava contra a API real (OPENAI_API_KEY + .assistant_state.json)
+    python tests/replay_suites.py --record --fake  # regrava contra backend/fake_openai.py (o cassette versionado)
+
+O cassette versionado foi gravado contra a API simulada: a reprodução confere o caminho HTTP inteiro do backend
+e das suítes em segundos, não a qualidade das respostas do modelo. Para isso, regrave com --record.
+As suítes pulam as pausas quando o /healthz do backend informa o cassette em replay/strict. Os relatórios do
+run_validation.py vão para um diretório temporário (reports/ e docs/ não mudam).
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+DEFAULT_CASSETTE = os.path.join(ROOT, "tests", "cassettes", "suites.jsonl")
+SUITES = ("smoke_tests", "full_tests", "run_validation")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def validation_passed(run_validation, out_dir: Path) -> bool:
+    # Relatórios e JSONL fora do repo; sem cache, todos os cenários passam pelo backend
+    run_validation.REPORTS = run_validation.DOCS = out_dir
+    summary = run_validation.main(["--results", str(out_dir / "validation_results.jsonl"), "--no-cache"])
+    return all(r["failed"] == 0 and r["missing"] == 0 for r in summary["rounds"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="smoke/full contra um backend com cassette")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--record", action="store_true", help="grava em vez de reproduzir")
+    parser.add_argument("--fake", action="store_true", help="com --record, grava contra a API simulada")
+    args = parser.parse_args(argv)
+
+    # Configuração lida no import do backend (e pelas suítes, para pular as pausas na reprodução)
+    os.environ["OPENAI_CASSETTE"] = args.cassette
+    os.environ["OPENAI_CASSETTE_MODE"] = "record" if args.record else "strict"
+    os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+    os.environ["THREAD_POOL_HIGH"] = "0"  # threads.create na ordem das conversas
+    os.environ["CHAT_ENGINE"] = "assistants"
+    os.environ["KNOWLEDGE_MODE"] = "remote"
+    offline = not args.record or args.fake
+    if offline:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-local")
+
+    fake_server = None
+    if args.record and args.fake:
+        from backend.fake_openai import FakeOpenAI, create_app
+        fake_port = free_port()
+        fake = FakeOpenAI(time_scale=20, api_latency="fixed:0", queue_latency="fixed:0.2", run_latency="fixed:1", seed=1)
+        fake_server = start(create_app(fake), fake_port)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{fake_port}/v1"
+    os.makedirs(os.path.dirname(os.path.abspath(args.cassette)), exist_ok=True)
+
+    from backend import app as backend_app
+    if offline and not backend_app.STATE_PATH.exists():
+        # A API simulada aceita qualquer assistant_id; na reprodução o id casa com o gravado pelo formato
+        backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    port = free_port()
+    server = start(backend_app.app, port)
+    os.environ["BASE_URL"] = f"http://127.0.0.1:{port}"
+
+    import importlib
+    failures = []
+    started = time.perf_counter()
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        for name in SUITES:
+            suite = importlib.import_module(name)
+            try:
+                if name == "run_validation":
+                    if not validation_passed(suite, Path(tmp.name)):
+                        failures.append(name)
+                else:
+                    suite.main()
+            except SystemExit as e:
+                if e.code:
+                    failures.append(name)
+    finally:
+        server.should_exit = True
+        if fake_server is not None:
+            fake_server.should_exit = True
+        tmp.cleanup()
+    elapsed = time.perf_counter() - started
+    mode = os.environ["OPENAI_CASSETTE_MODE"]
+    print(f"\n{', '.join(SUITES)} em {elapsed:.1f}s ({mode}, {args.cassette})"
+          + (f" | falharam: {', '.join(failures)}" if failures else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -40,6 +40,7 @@ def run_round(generator, cases):
             assert_no_banned(msg)
             assert_language_expectations(msg, case.get("language") or generator._language_for_market(case.get("market")))
             assert_us_constraints(msg, case.get("market"))
+            assert not generator.constraints.scan(msg, case.get("market")), msg
         assert_unique(seed_msgs)
         ok += 1
     return ok
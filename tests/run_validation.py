@@ -1,6 +1,9 @@
 import os
 import json
 import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib import request
 
@@ -8,6 +11,12 @@ BASE = os.getenv("BASE_URL", "http://127.0.0.1:8080")
 ROOT = Path(__file__).resolve().parents[1]
 REPORTS = ROOT / "reports"
 DOCS = ROOT / "docs"
+RESULTS_PATH = REPORTS / "validation_results.jsonl"
+INSTRUCTIONS_PATH = ROOT / "gpt_instructions.txt"
+ADMIN_CONFIG_PATH = ROOT / "admin-config.json"
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
+ROUNDS = 3
+CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", "4"))
 REPORTS.mkdir(exist_ok=True)
 DOCS.mkdir(exist_ok=True)
 
@@ -78,24 +87,91 @@ def validate(name: str, user_msg: str, assistant_msg: str) -> tuple[bool, str, d
             return False, "Falou de container cedo demais no cenário US (sem o usuário)", metrics
     return True, "", metrics
 
-def run_round(round_id: int) -> dict:
-    items = []
-    for sc in SCENARIOS:
+def file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else "-"
+
+
+def prompt_fingerprint(model: str = MODEL) -> dict:
+    """Hashes do que muda a resposta além do cenário: instruções, admin-config e modelo."""
+    return {"instructions": file_sha256(INSTRUCTIONS_PATH), "admin_config": file_sha256(ADMIN_CONFIG_PATH),
+            "model": model}
+
+
+def cache_key(scenario: dict, round_id: int, fingerprint: dict) -> str:
+    # A rodada entra na chave: as 3 rodadas são amostras independentes do mesmo cenário
+    raw = json.dumps({"scenario": scenario, "round": round_id, **fingerprint}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_results(path: Path = RESULTS_PATH) -> dict:
+    """cache_key -> último resultado concluído. Uma linha truncada (queda no meio da escrita) é descartada."""
+    done = {}
+    if not path.exists():
+        return done
+    good = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            item = json.loads(line)
+            if not item.get("error"):
+                done[item["cache_key"]] = item
+    if good != path.stat().st_size:
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return done
+
+
+def run_item(round_id: int, sc: dict, key: str) -> dict:
+    started = time.perf_counter()
+    item = {"round": round_id, "scenario": sc["name"], "user": sc["msg"], "cache_key": key}
+    try:
         out = call_chat(sc["msg"])  # novo thread por cenário
-        msg = out.get("assistant_message", "").strip()
-        ok, reason, metrics = validate(sc["name"], sc["msg"], msg)
-        items.append({
-            "scenario": sc["name"],
-            "user": sc["msg"],
-            "assistant": msg,
-            "ok": ok,
-            "reason": reason,
-            "metrics": metrics,
-        })
-        time.sleep(0.5)
-    report = {"round": round_id, "items": items}
-    (REPORTS / f"round_{round_id}.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
-    return report
+    except Exception as e:
+        # Não entra no cache: é refeito na próxima execução
+        return {**item, "assistant": "", "ok": False, "reason": f"Erro: {type(e).__name__}: {e}", "error": True,
+                "metrics": {"length": 0, "lines": 0, "has_signature": False},
+                "elapsed_s": round(time.perf_counter() - started, 3), "finished_at": int(time.time())}
+    msg = out.get("assistant_message", "").strip()
+    ok, reason, metrics = validate(sc["name"], sc["msg"], msg)
+    return {**item, "assistant": msg, "ok": ok, "reason": reason, "metrics": metrics,
+            "elapsed_s": round(time.perf_counter() - started, 3), "finished_at": int(time.time())}
+
+
+def run_rounds(rounds: int = ROUNDS, concurrency: int = CONCURRENCY, results_path: Path = RESULTS_PATH,
+               use_cache: bool = True) -> list[dict]:
+    """
+    Roda rounds × cenários com no máximo `concurrency` chamadas simultâneas. Cada resultado é anexado ao
+    JSONL assim que termina; o que já está lá com a mesma cache_key (mesmo cenário, rodada, instruções,
+    admin-config e modelo) não é chamado de novo, então uma execução interrompida retoma de onde parou.
+    """
+    fingerprint = prompt_fingerprint()
+    done = load_results(results_path) if use_cache else {}
+    plan = [(r, sc, cache_key(sc, r, fingerprint)) for r in range(1, rounds + 1) for sc in SCENARIOS]
+    todo = [p for p in plan if p[2] not in done]
+    print(f"{len(plan) - len(todo)}/{len(plan)} resultados reaproveitados do cache; {len(todo)} a executar "
+          f"(concorrência {concurrency}).")
+    results_path.parent.mkdir(exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_item, *p) for p in todo]
+        for i, fut in enumerate(as_completed(futures), 1):
+            item = fut.result()
+            out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            out.flush()
+            status = "OK" if item["ok"] else f"FAIL ({item['reason']})"
+            print(f"[{i}/{len(todo)}] rodada {item['round']} – {item['scenario']}: {status}")
+            if not item.get("error"):
+                done[item["cache_key"]] = item
+
+    round_reports = []
+    for r in range(1, rounds + 1):
+        items = [done.get(cache_key(sc, r, fingerprint)) for sc in SCENARIOS]
+        items = [it for it in items if it is not None]  # cenários com erro ficam de fora até a próxima execução
+        report = {"round": r, "items": items}
+        (REPORTS / f"round_{r}.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        round_reports.append(report)
+    return round_reports
 
 def summarize(round_reports: list[dict]) -> dict:
     summary = {"rounds": []}
@@ -103,15 +179,18 @@ def summarize(round_reports: list[dict]) -> dict:
         total = len(r["items"])
         passed = sum(1 for it in r["items"] if it["ok"]) 
         failed = total - passed
-        summary["rounds"].append({"round": r["round"], "passed": passed, "failed": failed})
+        summary["rounds"].append({"round": r["round"], "passed": passed, "failed": failed,
+                                  "missing": len(SCENARIOS) - total})
     # comparação simples: variação média de tamanho de respostas entre rodadas
     if len(round_reports) >= 2:
-        lens = [[it["metrics"]["length"] for it in r["items"]] for r in round_reports]
+        lens = [{it["scenario"]: it["metrics"]["length"] for it in r["items"]} for r in round_reports]
         deltas = []
         for i in range(1, len(lens)):
-            diffs = [abs(lens[i][j] - lens[i-1][j]) for j in range(len(lens[i]))]
-            deltas.append(sum(diffs)/len(diffs))
-        summary["avg_length_delta_between_rounds"] = sum(deltas)/len(deltas)
+            diffs = [abs(lens[i][name] - lens[i-1][name]) for name in lens[i] if name in lens[i-1]]
+            if diffs:
+                deltas.append(sum(diffs)/len(diffs))
+        if deltas:
+            summary["avg_length_delta_between_rounds"] = sum(deltas)/len(deltas)
     return summary
 
 def write_markdown(round_reports: list[dict], summary: dict):
@@ -119,7 +198,8 @@ def write_markdown(round_reports: list[dict], summary: dict):
     lines.append("# Resultados de Validação – Agente Leandro\n")
     lines.append("## Sumário por rodada\n")
     for r in summary["rounds"]:
-        lines.append(f"- Rodada {r['round']}: {r['passed']}/{18} aprovados")
+        missing = f" ({r['missing']} sem resultado)" if r.get("missing") else ""
+        lines.append(f"- Rodada {r['round']}: {r['passed']}/{len(SCENARIOS)} aprovados{missing}")
     if "avg_length_delta_between_rounds" in summary:
         lines.append(f"\nVariação média de tamanho entre rodadas: {summary['avg_length_delta_between_rounds']:.1f} caracteres\n")
     lines.append("\n## Amostras (excertos)\n")
@@ -132,20 +212,22 @@ def write_markdown(round_reports: list[dict], summary: dict):
     (DOCS / "TESTES_RESULTADOS.md").write_text("\n".join(lines), encoding="utf-8")
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida os cenários contra /chat (concorrente, com retomada e cache).")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="chamadas simultâneas a /chat")
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH, help="JSONL de resultados (também é o cache)")
+    parser.add_argument("--no-cache", action="store_true", help="executa tudo de novo (ainda anexa ao JSONL)")
+    args = parser.parse_args(argv)
     if not healthz():
         print("[ERRO] Servidor não está respondendo em /healthz")
         raise SystemExit(2)
-    round_reports = []
-    for r in range(1, 4):
-        print(f"Rodando rodada {r}...")
-        rr = run_round(r)
-        round_reports.append(rr)
-        time.sleep(1)
+    round_reports = run_rounds(args.rounds, args.concurrency, args.results, use_cache=not args.no_cache)
     summary = summarize(round_reports)
     (REPORTS / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
     write_markdown(round_reports, summary)
     print("Concluído. Relatórios em reports/ e docs/TESTES_RESULTADOS.md")
+    return summary
 
 if __name__ == "__main__":
     main()
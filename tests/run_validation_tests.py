@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+from load_test_tests import free_port, start_server
+import run_validation as rv
+
+LATENCY_S = 0.1
+ROUNDS = 2
+
+
+def lines(path: Path) -> list[dict]:
+    return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+
+
+def main():
+    backend_app.client = StubAsyncOpenAI(latency_s=LATENCY_S)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    port = free_port()
+    server = start_server(port)
+    rv.BASE = f"http://127.0.0.1:{port}"
+    total = ROUNDS * len(rv.SCENARIOS)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            rv.REPORTS = tmp
+            results = tmp / "validation_results.jsonl"
+
+            # 1) Tudo executa, com chamadas simultâneas, e cada resultado vai para o JSONL
+            start = time.perf_counter()
+            reports = rv.run_rounds(ROUNDS, concurrency=8, results_path=results)
+            elapsed = time.perf_counter() - start
+            assert len(lines(results)) == total, len(lines(results))
+            assert [len(r["items"]) for r in reports] == [len(rv.SCENARIOS)] * ROUNDS
+            assert all(it["ok"] for r in reports for it in r["items"]), reports
+            assert (tmp / "round_2.json").exists()
+            # O stub tem ~3 chamadas de LATENCY_S por /chat; em série seriam total * 3 * LATENCY_S
+            assert elapsed < total * 3 * LATENCY_S / 3, f"{elapsed:.2f}s: chamadas não estão concorrentes"
+            print(f"{total} itens em {elapsed:.2f}s (em série: ~{total * 3 * LATENCY_S:.1f}s)")
+
+            # 2) Nada mudou: tudo vem do cache, nenhuma chamada a /chat
+            threads = len(backend_app.client.threads)
+            reports = rv.run_rounds(ROUNDS, concurrency=8, results_path=results)
+            assert len(backend_app.client.threads) == threads and len(lines(results)) == total
+            assert sum(len(r["items"]) for r in reports) == total
+
+            # 3) Queda no meio: linhas completas ficam, a linha truncada é descartada e o resto é refeito
+            raw = results.read_bytes().splitlines(keepends=True)
+            results.write_bytes(b"".join(raw[:10]) + raw[10][:15])
+            rv.run_rounds(ROUNDS, concurrency=8, results_path=results)
+            assert len(lines(results)) == total, len(lines(results))
+            assert len(backend_app.client.threads) == threads + total - 10
+
+            # 4) Instruções mudaram: nova chave para todos os cenários
+            instructions = tmp / "gpt_instructions.txt"
+            instructions.write_text(rv.INSTRUCTIONS_PATH.read_text(encoding="utf-8") + "\nAjuste.", encoding="utf-8")
+            original, rv.INSTRUCTIONS_PATH = rv.INSTRUCTIONS_PATH, instructions
+            keys_before = {it["cache_key"] for it in lines(results)}
+            rv.run_rounds(1, concurrency=8, results_path=results)
+            new = lines(results)[total:]
+            assert len(new) == len(rv.SCENARIOS) and not keys_before & {it["cache_key"] for it in new}
+            rv.INSTRUCTIONS_PATH = original
+
+            # 5) Erros de rede ficam registrados mas não entram no cache
+            rv.BASE = f"http://127.0.0.1:{free_port()}"
+            before = len(lines(results))
+            reports = rv.run_rounds(1, concurrency=8, results_path=results, use_cache=False)
+            errors = lines(results)[before:]
+            assert len(errors) == len(rv.SCENARIOS) and all(it["error"] for it in errors)
+            assert reports[0]["items"] == [], reports
+            summary = rv.summarize(reports)
+            assert summary["rounds"][0]["missing"] == len(rv.SCENARIOS), summary
+            cached = rv.load_results(results)
+            assert all(not it.get("error") for it in cached.values())
+    finally:
+        server.should_exit = True
+    print("Validação concorrente com retomada e cache OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+
+async def conversation(session_id: str) -> list[dict]:
+    outs = []
+    for msg in ("Oi", "Qual o prazo?", "Fechado"):
+        outs.append(await backend_app.chat(backend_app.ChatRequest(message=msg, session_id=session_id)))
+    return outs
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "sessions.sqlite3")
+        backend_app.client = stub = StubAsyncOpenAI(latency_s=0.01)
+        backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+        backend_app.sessions = backend_app.SessionStore(db, ttl_s=3600, cache_size=2)
+
+        # Mesma sessão -> mesmo thread, um único threads.create
+        outs = asyncio.run(conversation("wa:5511999990000"))
+        assert len({o["thread_id"] for o in outs}) == 1, outs
+        assert stub.calls["threads.create"] == 1, stub.calls
+        assert len(stub.threads[outs[0]["thread_id"]]) == 6
+
+        # Outro worker (outra conexão no mesmo arquivo) enxerga a sessão
+        other_worker = backend_app.SessionStore(db, ttl_s=3600, cache_size=2)
+        assert other_worker.get("wa:5511999990000") == outs[0]["thread_id"]
+
+        # Primeiro a associar vence; thread_id explícito substitui
+        assert other_worker.bind("wa:5511999990000", "thread_outro") == outs[0]["thread_id"]
+        assert other_worker.bind("wa:5511999990000", "thread_outro", replace=True) == "thread_outro"
+        # ...e o worker que tinha a sessão no LRU passa a ver o thread novo
+        assert backend_app.sessions.get("wa:5511999990000") == "thread_outro"
+
+        # Linha apagada por outro worker (purge): o LRU não ressuscita a sessão
+        other_worker._db.execute("DELETE FROM sessions WHERE session_id = ?", ("wa:5511999990000",))
+        assert backend_app.sessions.get("wa:5511999990000") is None
+
+        # LRU pequeno não perde sessões: cai para o SQLite
+        for i in range(5):
+            backend_app.sessions.bind(f"s{i}", f"t{i}")
+        assert backend_app.sessions.get("s0") == "t0"
+
+        # Sessão ociosa expira
+        short = backend_app.SessionStore(db, ttl_s=1, cache_size=10, purge_interval_s=0)
+        short.bind("ociosa", "thread_ocioso")
+        time.sleep(1.1)
+        assert short.get("ociosa") is None
+        for store in (backend_app.sessions, other_worker, short):
+            store.close()
+    print("Sessões OK.")
+
+
+if __name__ == "__main__":
+    main()
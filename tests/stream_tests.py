@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+os.environ.setdefault("THREAD_POOL_HIGH", "0")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+
+def parse_sse(raw: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in raw.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def consume(message: str) -> tuple[list[tuple[str, dict]], float]:
+    start = time.perf_counter()
+    first_delta = None
+    raw = []
+    resp = await backend_app.chat_stream(backend_app.ChatRequest(message=message))
+    async for chunk in resp.body_iterator:
+        raw.append(chunk)
+        if first_delta is None and chunk.startswith("event: delta"):
+            first_delta = time.perf_counter() - start
+    return parse_sse("".join(raw)), first_delta
+
+
+async def dropped(message: str) -> None:
+    # Cliente que cai antes do primeiro chunk (corpo nunca iterado) e outro que cai após o primeiro evento
+    first = await backend_app.chat(backend_app.ChatRequest(message="Oi"))
+    thread_id = first["thread_id"]
+    resp = await backend_app.chat_stream(backend_app.ChatRequest(message=message, thread_id=thread_id))
+    del resp
+    assert backend_app.lanes.active() == 0, "Lane presa por um stream nunca iterado"
+    resp = await backend_app.chat_stream(backend_app.ChatRequest(message=message, thread_id=thread_id))
+    body = resp.body_iterator
+    assert (await body.__anext__()).startswith("event: start")
+    await body.aclose()
+    assert backend_app.lanes.active() == 0, "Lane presa por um stream abandonado"
+    out = await asyncio.wait_for(backend_app.chat(backend_app.ChatRequest(message="ainda aí?", thread_id=thread_id)), 5)
+    assert out["assistant_message"] == "Resposta para: ainda aí?", out
+
+
+def main():
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    for engine in ("assistants", "completions"):
+        backend_app.CHAT_ENGINE = engine
+        backend_app.client = StubAsyncOpenAI(latency_s=0.2)
+
+        events, ttft = asyncio.run(consume("Oi, tudo bem?"))
+        names = [e[0] for e in events]
+        assert names[0] == "start" and names[-1] == "done", names
+        assert "delta" in names, names
+        start, done = events[0][1], events[-1][1]
+        assert start["thread_id"] and start["run_id"], start
+        assert done["run_id"] == start["run_id"] and done["thread_id"] == start["thread_id"], done
+        streamed = "".join(data["text"] for name, data in events if name == "delta")
+        assert streamed == done["assistant_message"] == "Resposta para: Oi, tudo bem?", done
+        print(f"[{engine}] Primeiro delta em {ttft:.2f}s; {names.count('delta')} deltas; mensagem final OK.")
+
+        backend_app.client = StubAsyncOpenAI(latency_s=0.02)
+        asyncio.run(dropped("Vai cair"))
+        print(f"[{engine}] Stream abandonado antes/depois do primeiro chunk não prende o thread.")
+
+
+if __name__ == "__main__":
+    main()
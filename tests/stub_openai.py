@@ -0,0 +1,172 @@
+import time
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+# Stub local do AsyncOpenAI: implementa só o subconjunto de client.beta.threads
+# usado pelo backend, com latência fixa por chamada remota.
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{next(_ids)}"
+
+
+def _text_content(value: str) -> list:
+    return [SimpleNamespace(type="text", text=SimpleNamespace(value=value))]
+
+
+class _Messages:
+    def __init__(self, owner):
+        self._o = owner
+
+    async def create(self, thread_id: str, role: str, content: str):
+        await self._o.wait("messages.create")
+        self._o.ensure_idle(thread_id)
+        self._o.threads[thread_id].append({"role": role, "content": content})
+        return SimpleNamespace(id=_new_id("msg"), thread_id=thread_id, role=role)
+
+    async def list(self, thread_id: str, order: str = "desc", limit: int = 20):
+        await self._o.wait("messages.list")
+        history = list(self._o.threads[thread_id])
+        if order == "desc":
+            history.reverse()
+        data = [SimpleNamespace(role=m["role"], content=_text_content(m["content"])) for m in history[:limit]]
+        return SimpleNamespace(data=data)
+
+
+class _RunStream:
+    # Emula o AsyncStream de runs.create(stream=True): um evento por palavra.
+    def __init__(self, owner, thread_id: str, run_id: str):
+        self._o = owner
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.closed = False
+
+    async def __aiter__(self):
+        history = self._o.threads[self.thread_id]
+        last_user = next(m["content"] for m in reversed(history) if m["role"] == "user")
+        reply = self._o.reply(last_user)
+        yield SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id=self.run_id))
+        for i, word in enumerate(reply.split(" ")):
+            await asyncio.sleep(self._o.latency_s / 10)
+            chunk = word if i == 0 else " " + word
+            delta = SimpleNamespace(content=[SimpleNamespace(type="text", text=SimpleNamespace(value=chunk))])
+            yield SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=delta))
+        history.append({"role": "assistant", "content": reply})
+        self._o.active.pop(self.thread_id, None)
+        yield SimpleNamespace(event="thread.message.completed",
+                              data=SimpleNamespace(role="assistant", content=_text_content(reply)))
+        yield SimpleNamespace(event="thread.run.completed", data=SimpleNamespace(id=self.run_id))
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class _Runs:
+    def __init__(self, owner):
+        self._o = owner
+
+    async def create(self, thread_id: str, assistant_id: str, stream: bool = False, **kwargs):
+        await self._o.wait("runs.create")
+        self._o.ensure_idle(thread_id)
+        run_id = _new_id("run")
+        self._o.active[thread_id] = run_id
+        if stream:
+            return _RunStream(self._o, thread_id, run_id)
+        self._o.runs[run_id] = time.monotonic() + self._o.run_s
+        return SimpleNamespace(id=run_id, thread_id=thread_id, status="queued")
+
+    async def retrieve(self, thread_id: str, run_id: str):
+        await self._o.wait("runs.retrieve")
+        history = self._o.threads[thread_id]
+        ready_at = self._o.runs.get(run_id)
+        if ready_at is not None and time.monotonic() < ready_at:
+            return SimpleNamespace(id=run_id, thread_id=thread_id, status="in_progress")
+        if self._o.runs.pop(run_id, None) is not None:
+            self._o.active.pop(thread_id, None)
+            last_user = next(m["content"] for m in reversed(history) if m["role"] == "user")
+            history.append({"role": "assistant", "content": self._o.reply(last_user)})
+        return SimpleNamespace(id=run_id, thread_id=thread_id, status="completed")
+
+    async def cancel(self, thread_id: str, run_id: str):
+        await self._o.wait("runs.cancel")
+        self._o.runs.pop(run_id, None)
+        self._o.active.pop(thread_id, None)
+        return SimpleNamespace(id=run_id, status="cancelled")
+
+
+class _Threads:
+    def __init__(self, owner):
+        self._o = owner
+        self.messages = _Messages(owner)
+        self.runs = _Runs(owner)
+
+    async def create(self, **kwargs):
+        await self._o.wait("threads.create")
+        thread_id = _new_id("thread")
+        self._o.threads[thread_id] = []
+        return SimpleNamespace(id=thread_id)
+
+
+class _CompletionStream:
+    def __init__(self, owner, completion_id: str, reply: str):
+        self._o = owner
+        self.id = completion_id
+        self.reply = reply
+
+    async def __aiter__(self):
+        for i, word in enumerate(self.reply.split(" ")):
+            await asyncio.sleep(self._o.latency_s / 10)
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            yield SimpleNamespace(id=self.id, choices=[SimpleNamespace(index=0, delta=delta)])
+
+    async def close(self) -> None:
+        return None
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._o = owner
+
+    async def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        # Sem threads/runs: uma chamada com a latência de rede + o tempo de geração
+        await self._o.wait("chat.completions.create")
+        self._o.prompts.append(messages)
+        last_user = next(m["content"] for m in reversed(messages) if m["role"] == "user")
+        reply = self._o.reply(last_user)
+        completion_id = _new_id("chatcmpl")
+        if stream:
+            return _CompletionStream(self._o, completion_id, reply)
+        await asyncio.sleep(self._o.run_s)
+        message = SimpleNamespace(role="assistant", content=reply)
+        return SimpleNamespace(id=completion_id, choices=[SimpleNamespace(index=0, message=message)])
+
+
+class StubAsyncOpenAI:
+    def __init__(self, latency_s: float = 0.2, run_s: float = 0.0):
+        self.latency_s = latency_s
+        self.run_s = run_s
+        self.threads: dict[str, list] = {}
+        self.runs: dict[str, float] = {}
+        self.active: dict[str, str] = {}
+        self.prompts: list[list] = []
+        self.calls: dict[str, int] = {}
+        self.beta = SimpleNamespace(threads=_Threads(self))
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    async def wait(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await asyncio.sleep(self.latency_s)
+
+    def ensure_idle(self, thread_id: str) -> None:
+        # Mesmo comportamento da API: não aceita mensagem/run com run ativo no thread
+        if thread_id in self.active:
+            raise RuntimeError(f"Thread {thread_id} already has an active run {self.active[thread_id]}")
+
+    def reply(self, user_msg: str) -> str:
+        return f"Resposta para: {user_msg}"
+
+    async def close(self) -> None:
+        return None
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-local")
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+
+from backend import app as backend_app
+from stub_openai import StubAsyncOpenAI
+
+LATENCY_S = 0.1
+
+
+async def first_contact() -> float:
+    start = time.perf_counter()
+    out = await backend_app.chat(backend_app.ChatRequest(message="Primeiro contato"))
+    assert out["assistant_message"] == "Resposta para: Primeiro contato", out
+    return time.perf_counter() - start
+
+
+async def scenario() -> None:
+    pool = backend_app.thread_pool = backend_app.ThreadPool(low=2, high=4, max_age_s=3600)
+
+    cold = await first_contact()  # pool vazio: miss + reposição em segundo plano
+    assert pool.stats()["misses"] == 1, pool.stats()
+    await pool._task
+    assert pool.stats()["ready"] == 4, pool.stats()
+
+    warm = [await first_contact() for _ in range(3)]
+    stats = pool.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1, stats
+    # Caiu abaixo do low -> reposição automática até o high
+    await pool._task
+    assert pool.stats()["ready"] == 4, pool.stats()
+
+    saved = cold - max(warm)
+    print(f"Primeiro contato sem pool: {cold:.2f}s | com pool: {max(warm):.2f}s "
+          f"(economia de {saved:.2f}s ≈ 1 round trip) | {pool.stats()}")
+    assert saved > LATENCY_S * 0.8, "Pool não removeu o threads.create do caminho crítico"
+    await pool.stop()
+
+
+def main():
+    backend_app.client = StubAsyncOpenAI(latency_s=LATENCY_S)
+    backend_app.load_state = lambda: {"assistant_id": "asst_local"}
+    asyncio.run(scenario())
+    print("Pool de threads OK.")
+
+
+if __name__ == "__main__":
+    main()
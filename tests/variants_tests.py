@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import itertools
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai_vendedora.generator import LeandroOpeningGenerator
+from ai_vendedora.variants import SeededPermutation, VariantSpace
+
+CONTACTS = [
+    {"name": "Tiago", "role": "prospect", "market": "BR"},
+    {"name": "John", "role": "distributor", "market": "US"},
+    {"name": "Carlos", "role": "distribuidor", "market": "LATAM"},
+    {"name": "Ana", "role": "marmorista", "market": "BR", "language": "pt"},
+]
+
+
+def check_permutations():
+    for n in (1, 2, 3, 7, 64, 65, 1000, 4097):
+        for seed in (0, 1, 2 ** 63):
+            perm = SeededPermutation(n, seed)
+            assert sorted(perm[i] for i in range(n)) == list(range(n)), (n, seed)
+    a = [SeededPermutation(1000, 1)[i] for i in range(20)]
+    b = [SeededPermutation(1000, 2)[i] for i in range(20)]
+    assert a != b and a != list(range(20)), "seed should shuffle the order"
+
+    # O(1) memory: a 10^15-variant permutation costs the same as a small one
+    tracemalloc.start()
+    big = SeededPermutation(10 ** 15, 9)
+    assert [big[i] for i in range(1000)] and big[10 ** 15 - 1] < 10 ** 15
+    assert tracemalloc.get_traced_memory()[1] < 64 * 1024
+    tracemalloc.stop()
+
+
+def check_space(gen):
+    for contact in CONTACTS:
+        space = VariantSpace(gen._table(contact))
+        assert space.size == gen.variant_count(contact) > 1
+        combos = {tuple(space.picks(i)) for i in range(space.size)}
+        assert len(combos) == space.size, "every index must decode to a distinct combination"
+        product = set(itertools.product(*[s or ("",) for s in space.slots]))
+        assert combos == product
+
+
+def check_unique(gen):
+    for contact in CONTACTS:
+        n = gen.variant_count(contact)
+        named = [dict(contact, name=f"Contato {i}") for i in range(2 * n)]
+        outs = list(gen.iter_unique(named, seed=42))
+        first = [o["meta"]["variant"] for o in outs[:n]]
+        assert sorted(first) == list(range(n)), "no repeats before the segment is exhausted"
+        messages = {o["message"].replace(f" {c['name']},", "") for o, c in zip(outs[:n], named)}
+        assert len(messages) == n, "distinct variants must render distinct openers"
+        assert sorted(o["meta"]["variant"] for o in outs[n:]) == list(range(n)), "second cycle covers it again"
+
+    # Resume with persisted counters continues the same sequence
+    stream = [CONTACTS[i % len(CONTACTS)] for i in range(60)]
+    full = [o["meta"]["variant"] for o in gen.iter_unique(stream, seed=7)]
+    counters = {}
+    head = [o["meta"]["variant"] for o in gen.iter_unique(stream[:25], seed=7, counters=counters)]
+    tail = [o["meta"]["variant"] for o in gen.iter_unique(stream[25:], seed=7, counters=counters)]
+    assert head + tail == full and sum(counters.values()) == 60, counters
+
+
+def main():
+    gen = LeandroOpeningGenerator()
+    check_permutations()
+    check_space(gen)
+    check_unique(gen)
+    for contact in CONTACTS:
+        print(f"  {contact['market']:<6} {contact['role']:<13} {gen.variant_count(contact):>5} variants")
+
+    stream = [CONTACTS[i % len(CONTACTS)] for i in range(20000)]
+    start = time.perf_counter()
+    for _ in gen.iter_unique(stream, seed=1):
+        pass
+    print(f"iter_unique: {(time.perf_counter() - start) / len(stream) * 1e6:.1f} us/opener")
+    print("Variants OK.")
+
+
+if __name__ == "__main__":
+    main()